@@ -0,0 +1,321 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from errors import AdmissionRejected
+from packing import count_tokens
+
+# Lower runs first: later calls of a turn that is already under way, then
+# turns that continue a session, then first turns of new sessions
+IN_PROGRESS = 0
+CONTINUING = 1
+NEW_SESSION = 2
+
+_turn = ContextVar('lumi_admission_turn', default=None)
+
+def begin_turn(continuing: bool):
+    """Set the admission priority for the LLM calls of the current turn."""
+    _turn.set({'priority': CONTINUING if continuing else NEW_SESSION})
+
+def _claim_priority() -> int:
+    turn = _turn.get()
+    if turn is None:
+        return NEW_SESSION
+    priority = turn['priority']
+    turn['priority'] = IN_PROGRESS
+    return priority
+
+class AdmissionConfig:
+    def __init__(self):
+        self.max_concurrency = int(os.getenv('LUMI_LLM_MAX_CONCURRENCY', '16'))
+        # Provider token budget; 0 means only concurrency is limited
+        self.tokens_per_minute = int(os.getenv('LUMI_LLM_TOKENS_PER_MINUTE', '0'))
+        self.queue_size = int(os.getenv('LUMI_LLM_QUEUE_SIZE', '64'))
+        self.queue_timeout = float(os.getenv('LUMI_LLM_QUEUE_TIMEOUT', '10'))
+        # Tokens reserved for the completion on top of the prompt estimate
+        self.completion_tokens = int(os.getenv('LUMI_LLM_COMPLETION_TOKENS', '256'))
+        self.token_model = 'gpt-3.5-turbo'
+
+class _Waiter:
+    def __init__(self, cost, loop=None):
+        self.cost = cost
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else asyncio.Event()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+class AdmissionController:
+    """Concurrency and token-rate limit for outbound LLM calls.
+
+    A call runs at once if a slot is free and the token bucket covers its
+    estimated cost; otherwise it waits in a bounded priority queue. A full
+    queue rejects immediately with 429, a wait longer than `queue_timeout`
+    with 503, both carrying a Retry-After estimate. Threads and coroutines
+    share the same slots.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.counters = {
+            'admitted': 0,
+            'queued': 0,
+            'rejected_full': 0,
+            'rejected_timeout': 0,
+            'wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'max_queue_depth': 0
+        }
+        self.call_ms = None
+        self._active = 0
+        self._waiting = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._tokens = float(config.tokens_per_minute)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    # All underscore helpers below expect the caller to hold self._lock
+
+    def _refill(self):
+        rate = self.config.tokens_per_minute
+        if rate <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(float(rate), self._tokens + (now - self._refilled) * rate / 60)
+        self._refilled = now
+
+    def _fits(self, cost):
+        if self._active >= self.config.max_concurrency:
+            return False
+        return self.config.tokens_per_minute <= 0 or self._tokens >= cost
+
+    def _take(self, cost):
+        self._active += 1
+        if self.config.tokens_per_minute > 0:
+            self._tokens -= cost
+
+    def _dispatch(self):
+        self._refill()
+        while self._heap:
+            waiter = self._heap[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self._heap)
+                continue
+            if not self._fits(waiter.cost):
+                break
+            heapq.heappop(self._heap)
+            self._take(waiter.cost)
+            self._waiting -= 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _retry_after(self):
+        call_s = (self.call_ms or 1000) / 1000
+        return max(1, math.ceil((self._waiting + 1) * call_s / self.config.max_concurrency))
+
+    def _enter(self, cost, priority, loop=None):
+        # Never wait for more tokens than the bucket can ever hold
+        if self.config.tokens_per_minute > 0:
+            cost = min(cost, self.config.tokens_per_minute)
+        with self._lock:
+            self._refill()
+            if not self._waiting and self._fits(cost):
+                self._take(cost)
+                self.counters['admitted'] += 1
+                return None
+            if self._waiting >= self.config.queue_size:
+                self.counters['rejected_full'] += 1
+                raise AdmissionRejected(429, self._retry_after())
+
+            waiter = _Waiter(cost, loop)
+            heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+            self._waiting += 1
+            self.counters['queued'] += 1
+            self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], self._waiting)
+            return waiter
+
+    def _poll_interval(self, remaining):
+        # Token refills wake nobody, so bucket-limited waiters re-check
+        return min(remaining, 0.05) if self.config.tokens_per_minute > 0 else remaining
+
+    def _check(self, waiter, start):
+        """After a wake-up: True if admitted, raises once the wait is over."""
+        with self._lock:
+            if not waiter.granted:
+                self._dispatch()
+            if waiter.granted:
+                waited = (time.monotonic() - start) * 1000
+                self.counters['admitted'] += 1
+                self.counters['wait_ms'] += waited
+                self.counters['max_wait_ms'] = max(self.counters['max_wait_ms'], waited)
+                return True
+            if time.monotonic() - start >= self.config.queue_timeout:
+                waiter.cancelled = True
+                self._waiting -= 1
+                self.counters['rejected_timeout'] += 1
+                raise AdmissionRejected(503, self._retry_after())
+            return False
+
+    def acquire(self, cost: int, priority: int = NEW_SESSION):
+        waiter = self._enter(cost, priority)
+        if waiter is None:
+            return
+        start = time.monotonic()
+        while True:
+            remaining = self.config.queue_timeout - (time.monotonic() - start)
+            if remaining > 0:
+                waiter.event.wait(self._poll_interval(remaining))
+            if self._check(waiter, start):
+                return
+
+    async def aacquire(self, cost: int, priority: int = NEW_SESSION):
+        waiter = self._enter(cost, priority, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        start = time.monotonic()
+        try:
+            while True:
+                remaining = self.config.queue_timeout - (time.monotonic() - start)
+                if remaining > 0:
+                    try:
+                        await asyncio.wait_for(waiter.event.wait(), self._poll_interval(remaining))
+                    except asyncio.TimeoutError:
+                        pass
+                if self._check(waiter, start):
+                    return
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release(None)
+                else:
+                    waiter.cancelled = True
+                    self._waiting -= 1
+            raise
+
+    def _release(self, elapsed_ms):
+        self._active -= 1
+        if elapsed_ms is not None:
+            self.call_ms = elapsed_ms if self.call_ms is None else 0.9 * self.call_ms + 0.1 * elapsed_ms
+        self._dispatch()
+
+    def release(self, elapsed_ms: float = None):
+        with self._lock:
+            self._release(elapsed_ms)
+
+    @contextmanager
+    def admit(self, cost: int):
+        self.acquire(cost, _claim_priority())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release((time.perf_counter() - start) * 1000)
+
+    @asynccontextmanager
+    async def aadmit(self, cost: int):
+        await self.aacquire(cost, _claim_priority())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release((time.perf_counter() - start) * 1000)
+
+    def saturated(self):
+        """Retry-After in seconds if a new call would be rejected now, else None."""
+        with self._lock:
+            if self._waiting >= self.config.queue_size:
+                return self._retry_after()
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill()
+            counters = dict(self.counters)
+            active, waiting, tokens = self._active, self._waiting, self._tokens
+        admitted = counters['admitted']
+        return {
+            'max_concurrency': self.config.max_concurrency,
+            'tokens_per_minute': self.config.tokens_per_minute,
+            'active': active,
+            'queue_depth': waiting,
+            'tokens_available': round(tokens) if self.config.tokens_per_minute > 0 else None,
+            **counters,
+            'avg_wait_ms': round(counters['wait_ms'] / counters['queued'], 2) if counters['queued'] else 0.0,
+            'call_ms': round(self.call_ms, 1) if self.call_ms is not None else None,
+            'admitted_ratio': round(admitted / (admitted + counters['rejected_full'] + counters['rejected_timeout']), 4) if admitted else 0.0
+        }
+
+class AdmittedChatModel(BaseChatModel):
+    """Chat model wrapper that takes an admission slot for every call."""
+
+    model: BaseChatModel
+    controller: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"admitted-{self.model._llm_type}"
+
+    def _cost(self, messages, kwargs) -> int:
+        tokens = sum(count_tokens(message.content, self.controller.config.token_model) + 4 for message in messages)
+        functions = kwargs.get('functions')
+        if functions:
+            tokens += len(json.dumps(functions)) // 4
+        return tokens + self.controller.config.completion_tokens
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        with self.controller.admit(self._cost(messages, kwargs)):
+            return self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        with self.controller.admit(self._cost(messages, kwargs)):
+            yield from self.model._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async with self.controller.aadmit(self._cost(messages, kwargs)):
+            return await self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async with self.controller.aadmit(self._cost(messages, kwargs)):
+            async for chunk in self.model._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
@@ -1,13 +1,160 @@
 from langchain.agents import create_openai_functions_agent, AgentExecutor
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from langchain_core.agents import AgentFinish
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables.config import run_in_executor
 from llm import llm
-from tools import available_tools
-import json
+from admission import AdmissionRejected, begin_turn
+from resilience import DeadlineExceeded, start_deadline
+from tools import available_tools, faq_corpus, faq_search_flight, is_tool_error, split_final_result
+from logs import get_logger, pipeline as log_pipeline
+from memory import MemoryConfig, TokenBudgetMemory
+from metrics import current_trace, metrics, use_trace
+from profiling import current_capture
+from packing import count_tokens
+from response_cache import ResponseCache, ResponseCacheConfig
+from router import IntentRouter, RouterConfig
+from singleflight import SingleFlight
+from sessions import AsyncSessionLocks, SessionConfig, SessionLocks, SessionManager, build_session_store, message_to_record, record_to_message
+import asyncio
+import os
+import queue
+import threading
+import time
+
+class StreamingQueueHandler(BaseCallbackHandler):
+    """Pushes LLM tokens and tool events onto a queue as the executor runs."""
+
+    def __init__(self, events: queue.Queue):
+        self.events = events
+        self.streamed = False
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        # Function-call turns stream empty content; only forward answer text
+        if token:
+            self.streamed = True
+            self.events.put({'chunk': token})
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.events.put({'tool_start': {'tool': serialized.get('name'), 'input': input_str}})
+
+    def on_tool_end(self, output, **kwargs):
+        self.events.put({'tool_end': {'tool': kwargs.get('name')}})
+
+class AsyncStreamingQueueHandler(AsyncCallbackHandler):
+    """StreamingQueueHandler for async runs, feeding an asyncio.Queue."""
+
+    def __init__(self, events: asyncio.Queue):
+        self.events = events
+        self.streamed = False
+
+    async def on_llm_new_token(self, token: str, **kwargs):
+        if token:
+            self.streamed = True
+            self.events.put_nowait({'chunk': token})
+
+    async def on_tool_start(self, serialized, input_str, **kwargs):
+        self.events.put_nowait({'tool_start': {'tool': serialized.get('name'), 'input': input_str}})
+
+    async def on_tool_end(self, output, **kwargs):
+        self.events.put_nowait({'tool_end': {'tool': kwargs.get('name')}})
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times the LLM and tool calls of one agent turn and counts its steps."""
+
+    # Called inline in async runs too; it only takes short locks
+    run_inline = True
+
+    def __init__(self, metrics, token_model='gpt-3.5-turbo'):
+        self.metrics = metrics
+        self.token_model = token_model
+        self.iterations = 0
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.iterations += 1
+        prompt = sum(count_tokens(m.content, self.token_model) + 4 for batch in messages for m in batch if isinstance(m.content, str))
+        self._started[run_id] = (time.perf_counter(), prompt)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        start, prompt = started
+        self.metrics.observe('llm', time.perf_counter() - start, 'agent')
+
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        if usage:
+            prompt, completion = usage.get('prompt_tokens', prompt), usage.get('completion_tokens', 0)
+        else:
+            completion = 0
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, 'message', None)
+                    call = message.additional_kwargs.get('function_call') if message is not None else None
+                    text = generation.text + (call.get('arguments', '') if call else '')
+                    completion += count_tokens(text, self.token_model) if text else 0
+        self.metrics.tokens.inc(prompt, ('prompt',))
+        self.metrics.tokens.inc(completion, ('completion',))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.metrics.observe('llm', time.perf_counter() - started[0], 'agent_error')
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._started[run_id] = (time.perf_counter(), serialized.get('name', ''))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.metrics.observe('tool', time.perf_counter() - started[0], started[1])
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.on_tool_end(None, run_id=run_id)
+
+class DirectReturnAgentExecutor(AgentExecutor):
+    """Finishes the run as soon as a tool marks its observation as final.
+
+    Ticket tools return a complete, customer-ready answer plus a JSON
+    payload; having the model restate it costs a full LLM round trip. The
+    payload is returned under 'data' alongside 'output'.
+    """
+
+    direct_return: bool = True
+
+    def _get_tool_return(self, next_step_output):
+        agent_action, observation = next_step_output
+        if self.direct_return and isinstance(observation, str):
+            final = split_final_result(observation)
+            if final is not None:
+                message, payload = final
+                return AgentFinish({"output": message, "data": payload}, "")
+        return super()._get_tool_return(next_step_output)
+
+def find_wrapper_attr(model, name):
+    """Look `name` up through a chain of wrapper models linked by `.model`."""
+    while isinstance(model, BaseChatModel):
+        if name in model.__fields__:
+            return getattr(model, name)
+        model = getattr(model, 'model', None)
+    return None
+
+logger = get_logger('agent')
+
+DEADLINE_MESSAGE = "I'm sorry, this is taking longer than expected. Please try again in a moment."
+TECHNICAL_ISSUE = "I apologize, but I encountered a technical issue: {}. Please try again."
 
 class LumiAgent:
-    def __init__(self):
-        self.llm = llm
+    def __init__(self, model=None):
+        self.llm = model or llm
+        # Set when the model is wrapped by admission.AdmittedChatModel or
+        # resilience.ResilientChatModel (see llm.LLMConfig)
+        self.admission = find_wrapper_attr(self.llm, 'controller')
+        self.policy = find_wrapper_attr(self.llm, 'policy')
+        self.request_deadline = self.policy.config.request_deadline if self.policy is not None else 0
         
         system_prompt = """You are Lumi, an intelligent Apple support assistant.
 
@@ -38,70 +185,404 @@ class LumiAgent:
             prompt=self.prompt
         )
         
-        self.sessions = {}
+        # Agent, tools and prompt are the same for everyone, so one executor
+        # serves every session; history is passed in per call
+        self.executor = DirectReturnAgentExecutor(
+            agent=self.agent,
+            tools=available_tools,
+            # LangChain's console trace writes synchronously on every step
+            verbose=log_pipeline.config.agent_verbose,
+            max_iterations=3,
+            early_stopping_method="generate",
+            # Lets _finish see tool errors before an answer is cached
+            return_intermediate_steps=True,
+            direct_return=os.getenv('LUMI_DIRECT_RETURN', '1') == '1'
+        )
+        
+        self.memory = TokenBudgetMemory(MemoryConfig(), self.llm)
+        self.router = IntentRouter(RouterConfig())
+        self.responses = ResponseCache(ResponseCacheConfig())
+        # The response cache serves repeats after an answer is stored; this
+        # covers identical questions that arrive while it is being generated
+        self.coalesce_answers = os.getenv('LUMI_COALESCE_ANSWERS', '1') == '1'
+        self.answers = SingleFlight()
+        # Moving average of full agent turns, the baseline for router savings
+        self.agent_ms = None
+        
+        session_config = SessionConfig()
+        self.history = build_session_store(session_config)
+        self.sessions = SessionManager(self._new_session, session_config, on_evict=self.history.evict, on_sweep=self.history.expire)
+        # Turns for one session are applied one at a time, in arrival order
+        self.locks = SessionLocks(self.history)
+        self.async_locks = AsyncSessionLocks(self.history)
+        self._tasks = set()
+        
+        metrics.gauge('lumi_sessions', "Sessions held in memory.", lambda: self.sessions.stats()['size'])
+        if self.admission is not None:
+            metrics.gauge('lumi_llm_active_calls', "LLM calls in flight.", lambda: self.admission.stats()['active'])
+            metrics.gauge('lumi_llm_queue_depth', "LLM calls waiting for admission.", lambda: self.admission.stats()['queue_depth'])
+    
+    def _new_session(self, session_id: str):
+        session = {
+            'messages': [],
+            'cursor': 0,
+            'persisted': 0
+        }
+        TokenBudgetMemory.reset(session)
+        return session
     
     def get_session(self, session_id: str):
-        if session_id not in self.sessions:
-            memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True,
-                max_token_limit=1500
-            )
-            
-            executor = AgentExecutor(
-                agent=self.agent,
-                tools=available_tools,
-                memory=memory,
-                verbose=True,
-                max_iterations=3,
-                early_stopping_method="generate"
-            )
-            
-            self.sessions[session_id] = {
-                'executor': executor,
-                'memory': memory
-            }
+        session = self.sessions.get(session_id)
+        with metrics.stage('session', 'load'):
+            self._load_history(session_id, session)
+        return session
+    
+    def _load_history(self, session_id: str, session, reload=False):
+        # Pull only the turns other workers stored since this one last looked
+        messages = session['messages']
+        if reload:
+            messages.clear()
+            session['cursor'] = 0
+            TokenBudgetMemory.reset(session)
+        records, session['cursor'] = self.history.load(session_id, session['cursor'])
+        for record in records:
+            if not TokenBudgetMemory.restore(session, record):
+                messages.append(record_to_message(record))
+        session['persisted'] = len(messages)
+    
+    def _save_history(self, session_id: str, session):
+        messages = session['messages']
+        new_messages = messages[session['persisted']:]
+        if not new_messages:
+            return
+        
+        records = [message_to_record(message) for message in new_messages]
+        summary = TokenBudgetMemory.summary_record(session)
+        if summary is not None:
+            records.append(summary)
+        with metrics.stage('session', 'save'):
+            cursor = self.history.append(session_id, records, session['cursor'])
+        if cursor is None:
+            self._load_history(session_id, session, reload=True)
+        else:
+            session['cursor'] = cursor
+            session['persisted'] = len(messages)
+            session['summary_saved'] = session['summarized']
+    
+    def _remember(self, user_message: str, response: str, session_id: str, session):
+        session['messages'].extend([HumanMessage(content=user_message), AIMessage(content=response)])
+        self._save_history(session_id, session)
+    
+    def _route(self, user_message: str, session_id: str, session):
+        routed = self.router.route(user_message, first_turn=not session['messages'])
+        if routed is None:
+            return None
+        
+        # Routed turns go into memory like any other, so follow-ups have context
+        self._remember(user_message, routed['response'], session_id, session)
+        if self.agent_ms is not None:
+            self.router.record_saving(self.agent_ms - routed['elapsed_ms'])
+        return routed
+    
+    def _cache_version(self, user_message: str, session):
+        """FAQ corpus version to cache this turn under, or None if it can't be shared."""
+        if not self.responses.cacheable(user_message, session):
+            self.responses.skip()
+            return None
+        try:
+            return faq_corpus.load().version
+        except FileNotFoundError:
+            return None
+    
+    def _cached(self, user_message: str, session_id: str, session, version):
+        if version is None:
+            return None
+        response = self.responses.get(user_message, version)
+        if response is not None:
+            self._remember(user_message, response, session_id, session)
+        return response
+    
+    def _fast_path(self, user_message: str, session_id: str):
+        """Load the session and answer from the router or response cache if possible.
+
+        Returns `(session, cache_version, reply)`; `reply` is None when the
+        turn needs the agent.
+        """
+        session = self.get_session(session_id)
+        routed = self._route(user_message, session_id, session)
+        if routed is not None:
+            return session, None, {'response': routed['response'], 'data': routed['data']}
         
-        return self.sessions[session_id]
+        version = self._cache_version(user_message, session)
+        cached = self._cached(user_message, session_id, session, version)
+        if cached is not None:
+            return session, version, {'response': cached, 'data': None}
+        return session, version, None
+    
+    def _inputs(self, user_message: str, session):
+        return {
+            "input": user_message,
+            "chat_history": self.memory.history(session)
+        }
+    
+    def _finish(self, user_message: str, session_id: str, session, result, start, cache_version):
+        elapsed = (time.perf_counter() - start) * 1000
+        self.agent_ms = elapsed if self.agent_ms is None else 0.9 * self.agent_ms + 0.1 * elapsed
+        if cache_version is not None:
+            if self._shareable(result):
+                self.responses.put(user_message, result['output'], cache_version)
+            else:
+                self.responses.skip()
+        self._remember(user_message, result['output'], session_id, session)
+        return result
+    
+    @staticmethod
+    def _shareable(result) -> bool:
+        """Whether an answer may be replayed to others: no payload and nothing failed."""
+        if result.get('data') is not None:
+            return False
+        output = result['output']
+        if output == DEADLINE_MESSAGE or output.startswith(TECHNICAL_ISSUE.split('{}')[0]):
+            return False
+        return not any(is_tool_error(observation) for _, observation in result.get('intermediate_steps', ()))
+
+    def _answer_key(self, user_message: str, cache_version):
+        """Single-flight key for a stateless turn, or None if it must run on its own."""
+        if cache_version is None or not self.coalesce_answers:
+            return None
+        return (self.responses.normalize(user_message), cache_version)
+    
+    def _callbacks(self, callbacks):
+        """Callbacks for one executor run, plus a metrics handler when metrics are on."""
+        handler = None
+        if metrics.enabled:
+            handler = MetricsCallbackHandler(metrics)
+            callbacks = (callbacks or []) + [handler]
+        return ({"callbacks": callbacks} if callbacks else None), handler
+    
+    @staticmethod
+    def _count_iterations(handler):
+        if handler is not None and handler.iterations:
+            metrics.iterations.observe(handler.iterations)
+    
+    def _run(self, user_message: str, session_id: str, session, callbacks=None, cache_version=None):
+        start = time.perf_counter()
+        inputs = self._inputs(user_message, session)
+        config, handler = self._callbacks(callbacks)
+        key = self._answer_key(user_message, cache_version)
+        with metrics.stage('agent', 'turn'):
+            if key is None:
+                result = self.executor.invoke(inputs, config=config)
+            else:
+                # Identical first-turn questions in flight share one agent run
+                result = self.answers.do(key, lambda: self.executor.invoke(inputs, config=config))
+        self._count_iterations(handler)
+        return self._finish(user_message, session_id, session, result, start, cache_version)
     
     def process_message(self, user_message: str, session_id: str = "default"):
+        """Return `{'response': text, 'data': payload or None}` for one turn."""
+        start_deadline(self.request_deadline)
         try:
-            session = self.get_session(session_id)
-            
-            result = session['executor'].invoke({
-                "input": user_message,
-                "chat_history": session['memory'].chat_memory.messages
-            })
-            
-            response_text = result['output']
-            
-            # Extract and print JSON if present
-            try:
-                if '{' in response_text and '}' in response_text:
-                    # Find all JSON objects in the response
-                    import re
-                    json_matches = re.findall(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response_text)
-                    for json_str in json_matches:
-                        try:
-                            json_data = json.loads(json_str)
-                            print("\n" + "="*50)
-                            print("COMPLAINT JSON RESPONSE:")
-                            print("="*50)
-                            print(json.dumps(json_data, indent=2))
-                            print("="*50 + "\n")
-                            break
-                        except json.JSONDecodeError:
-                            continue
-            except Exception as e:
-                print(f"Error parsing JSON: {e}")
-            
-            return response_text
-            
+            with self.locks.hold(session_id):
+                session, version, reply = self._fast_path(user_message, session_id)
+                if reply is not None:
+                    return reply
+                
+                begin_turn(continuing=bool(session['messages']))
+                result = self._run(user_message, session_id, session, cache_version=version)
+                return {'response': result['output'], 'data': result.get('data')}
+        except AdmissionRejected:
+            # The API turns this into 429/503 with Retry-After
+            raise
+        except DeadlineExceeded:
+            return {'response': DEADLINE_MESSAGE, 'data': None}
         except Exception as e:
-            return f"I apologize, but I encountered a technical issue: {str(e)}. Please try again."
+            logger.exception("turn failed", extra={'session_id': session_id})
+            return {
+                'response': TECHNICAL_ISSUE.format(e),
+                'data': None
+            }
     
+    def stream_message(self, user_message: str, session_id: str = "default"):
+        """Yield events while the agent runs.
+
+        Events are `{'chunk': token}`, `{'tool_start': ...}`, `{'tool_end': ...}`,
+        then `{'done': True, 'data': payload or None}` or `{'error': message}`.
+        """
+        self.locks.acquire(session_id)
+        # The agent thread takes over the lock so a client that disconnects
+        # mid-stream does not let the next turn start before this one is saved
+        handed_off = False
+        try:
+            session, version, reply = self._fast_path(user_message, session_id)
+            if reply is not None:
+                yield {'chunk': reply['response']}
+                yield {'done': True, 'data': reply['data']}
+                return
+            
+            events = queue.Queue()
+            handler = StreamingQueueHandler(events)
+
+            continuing = bool(session['messages'])
+            trace, capture = current_trace(), current_capture()
+
+            def run():
+                try:
+                    use_trace(trace)
+                    begin_turn(continuing)
+                    start_deadline(self.request_deadline)
+                    with capture:
+                        result = self._run(user_message, session_id, session, callbacks=[handler], cache_version=version)
+                    if 'data' in result or not handler.streamed:
+                        # Direct-return answers come from a tool, and coalesced
+                        # turns from another run, not from streamed tokens
+                        events.put({'chunk': result['output']})
+                    events.put({'done': True, 'data': result.get('data')})
+                except AdmissionRejected as e:
+                    events.put(self._rejection_event(e))
+                except DeadlineExceeded:
+                    events.put({'error': DEADLINE_MESSAGE})
+                except Exception as e:
+                    logger.exception("turn failed", extra={'session_id': session_id})
+                    events.put({'error': TECHNICAL_ISSUE.format(e)})
+                finally:
+                    self.locks.release(session_id)
+
+            threading.Thread(target=run, daemon=True).start()
+            handed_off = True
+
+            while True:
+                event = events.get()
+                yield event
+                if 'done' in event or 'error' in event:
+                    return
+        finally:
+            if not handed_off:
+                self.locks.release(session_id)
+
+    async def _arun(self, user_message: str, session_id: str, session, callbacks=None, cache_version=None):
+        # Store, cache and memory work is blocking I/O; it runs on the loop's
+        # bounded default executor, with this turn's context (admission
+        # priority, deadline), while the model calls stay on the loop
+        start = time.perf_counter()
+        inputs = await run_in_executor(None, self._inputs, user_message, session)
+        config, handler = self._callbacks(callbacks)
+        key = self._answer_key(user_message, cache_version)
+        with metrics.stage('agent', 'turn'):
+            if key is None:
+                result = await self.executor.ainvoke(inputs, config=config)
+            else:
+                result = await self.answers.ado(key, lambda: self.executor.ainvoke(inputs, config=config))
+        self._count_iterations(handler)
+        return await run_in_executor(None, self._finish, user_message, session_id, session, result, start, cache_version)
+
+    async def aprocess_message(self, user_message: str, session_id: str = "default"):
+        """Async `process_message`; the turn holds no thread while the model runs."""
+        start_deadline(self.request_deadline)
+        try:
+            async with self.async_locks.hold(session_id):
+                session, version, reply = await run_in_executor(None, self._fast_path, user_message, session_id)
+                if reply is not None:
+                    return reply
+                
+                begin_turn(continuing=bool(session['messages']))
+                result = await self._arun(user_message, session_id, session, cache_version=version)
+                return {'response': result['output'], 'data': result.get('data')}
+        except AdmissionRejected:
+            raise
+        except DeadlineExceeded:
+            return {'response': DEADLINE_MESSAGE, 'data': None}
+        except Exception as e:
+            logger.exception("turn failed", extra={'session_id': session_id})
+            return {
+                'response': TECHNICAL_ISSUE.format(e),
+                'data': None
+            }
+
+    async def astream_message(self, user_message: str, session_id: str = "default"):
+        """Async `stream_message`, yielding the same events."""
+        await self.async_locks.acquire(session_id)
+        handed_off = False
+        try:
+            session, version, reply = await run_in_executor(None, self._fast_path, user_message, session_id)
+            if reply is not None:
+                yield {'chunk': reply['response']}
+                yield {'done': True, 'data': reply['data']}
+                return
+            
+            events = asyncio.Queue()
+            handler = AsyncStreamingQueueHandler(events)
+
+            continuing = bool(session['messages'])
+
+            async def run():
+                try:
+                    begin_turn(continuing)
+                    start_deadline(self.request_deadline)
+                    result = await self._arun(user_message, session_id, session, callbacks=[handler], cache_version=version)
+                    if 'data' in result or not handler.streamed:
+                        events.put_nowait({'chunk': result['output']})
+                    events.put_nowait({'done': True, 'data': result.get('data')})
+                except AdmissionRejected as e:
+                    events.put_nowait(self._rejection_event(e))
+                except DeadlineExceeded:
+                    events.put_nowait({'error': DEADLINE_MESSAGE})
+                except Exception as e:
+                    logger.exception("turn failed", extra={'session_id': session_id})
+                    events.put_nowait({'error': TECHNICAL_ISSUE.format(e)})
+                finally:
+                    self.async_locks.release(session_id)
+
+            # The loop only keeps weak references to tasks; hold this one so
+            # it finishes and saves the turn even if the client goes away
+            task = asyncio.ensure_future(run())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            handed_off = True
+
+            while True:
+                event = await events.get()
+                yield event
+                if 'done' in event or 'error' in event:
+                    return
+        finally:
+            if not handed_off:
+                self.async_locks.release(session_id)
+
+    @staticmethod
+    def _rejection_event(error: AdmissionRejected):
+        return {'error': str(error), 'status': error.status, 'retry_after': error.retry_after}
+
+    def saturated(self):
+        """Retry-After seconds if the LLM queue is full, so a request can be refused early."""
+        return self.admission.saturated() if self.admission is not None else None
+
+    def stats(self) -> dict:
+        return {
+            'sessions': self.sessions.stats(),
+            'memory': self.memory.stats(),
+            'router': self.router.stats(),
+            'responses': self.responses.stats(),
+            'session_locks': self.locks.stats(),
+            'async_session_locks': self.async_locks.stats(),
+            'admission': self.admission.stats() if self.admission is not None else None,
+            'llm_calls': self.policy.stats() if self.policy is not None else None,
+            'singleflight': {
+                'faq_search': faq_search_flight.stats(),
+                'answers': self.answers.stats()
+            }
+        }
+
+    def _clear(self, session_id: str):
+        self.sessions.remove(session_id)
+        self.history.clear(session_id)
+
     def clear_session(self, session_id: str):
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        with self.locks.hold(session_id):
+            self._clear(session_id)
+
+    async def aclear_session(self, session_id: str):
+        async with self.async_locks.hold(session_id):
+            await run_in_executor(None, self._clear, session_id)
 
 lumi_agent = LumiAgent()
\ No newline at end of file
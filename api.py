@@ -1,13 +1,40 @@
-from flask import Flask, request, jsonify, Response
-from agent import lumi_agent
-from tools import init_db
+from flask import Flask, request, jsonify, Response, g, send_file
+from errors import AdmissionRejected
+from db import mongo_pool
+from logs import get_logger, pipeline as log_pipeline
+from metrics import current_trace, metrics, start_trace, use_trace
+from profiling import NO_CAPTURE, profiler, use_capture
+from startup import startup
 import os
 import json
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 app = Flask(__name__)
+logger = get_logger('api')
+
+def busy(message: str, status: int, retry_after: int):
+    response = jsonify({'error': message, 'retry_after': retry_after})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.before_request
+def begin_request():
+    g.start = time.perf_counter()
+    g.trace = start_trace(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def end_request(response):
+    response.headers['X-Trace-ID'] = g.trace.id
+    # Streams are timed when the last event has been sent
+    if not response.is_streamed and request.endpoint not in ('metrics_endpoint', None):
+        metrics.observe_request(request.endpoint, response.status_code, time.perf_counter() - g.start)
+        if metrics.enabled:
+            response.headers['Server-Timing'] = g.trace.server_timing()
+    return response
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -16,60 +43,123 @@ def chat():
         user_message = data.get('message', '')
         session_id = data.get('session_id', 'default')
         
-        print(f"\n[API] Received message: {user_message}")
-        print(f"[API] Session ID: {session_id}")
-        
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
         
-        print("[API] Processing with agent...")
-        response = lumi_agent.process_message(user_message, session_id)
-        print(f"[API] Agent response ready, sending back to frontend")
+        logger.debug("chat message", extra={'session_id': session_id, 'text': user_message})
+        with profiler.begin(request.headers.get('X-Lumi-Profile'), g.trace.id) as capture:
+            reply = startup.agent().process_message(user_message, session_id)
+        logger.info("chat reply", extra={'session_id': session_id, 'chars': len(reply['response']), 'has_data': reply['data'] is not None})
         
-        return jsonify({
-            'response': response,
+        body = {
+            'response': reply['response'],
+            'data': reply['data'],
             'session_id': session_id
-        })
+        }
+        if capture.summary:
+            body['profile'] = capture.summary
+        return jsonify(body)
         
+    except AdmissionRejected as e:
+        return busy(str(e), e.status, e.retry_after)
     except Exception as e:
-        print(f"[API] Error: {e}")
+        logger.exception("chat failed")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/chat-stream', methods=['POST'])
 def chat_stream():
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+
+    # Refuse before the stream starts; once it has, errors can only be events.
+    # An empty message is answered below without building the agent.
+    if user_message:
+        retry_after = startup.agent().saturated()
+        if retry_after is not None:
+            return busy("The assistant is busy. Please retry shortly.", 429, retry_after)
+
+    trace, start = current_trace(), g.start
+    # The agent thread profiles the run; the summary rides on the done event
+    capture = profiler.begin(request.headers.get('X-Lumi-Profile'), trace.id) if user_message else NO_CAPTURE
+
     def generate():
+        # The server iterates this outside the request context
+        use_trace(trace)
+        if not user_message:
+            yield f"data: {json.dumps({'error': 'Message is required'})}\n\n"
+            return
+
+        use_capture(capture)
         try:
-            data = request.get_json()
-            user_message = data.get('message', '')
-            session_id = data.get('session_id', 'default')
-            
-            if not user_message:
-                yield f"data: {json.dumps({'error': 'Message is required'})}\n\n"
-                return
-            
-            response = lumi_agent.process_message(user_message, session_id)
-            
-            for char in response:
-                yield f"data: {json.dumps({'chunk': char})}\n\n"
-            
-            yield f"data: {json.dumps({'done': True})}\n\n"
-            
+            for event in startup.agent().stream_message(user_message, session_id):
+                if 'done' in event and capture.summary:
+                    event = {**event, 'profile': capture.summary}
+                yield f"data: {json.dumps(event)}\n\n"
         except Exception as e:
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
-    
-    return Response(generate(), mimetype='text/plain')
+        finally:
+            capture.close()
+            metrics.observe_request('chat_stream', 200, time.perf_counter() - start)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/health', methods=['GET'])
 def health():
+    ready, details = startup.readiness()
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if ready else 'starting' if details['state'] in ('cold', 'warming') else 'unhealthy',
         'agent': 'Lumi AI Assistant',
-        'version': '2.0'
+        'version': '2.0',
+        **details
+    })
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    return jsonify(startup.liveness())
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    ready, details = startup.readiness()
+    return jsonify(details), 200 if ready else 503
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'mongo': mongo_pool.stats(),
+        'logging': log_pipeline.stats(),
+        'profiling': profiler.stats(),
+        **startup.agent().stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled (LUMI_METRICS=0)'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    if not profiler.authorized(request.headers.get('X-Lumi-Profile')):
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'profiles': profiler.list(), **profiler.stats()})
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    # 404 rather than 403 so the endpoint does not advertise itself
+    if not profiler.authorized(request.headers.get('X-Lumi-Profile')):
+        return jsonify({'error': 'Not found'}), 404
+    if profile_id not in {profile['id'] for profile in profiler.list()}:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(profiler.path(profile_id), mimetype='application/octet-stream', as_attachment=True, download_name=f"{profile_id}.prof")
+
 @app.route('/session/<session_id>/clear', methods=['POST'])
 def clear_session(session_id):
-    lumi_agent.clear_session(session_id)
+    startup.agent().clear_session(session_id)
     return jsonify({'message': f'Session {session_id} cleared'})
 
 @app.route('/', methods=['GET'])
@@ -80,6 +170,11 @@ def home():
             'chat': 'POST /chat',
             'chat_stream': 'POST /chat-stream',
             'health': 'GET /health',
+            'liveness': 'GET /health/live',
+            'readiness': 'GET /health/ready',
+            'stats': 'GET /stats',
+            'metrics': 'GET /metrics',
+            'profiles': 'GET /profiles (admin)',
             'clear_session': 'POST /session/{id}/clear'
         }
     })
@@ -90,6 +185,9 @@ if __name__ == '__main__':
         print("Please create a .env file with: OPENAI_API_KEY=your_key_here")
         exit(1)
     
-    init_db()
-    print("API available at: http://localhost:5001")
-    app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+    if startup.config.warm_on_start:
+        startup.start()
+    port = int(os.getenv('LUMI_PORT', '5001'))
+    print(f"API available at: http://localhost:{port}")
+    print("Development server; use `gunicorn -c gunicorn.conf.py wsgi:app` in production")
+    app.run(debug=os.getenv('LUMI_DEBUG', '0') == '1', host='0.0.0.0', port=port, threaded=True)
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""asyncio API mode: the same endpoints as api.py on aiohttp.
+
+    python async_api.py
+    gunicorn 'async_api:create_app()' --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:5001
+
+A turn waiting on OpenAI is a suspended coroutine, not a blocked thread,
+so one process can hold thousands of open chats. Blocking work (MongoDB,
+session stores, the FAQ index) runs on a bounded thread pool.
+"""
+from aiohttp import web
+from concurrent.futures import ThreadPoolExecutor
+from admission import AdmissionRejected
+from db import mongo_pool
+from logs import pipeline as log_pipeline
+from metrics import current_trace, metrics, start_trace
+from startup import startup
+import asyncio
+import json
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class AsyncAPIConfig:
+    def __init__(self):
+        self.port = int(os.getenv('LUMI_PORT', '5001'))
+        # Threads for tool and store I/O; turns beyond this queue for a thread
+        # only while they do blocking work, not while the model runs
+        self.io_threads = int(os.getenv('LUMI_IO_THREADS', '32'))
+
+config = AsyncAPIConfig()
+
+def busy(message: str, status: int, retry_after: int):
+    return web.json_response(
+        {'error': message, 'retry_after': retry_after},
+        status=status,
+        headers={'Retry-After': str(retry_after)}
+    )
+
+@web.middleware
+async def trace_requests(request, handler):
+    # Each request runs in its own task, so the trace stays with it
+    start = time.perf_counter()
+    trace = start_trace(request.headers.get('X-Request-ID'))
+    response = await handler(request)
+    if not response.prepared:
+        response.headers['X-Trace-ID'] = trace.id
+        if metrics.enabled:
+            response.headers['Server-Timing'] = trace.server_timing()
+    endpoint = request.match_info.handler
+    if endpoint is not metrics_endpoint:
+        metrics.observe_request(getattr(endpoint, '__name__', request.path), response.status, time.perf_counter() - start)
+    return response
+
+async def chat(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    user_message = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+    if not user_message:
+        return web.json_response({'error': 'Message is required'}, status=400)
+
+    try:
+        reply = await startup.agent().aprocess_message(user_message, session_id)
+    except AdmissionRejected as e:
+        return busy(str(e), e.status, e.retry_after)
+    except Exception as e:
+        return web.json_response({'error': str(e)}, status=500)
+    return web.json_response({
+        'response': reply['response'],
+        'data': reply['data'],
+        'session_id': session_id
+    })
+
+async def chat_stream(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    user_message = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+
+    if user_message:
+        retry_after = startup.agent().saturated()
+        if retry_after is not None:
+            return busy("The assistant is busy. Please retry shortly.", 429, retry_after)
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'X-Trace-ID': current_trace().id
+    })
+    await response.prepare(request)
+
+    async def send(event):
+        await response.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+
+    if not user_message:
+        await send({'error': 'Message is required'})
+        return response
+
+    events = startup.agent().astream_message(user_message, session_id)
+    try:
+        async for event in events:
+            await send(event)
+    except ConnectionResetError:
+        # Client went away; the agent still finishes and saves the turn
+        pass
+    except Exception as e:
+        await send({'error': str(e)})
+    finally:
+        await events.aclose()
+    return response
+
+async def health(request):
+    ready, details = await asyncio.get_running_loop().run_in_executor(None, startup.readiness)
+    return web.json_response({
+        'status': 'healthy' if ready else 'starting' if details['state'] in ('cold', 'warming') else 'unhealthy',
+        'agent': 'Lumi AI Assistant',
+        'version': '2.0',
+        **details
+    })
+
+async def liveness(request):
+    return web.json_response(startup.liveness())
+
+async def readiness(request):
+    # The readiness check may ping MongoDB
+    ready, details = await asyncio.get_running_loop().run_in_executor(None, startup.readiness)
+    return web.json_response(details, status=200 if ready else 503)
+
+async def stats(request):
+    loop = asyncio.get_running_loop()
+    return web.json_response({
+        'mongo': mongo_pool.stats(),
+        'logging': log_pipeline.stats(),
+        **await loop.run_in_executor(None, startup.agent().stats)
+    })
+
+async def metrics_endpoint(request):
+    if not metrics.enabled:
+        return web.json_response({'error': 'Metrics are disabled (LUMI_METRICS=0)'}, status=404)
+    return web.Response(text=metrics.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+async def clear_session(request):
+    session_id = request.match_info['session_id']
+    await startup.agent().aclear_session(session_id)
+    return web.json_response({'message': f'Session {session_id} cleared'})
+
+async def home(request):
+    return web.json_response({
+        'message': 'Lumi AI Assistant API',
+        'endpoints': {
+            'chat': 'POST /chat',
+            'chat_stream': 'POST /chat-stream',
+            'health': 'GET /health',
+            'liveness': 'GET /health/live',
+            'readiness': 'GET /health/ready',
+            'stats': 'GET /stats',
+            'metrics': 'GET /metrics',
+            'clear_session': 'POST /session/{id}/clear'
+        }
+    })
+
+async def on_startup(app):
+    loop = asyncio.get_running_loop()
+    # LangChain runs sync tools on the default executor, so bounding it
+    # bounds tool I/O as well
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=config.io_threads, thread_name_prefix='lumi-io'))
+    # The agent is already imported here; this opens MongoDB, loads the FAQ
+    # index and the tokenizer before the server accepts connections
+    await loop.run_in_executor(None, startup.warm)
+
+def create_app():
+    app = web.Application(middlewares=[trace_requests])
+    app.on_startup.append(on_startup)
+    app.router.add_post('/chat', chat)
+    app.router.add_post('/chat-stream', chat_stream)
+    app.router.add_get('/health', health)
+    app.router.add_get('/health/live', liveness)
+    app.router.add_get('/health/ready', readiness)
+    app.router.add_get('/stats', stats)
+    app.router.add_get('/metrics', metrics_endpoint)
+    app.router.add_post('/session/{session_id}/clear', clear_session)
+    app.router.add_get('/', home)
+    return app
+
+if __name__ == '__main__':
+    if not os.getenv("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY not found!")
+        print("Please create a .env file with: OPENAI_API_KEY=your_key_here")
+        exit(1)
+
+    print(f"Async API available at: http://localhost:{config.port}")
+    web.run_app(create_app(), host='0.0.0.0', port=config.port)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Admission control for LLM calls under a burst, against the fake model.
+
+    python benchmarks/admission_control.py [--burst 60] [--concurrency 4] [--queue 16]
+
+Wraps the fake model (benchmarks/fakes.py) in admission.AdmittedChatModel
+with a small limit. It first gives half the sessions one turn, then sends
+a burst that mixes those continuing sessions with new ones. The run
+checks three things:
+- concurrent LLM calls never exceed the limit
+- overflow is refused with 429/503 and Retry-After
+- continuing sessions wait less than new ones
+
+Pass --tokens-per-minute to exercise the token bucket as well.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--burst', type=int, default=60)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--queue', type=int, default=16)
+    parser.add_argument('--queue-timeout', type=float, default=3.0)
+    parser.add_argument('--tokens-per-minute', type=int, default=0)
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    args = parser.parse_args()
+
+    os.environ.update({
+        'LUMI_LLM_MAX_CONCURRENCY': str(args.concurrency),
+        'LUMI_LLM_QUEUE_SIZE': str(args.queue),
+        'LUMI_LLM_QUEUE_TIMEOUT': str(args.queue_timeout),
+        'LUMI_LLM_TOKENS_PER_MINUTE': str(args.tokens_per_minute),
+        'LUMI_ROUTE_FAQ': '0',
+        'LUMI_RESPONSE_CACHE': '0'
+    })
+    from admission import AdmissionConfig, AdmissionController, AdmittedChatModel
+    controller = AdmissionController(AdmissionConfig())
+    app = setup_offline_env(args.first_token_delay, 0.0, wrap=lambda model: AdmittedChatModel(model=model, controller=controller))
+    from agent import lumi_agent
+    lumi_agent.executor.verbose = False
+
+    peak = {'active': 0}
+    stop = threading.Event()
+
+    def watch():
+        while not stop.is_set():
+            peak['active'] = max(peak['active'], controller.stats()['active'])
+            time.sleep(0.005)
+
+    def post(session_id, message):
+        start = time.perf_counter()
+        response = app.test_client().post('/chat', json={'message': message, 'session_id': session_id})
+        return session_id, response.status_code, response.headers.get('Retry-After'), (time.perf_counter() - start) * 1000
+
+    continuing = [f"returning-{i}" for i in range(args.burst // 2)]
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(lambda sid: post(sid, "How do I reset the SMC?"), continuing))
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    sessions = [sid for pair in zip(continuing, (f"new-{i}" for i in range(args.burst // 2))) for sid in pair]
+    with ThreadPoolExecutor(len(sessions)) as pool:
+        results = list(pool.map(lambda sid: post(sid, "My display still flickers, what next?"), sessions))
+    stop.set()
+
+    by_status = {}
+    for _, status, retry_after, _ in results:
+        by_status.setdefault(status, []).append(retry_after)
+    for status, retry_afters in sorted(by_status.items()):
+        print(f"HTTP {status}: {len(retry_afters):3d} responses" + (f", Retry-After {sorted(set(retry_afters))}" if status != 200 else ""))
+
+    for kind in ('returning', 'new'):
+        served = [ms for sid, status, _, ms in results if status == 200 and sid.startswith(kind)]
+        if served:
+            print(f"{kind:<9} sessions: {len(served):3d} served, p50 {statistics.median(served):8.1f} ms")
+
+    stats = controller.stats()
+    print(f"peak concurrent LLM calls {peak['active']} (limit {args.concurrency})")
+    print(f"max queue depth {stats['max_queue_depth']} (limit {args.queue}), avg wait {stats['avg_wait_ms']} ms, max wait {stats['max_wait_ms']:.1f} ms")
+    if peak['active'] > args.concurrency:
+        raise SystemExit("concurrency limit exceeded")
+    if any(status != 200 and not retry_after for _, status, retry_after, _ in results):
+        raise SystemExit("rejection without Retry-After")
+
+if __name__ == '__main__':
+    main()
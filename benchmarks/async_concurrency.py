@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Open chats held by one async API process against a slow fake LLM.
+
+    python benchmarks/async_concurrency.py [--chats 1000] [--first-token-delay 1.0]
+
+Serves async_api.py in-process with the fake model (benchmarks/fakes.py),
+mongomock and a generated FAQ PDF, then opens `--chats` concurrent
+sessions, half on /chat and half on /chat-stream. Every turn waits on the
+fake model twice. The waits overlap, and the thread count stays at the
+I/O pool size. Wall time does not stay near one turn's latency, though.
+Each turn also spends about 70-85 ms of CPU in LangChain (prompt
+building, parsing, callbacks) on the event loop, and those slices run one
+after another. Expect wall time of about max(one turn, chats x CPU per
+turn / cores used). On one core that is about 17 s for 200 chats and
+about 108 s for 1000 (p50 98 s), against a 2 s turn. The run fails if
+any turn is missing its answer.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+async def chat(http, base, i):
+    start = time.perf_counter()
+    async with http.post(f"{base}/chat", json={'message': f"How do I fix display problem {i}?", 'session_id': f"chat-{i}"}) as response:
+        reply = await response.json()
+    if not reply.get('response'):
+        raise SystemExit(f"chat {i} failed: {reply}")
+    return time.perf_counter() - start, None
+
+async def stream(http, base, i):
+    start = time.perf_counter()
+    first_chunk = None
+    events = []
+    async with http.post(f"{base}/chat-stream", json={'message': f"Why is my wifi slow {i}?", 'session_id': f"stream-{i}"}) as response:
+        async for line in response.content:
+            if not line.startswith(b'data: '):
+                continue
+            event = json.loads(line[len(b'data: '):])
+            if 'chunk' in event and first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            events.append(event)
+    if not events or 'done' not in events[-1]:
+        raise SystemExit(f"stream {i} failed: {events[-1:]}")
+    return time.perf_counter() - start, first_chunk
+
+async def run(args):
+    from aiohttp import ClientSession, TCPConnector, web
+    import async_api
+
+    runner = web.AppRunner(async_api.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+    base = f"http://127.0.0.1:{args.port}"
+
+    peak_threads = threading.active_count()
+
+    async def watch_threads():
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+
+    watcher = asyncio.ensure_future(watch_threads())
+    try:
+        async with ClientSession(connector=TCPConnector(limit=0)) as http:
+            await chat(http, base, -1)
+            start = time.perf_counter()
+            results = await asyncio.gather(*[
+                (stream if i % 2 else chat)(http, base, i) for i in range(args.chats)
+            ])
+            wall = time.perf_counter() - start
+    finally:
+        watcher.cancel()
+        await runner.cleanup()
+
+    latencies = sorted(total * 1000 for total, _ in results)
+    first_chunks = [first * 1000 for _, first in results if first is not None]
+    one_turn = 2 * args.first_token_delay * 1000
+    print(f"chats                 {args.chats}")
+    print(f"wall time             {wall * 1000:8.0f} ms (one turn alone ~{one_turn:.0f} ms)")
+    print(f"turn latency          p50={statistics.median(latencies):8.0f} ms  p95={latencies[int(len(latencies) * 0.95) - 1]:8.0f} ms")
+    print(f"stream first chunk    p50={statistics.median(first_chunks):8.0f} ms")
+    print(f"throughput            {args.chats / wall:8.1f} turns/s")
+    print(f"peak threads          {peak_threads} (I/O pool {async_api.config.io_threads})")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--first-token-delay', type=float, default=1.0)
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+
+    os.environ.setdefault('LUMI_RESPONSE_CACHE', '0')
+    os.environ.setdefault('LUMI_ROUTE_FAQ', '0')
+    setup_offline_env(args.first_token_delay, 0.0)
+    from agent import lumi_agent
+    lumi_agent.executor.verbose = False
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Chunk statistics and retrieval latency for a range of chunk settings.
+
+    python benchmarks/chunking.py [--pdf path] [--paragraphs 400]
+
+Use it to pick RAGConfig.chunk_size / chunk_overlap: larger chunks mean
+fewer postings but more prompt tokens per FAQ result.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sample_faq import write_faq_pdf
+from corpus import ChunkList, chunk_spans, extract_pdf_text
+from retrieval import BM25Index
+
+SETTINGS = [(300, 50), (500, 100), (800, 150), (1200, 200)]
+QUERIES = ["battery health", "reset the SMC", "display flickering", "wifi keeps disconnecting", "macbook will not turn on"]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdf')
+    parser.add_argument('--paragraphs', type=int, default=400)
+    parser.add_argument('--top-k', type=int, default=2)
+    args = parser.parse_args()
+
+    pdf_path = args.pdf or write_faq_pdf(os.path.join(tempfile.mkdtemp(prefix='lumi-bench-'), 'faq.pdf'), args.paragraphs)
+    text = extract_pdf_text(pdf_path)
+    print(f"corpus: {len(text)} chars, {text.count(chr(10) * 2)} blank-line breaks")
+
+    for size, overlap in SETTINGS:
+        start = time.perf_counter()
+        chunks = ChunkList(text, chunk_spans(text, size, overlap))
+        chunk_ms = (time.perf_counter() - start) * 1000
+        stats = chunks.stats()
+
+        index = BM25Index(chunks)
+        latencies, result_chars = [], []
+        for _ in range(20):
+            for query in QUERIES:
+                start = time.perf_counter()
+                hits = index.search(query, args.top_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                result_chars.append(sum(len(chunks[doc_id]) for _, doc_id in hits))
+
+        string_bytes = sum(sys.getsizeof(chunk) for chunk in chunks)
+        offset_bytes = chunks.starts.itemsize * len(chunks) * 2
+        print(f"size={size:<5} overlap={overlap:<4} chunks={stats['chunks']:<5} mean={stats['mean_chars']:<6} "
+              f"p95={stats['p95_chars']:<5} chunking={chunk_ms:6.1f} ms  query p50={statistics.median(latencies):.3f} ms  "
+              f"top{args.top_k} ~{statistics.mean(result_chars) / 4:.0f} tokens  "
+              f"offsets={offset_bytes / 1024:.1f} KiB vs strings={string_bytes / 1024:.1f} KiB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Single-flight coalescing under a burst of identical questions.
+
+    python benchmarks/coalescing.py [--burst 50] [--first-token-delay 0.3]
+
+First `--burst` threads call rag_faq_search with one query at the same
+moment, with and without the single-flight layer. Then `--burst` new
+sessions ask the same opening question through the agent at once. The
+run reports how many scans and LLM calls actually ran, and the
+coalescing ratios from /stats.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+def burst(count, fn):
+    barrier = threading.Barrier(count)
+
+    def call(i):
+        barrier.wait()
+        return fn(i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(count) as pool:
+        results = list(pool.map(call, range(count)))
+    return results, (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--burst', type=int, default=50)
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    args = parser.parse_args()
+
+    os.environ['LUMI_RESPONSE_CACHE'] = '1'
+    os.environ['LUMI_COALESCE_ANSWERS'] = '1'
+    os.environ['LUMI_ROUTE_FAQ'] = '0'
+    app = setup_offline_env(args.first_token_delay, 0.0)
+    import llm
+    import tools
+    from agent import lumi_agent
+    lumi_agent.executor.verbose = False
+    tools.load_corpus()
+
+    query = "How do I fix overheating problems on my MacBook?"
+    scans = {'count': 0}
+    scan = tools._faq_context
+
+    def counted_scan(q):
+        scans['count'] += 1
+        return scan(q)
+
+    tools._faq_context = counted_scan
+    _, plain_ms = burst(args.burst, lambda i: counted_scan(query))
+    plain_scans = scans['count']
+    scans['count'] = 0
+    results, flight_ms = burst(args.burst, lambda i: tools.rag_faq_search.invoke({'query': query}))
+    if len(set(results)) != 1:
+        raise SystemExit("coalesced searches returned different results")
+    print(f"faq search  no single-flight  {plain_scans:4d} scans  {plain_ms:8.1f} ms")
+    print(f"faq search  single-flight     {scans['count']:4d} scans  {flight_ms:8.1f} ms")
+
+    calls = llm.llm.calls
+    replies, answer_ms = burst(args.burst, lambda i: lumi_agent.process_message(query, f"burst-{i}"))
+    if len({reply['response'] for reply in replies}) != 1:
+        raise SystemExit("coalesced answers differ")
+    print(f"agent       {args.burst} new sessions   {llm.llm.calls - calls:4d} LLM calls  {answer_ms:8.1f} ms")
+    if lumi_agent.answers.stats()['executed'] != 1:
+        raise SystemExit(f"expected one agent run for the burst, got {lumi_agent.answers.stats()['executed']}")
+
+    stats = app.test_client().get('/stats').get_json()['singleflight']
+    for name, flight in stats.items():
+        print(f"{name:<12} coalescing ratio {flight['coalescing_ratio']:.2f} "
+              f"(executed {flight['executed']}, coalesced {flight['coalesced']}, cached {flight['cached']})")
+
+if __name__ == '__main__':
+    main()
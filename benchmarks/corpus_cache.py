@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Cold vs warm FAQ lookup latency.
+
+    python benchmarks/corpus_cache.py [--pdf path] [--paragraphs 400] [--runs 50]
+
+Without --pdf a synthetic FAQ PDF is generated in a temp directory.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sample_faq import write_faq_pdf
+
+QUERIES = ["battery health", "reset the SMC", "display flickering", "wifi keeps disconnecting", "macbook will not turn on"]
+
+def timed(fn, runs):
+    samples = []
+    for i in range(runs):
+        start = time.perf_counter()
+        fn(QUERIES[i % len(QUERIES)])
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def report(label, samples):
+    print(f"{label:<32} n={len(samples):<4} mean={statistics.mean(samples):8.3f} ms  median={statistics.median(samples):8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdf')
+    parser.add_argument('--paragraphs', type=int, default=400)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='lumi-bench-')
+    pdf_path = args.pdf or write_faq_pdf(os.path.join(workdir, 'faq.pdf'), args.paragraphs)
+    os.environ['FAQ_PDF_PATH'] = pdf_path
+    os.environ['LUMI_CACHE_DIR'] = os.path.join(workdir, 'cache')
+    # Every lookup must reach the index, not the shared search result cache
+    os.environ['RAG_SEARCH_CACHE_TTL'] = '0'
+
+    from corpus import FAQCorpus, extract_pdf_text
+    from tools import rag_config, rag_faq_search
+
+    def parse_every_call(query):
+        # What rag_faq_search did before the corpus cache
+        extract_pdf_text(rag_config.pdf_path)
+
+    print(f"PDF: {pdf_path} ({os.path.getsize(pdf_path) / 1024:.0f} KiB)")
+    report("parse on every call (old)", timed(parse_every_call, min(args.runs, 10)))
+
+    cold = []
+    for _ in range(5):
+        if os.path.exists(FAQCorpus(rag_config).cache_path):
+            os.remove(FAQCorpus(rag_config).cache_path)
+        start = time.perf_counter()
+        FAQCorpus(rag_config).load()
+        cold.append((time.perf_counter() - start) * 1000)
+    report("cold start (parse + cache)", cold)
+
+    restart = []
+    for _ in range(5):
+        start = time.perf_counter()
+        FAQCorpus(rag_config).load()
+        restart.append((time.perf_counter() - start) * 1000)
+    report("restart (disk cache hit)", restart)
+
+    report("warm lookup (in memory)", timed(rag_faq_search.func, args.runs))
+
+if __name__ == '__main__':
+    main()
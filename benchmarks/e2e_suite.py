@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""End-to-end latency of /chat and /chat-stream on mixed workloads, offline.
+
+    python benchmarks/e2e_suite.py [--workloads faq,tickets,mixed] [--concurrency 1,4,16]
+                                   [--out results.json] [--compare baseline.json]
+
+Boots the Flask app from api.py with the scripted fake LLM in place of
+llm.llm (benchmarks/fakes.py, delays set by --first-token-delay and
+--token-delay), mongomock behind tools.get_mongo_client and a generated
+FAQ PDF. Requests go through the in-process WSGI client, so the numbers
+cover the whole server side without socket overhead.
+
+Every request opens its own session and is one of three kinds:
+- faq: a product question, answered through rag_faq_search
+- create: a complaint with name, phone and email, through create_complaint
+- lookup: a status check for a ticket created during warm-up
+
+For each endpoint, workload and concurrency level the suite reports
+throughput, p50/p95/p99 latency and, for /chat-stream, time to first
+chunk. Results go to --out as JSON; --compare prints the change against
+an earlier file. The router and response cache are off unless
+--fast-paths is given, so every request reaches the agent and the LLM.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from retrieval_quality import QUERIES
+from stream_latency import setup_offline_env, stream_once
+
+WORKLOADS = {
+    'faq': {'faq': 1.0},
+    'tickets': {'create': 0.5, 'lookup': 0.5},
+    'mixed': {'faq': 0.6, 'create': 0.2, 'lookup': 0.2}
+}
+
+NAMES = ['Priya Shah', 'Tom Becker', 'Ana Silva', 'Kenji Mori', 'Lena Novak']
+
+def make_message(kind, rng, tickets):
+    if kind == 'faq':
+        return rng.choice(QUERIES)[1]
+    if kind == 'create':
+        name = rng.choice(NAMES)
+        phone = ''.join(str(rng.randint(0, 9)) for _ in range(10))
+        email = f"{name.split()[0].lower()}@example.com"
+        return f"My name is {name}, phone {phone}, email {email}. My {rng.choice(QUERIES)[0]} stopped working."
+    return f"What is the status of ticket {rng.choice(tickets)}?"
+
+def plan(workload, count, seed):
+    """The request kinds of one run, in a fixed order for a given seed."""
+    rng = random.Random(seed)
+    kinds, weights = zip(*WORKLOADS[workload].items())
+    return [rng.choices(kinds, weights)[0] for _ in range(count)]
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {
+        'p50': round(pick(0.50), 2),
+        'p95': round(pick(0.95), 2),
+        'p99': round(pick(0.99), 2),
+        'mean': round(sum(values) / len(values), 2),
+        'max': round(values[-1], 2)
+    }
+
+def send(app, endpoint, message, session_id):
+    """One request; returns (latency ms, time to first chunk ms or None, ok)."""
+    client = app.test_client()
+    if endpoint == '/chat':
+        start = time.perf_counter()
+        response = client.post('/chat', json={'message': message, 'session_id': session_id})
+        return (time.perf_counter() - start) * 1000, None, response.status_code == 200
+
+    _, first_chunk, total, events = stream_once(client, message, session_id)
+    ok = any('done' in event for event in events) and not any('error' in event for event in events)
+    return total * 1000, first_chunk * 1000 if first_chunk is not None else None, ok
+
+def create_tickets(app, count, rng):
+    tickets = []
+    for i in range(count):
+        response = app.test_client().post('/chat', json={'message': make_message('create', rng, None), 'session_id': f"seed-{i}"})
+        data = response.get_json().get('data') or {}
+        if data.get('complaint_id'):
+            tickets.append(data['complaint_id'])
+    if not tickets:
+        raise SystemExit("warm-up could not create any tickets")
+    return tickets
+
+def run_case(app, endpoint, workload, concurrency, requests_per_case, tickets, seed):
+    rng = random.Random(seed)
+    jobs = [(kind, make_message(kind, rng, tickets)) for kind in plan(workload, requests_per_case, seed)]
+    prefix = f"{endpoint.strip('/')}-{workload}-c{concurrency}"
+
+    def job(item):
+        i, (kind, message) = item
+        return (kind, *send(app, endpoint, message, f"{prefix}-{i}"))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(job, enumerate(jobs)))
+    elapsed = time.perf_counter() - start
+
+    by_kind = {}
+    for kind, latency, _, _ in results:
+        by_kind.setdefault(kind, []).append(latency)
+    first_chunks = [ttfc for _, _, ttfc, _ in results if ttfc is not None]
+    return {
+        'endpoint': endpoint,
+        'workload': workload,
+        'concurrency': concurrency,
+        'requests': len(results),
+        'errors': sum(1 for *_, ok in results if not ok),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'latency_ms': percentiles([latency for _, latency, _, _ in results]),
+        'ttfc_ms': percentiles(first_chunks),
+        'by_kind_ms': {kind: percentiles(values) for kind, values in sorted(by_kind.items())}
+    }
+
+def case_key(case):
+    return (case['endpoint'], case['workload'], case['concurrency'])
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def print_table(cases, baseline=None):
+    previous = {case_key(case): case for case in (baseline or {}).get('cases', [])}
+    print(f"{'endpoint':<12} {'workload':<8} {'conc':>4} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttfc p50':>9} {'errors':>6}")
+    for case in cases:
+        latency, ttfc = case['latency_ms'], case['ttfc_ms']
+        line = (
+            f"{case['endpoint']:<12} {case['workload']:<8} {case['concurrency']:>4} {case['throughput_rps']:>7.1f} "
+            f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} "
+            f"{format(ttfc['p50'], '.1f') if ttfc else '-':>9} {case['errors']:>6}"
+        )
+        before = previous.get(case_key(case))
+        if before:
+            change = lambda new, old: f"{(new - old) / old:+.0%}" if old else "n/a"
+            line += f"  vs baseline: req/s {change(case['throughput_rps'], before['throughput_rps'])}, p95 {change(latency['p95'], before['latency_ms']['p95'])}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--endpoints', default='/chat,/chat-stream')
+    parser.add_argument('--workloads', default='faq,tickets,mixed')
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--requests', type=int, default=48, help="requests per endpoint, workload and concurrency level")
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    parser.add_argument('--fast-paths', action='store_true', help="keep the router and response cache on")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--out', default='e2e_results.json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    fast_paths = '1' if args.fast_paths else '0'
+    os.environ.update({'LUMI_ROUTE_TICKETS': fast_paths, 'LUMI_ROUTE_FAQ': fast_paths, 'LUMI_RESPONSE_CACHE': fast_paths, 'LUMI_COALESCE_ANSWERS': fast_paths})
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    app = setup_offline_env(args.first_token_delay, args.token_delay)
+    from agent import lumi_agent
+    lumi_agent.executor.verbose = False
+    tickets = create_tickets(app, 8, random.Random(args.seed))
+
+    cases = []
+    for endpoint in args.endpoints.split(','):
+        for workload in args.workloads.split(','):
+            for concurrency in [int(level) for level in args.concurrency.split(',')]:
+                cases.append(run_case(app, endpoint, workload, concurrency, args.requests, tickets, args.seed))
+                print(f"{endpoint} {workload} c={concurrency} done", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'settings': {key: value for key, value in vars(args).items() if key not in ('out', 'compare')}
+        },
+        'cases': cases
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_table(cases, baseline)
+    print(f"\nwrote {args.out}")
+    if any(case['errors'] for case in cases):
+        raise SystemExit("some requests failed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""How often extractive mode answers without the LLM, and how well.
+
+    python benchmarks/extractive_eval.py [--margins 0.1,0.2,0.3,0.5] [--first-token-delay 0.5]
+
+Runs the labelled queries of retrieval_quality.py plus some that no FAQ
+answers against the generated FAQ (one paragraph per topic by default),
+with the fake LLM behind the agent. For each margin it reports the share
+of queries served extractively, how many of those quoted the right answer,
+and how many should have gone to the agent. It then times every query
+end to end with extractive mode off and on at `--margin`.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from retrieval_quality import QUERIES
+from sample_faq import TOPICS, write_faq_pdf
+from stream_latency import setup_offline_env
+
+# Nothing in the FAQ answers these; they must go to the agent
+UNANSWERABLE = [
+    "I want to file a complaint about my repair",
+    "thanks, that solved it",
+    "do you sell gift cards",
+    "my battery drains and the wifi drops too",
+]
+
+def quotes(response, topic):
+    """True if the response quotes a sentence of the topic's FAQ answer."""
+    text = ' '.join(response.split())
+    answer = dict(TOPICS)[topic]
+    return any(sentence.strip() in text for sentence in answer.split('. '))
+
+def timed_turns(agent, queries, prefix):
+    latencies = []
+    for i, (_, query) in enumerate(queries):
+        start = time.perf_counter()
+        agent.process_message(query, f"{prefix}-{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paragraphs', type=int, default=len(TOPICS))
+    parser.add_argument('--margins', default='0.1,0.2,0.3,0.5')
+    parser.add_argument('--margin', type=float, default=0.3)
+    parser.add_argument('--first-token-delay', type=float, default=0.5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='lumi-extractive-')
+    os.environ.update({
+        'FAQ_PDF_PATH': write_faq_pdf(os.path.join(workdir, 'faq.pdf'), args.paragraphs),
+        # Isolate the margin rule from the coverage rule and the cache
+        'LUMI_ROUTE_FAQ': '0',
+        'LUMI_RESPONSE_CACHE': '0',
+        'LUMI_COALESCE_ANSWERS': '0'
+    })
+    setup_offline_env(args.first_token_delay, 0.0)
+    from agent import lumi_agent
+    lumi_agent.executor.verbose = False
+    router = lumi_agent.router
+    queries = QUERIES + [(None, query) for query in UNANSWERABLE]
+
+    print(f"{len(queries)} queries ({len(UNANSWERABLE)} unanswerable), {args.paragraphs} FAQ paragraphs")
+    print(f"{'margin':>6} {'served':>7} {'right':>6} {'wrong answer':>12} {'should defer':>13} {'route ms':>9}")
+    router.config.extractive = True
+    for margin in [float(value) for value in args.margins.split(',')]:
+        router.config.extractive_margin = margin
+        served = right = wrong = deferred = 0
+        route_ms = []
+        for topic, query in queries:
+            reply = router.route(query)
+            if reply is None:
+                continue
+            served += 1
+            route_ms.append(reply['elapsed_ms'])
+            if topic is None:
+                deferred += 1
+            elif quotes(reply['response'], topic):
+                right += 1
+            else:
+                wrong += 1
+        average = statistics.mean(route_ms) if route_ms else 0.0
+        print(f"{margin:>6.2f} {served / len(queries):>6.0%} {right:>6} {wrong:>12} {deferred:>13} {average:>9.2f}")
+
+    router.config.extractive = False
+    off = timed_turns(lumi_agent, queries, 'off')
+    router.config.extractive = True
+    router.config.extractive_margin = args.margin
+    on = timed_turns(lumi_agent, queries, 'on')
+
+    fast = [i for i, (_, query) in enumerate(queries) if router.route(query) is not None]
+    saved = sum(off[i] - on[i] for i in fast)
+    print(f"\nend to end at margin {args.margin}: {len(fast)}/{len(queries)} served extractively")
+    print(f"mean turn {statistics.mean(off):.1f} ms -> {statistics.mean(on):.1f} ms, "
+          f"p50 {statistics.median(off):.1f} ms -> {statistics.median(on):.1f} ms")
+    if fast:
+        print(f"saved {saved:.0f} ms in total, {saved / len(fast):.0f} ms per extractive answer")
+
+if __name__ == '__main__':
+    main()
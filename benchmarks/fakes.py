@@ -0,0 +1,134 @@
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, FunctionMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from openai import APIConnectionError
+import httpx
+
+TICKET_ID = re.compile(r'\b[A-F0-9]{8}\b')
+TOKEN = re.compile(r'\S+\s*')
+
+def function_call(name: str, **arguments) -> AIMessage:
+    return AIMessage(content="", additional_kwargs={
+        'function_call': {'name': name, 'arguments': json.dumps(arguments)}
+    })
+
+def default_script(messages: List[BaseMessage]) -> AIMessage:
+    """Pick a tool the way the functions agent would, then restate its output."""
+    last = messages[-1]
+    if isinstance(last, FunctionMessage):
+        return AIMessage(content=f"Here is what I found. {last.content}")
+
+    human = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+    if human.startswith("Current summary:"):
+        return AIMessage(content=" ".join(human.split()[-40:]))
+    ticket = TICKET_ID.search(human.upper())
+    if ticket:
+        return function_call('retrieve_complaint', complaint_id=ticket.group())
+    if '@' in human:
+        return function_call('create_complaint', complaint_data=human)
+    return function_call('rag_faq_search', query=human)
+
+class ScriptedChatModel(BaseChatModel):
+    """Offline stand-in for ChatOpenAI that replays scripted replies.
+
+    `script` maps the prompt messages to the next AIMessage, either text or
+    an OpenAI function call. `first_token_delay` models time-to-first-token
+    and `token_delay` the gap between streamed tokens. The async methods
+    wait with asyncio.sleep, like a network call, without holding a thread.
+    A `stall_rate` share of calls waits an extra `stall_delay` first, and an
+    `error_rate` share fails with a connection error, to model a slow tail.
+    """
+
+    script: Callable[[List[BaseMessage]], AIMessage] = default_script
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+    stall_rate: float = 0.0
+    stall_delay: float = 0.0
+    error_rate: float = 0.0
+    calls: int = 0
+
+    def _first_delay(self) -> float:
+        """Count the call and pick its time to first token, or fail it."""
+        self.calls += 1
+        if self.error_rate and random.random() < self.error_rate:
+            raise APIConnectionError(request=httpx.Request('POST', 'https://fake.invalid/v1/chat/completions'))
+        if self.stall_rate and random.random() < self.stall_rate:
+            return self.first_token_delay + self.stall_delay
+        return self.first_token_delay
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.script(messages)
+        tokens = TOKEN.findall(message.content)
+        time.sleep(self._first_delay() + self.token_delay * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self.script(messages)
+        time.sleep(self._first_delay())
+
+        if message.additional_kwargs:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", additional_kwargs=message.additional_kwargs))
+            return
+
+        for token in TOKEN.findall(message.content):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            time.sleep(self.token_delay)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.script(messages)
+        tokens = TOKEN.findall(message.content)
+        await asyncio.sleep(self._first_delay() + self.token_delay * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self.script(messages)
+        await asyncio.sleep(self._first_delay())
+
+        if message.additional_kwargs:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", additional_kwargs=message.additional_kwargs))
+            return
+
+        for token in TOKEN.findall(message.content):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self.token_delay)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Per-request cost of logging, as it was and with the queued pipeline.
+
+    python benchmarks/logging_overhead.py [--turns 100] [--rounds 3] [--clients 1] [--sink file|stderr]
+
+Runs a mix of FAQ questions and ticket creations through /chat on the
+zero-latency fake LLM, so logging is a visible share of each request,
+under four setups:
+- before: LangChain's verbose agent trace plus every record formatted
+  and written synchronously on the request thread, as print() did
+- queued: the default pipeline (logs.py), INFO level, writer thread
+- sampled: the pipeline keeping 10% of INFO records
+- off: WARNING level only, the floor
+The setups take turns for --rounds rounds so drift hits all of them.
+Because a turn does far more work than logging, the run also times the
+log calls of one ticket-creation request on their own, on the caller's
+thread, which is what the request pays. Output goes to a temporary file by default; --sink stderr writes to the
+console instead, where the synchronous writes cost the most.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+def message(i):
+    if i % 4 == 0:
+        return f"My name is Ana Silva, phone 555{i:07d}, email ana{i}@example.com. My screen flickers."
+    return "How do I reset the SMC?"
+
+def configure(mode, sink, agent):
+    from logs import LogConfig, StructuredFormatter, pipeline
+    config = LogConfig()
+    config.level = 'WARNING' if mode == 'off' else 'DEBUG' if mode == 'before' else 'INFO'
+    config.sample = {logging.INFO: 0.1} if mode == 'sampled' else {}
+    pipeline.configure(config, sink)
+    agent.executor.verbose = mode == 'before'
+    if mode == 'before':
+        pipeline.stop()
+        handler = logging.StreamHandler(sink)
+        config.redact = False
+        handler.setFormatter(StructuredFormatter(config))
+        logging.getLogger('lumi').handlers = [handler]
+    return pipeline
+
+def request_logs(count):
+    """Caller-side microseconds for the records one ticket request writes."""
+    api, tools = logging.getLogger('lumi.api'), logging.getLogger('lumi.tools')
+    document = {'complaint_id': 'A1B2C3D4', 'name': 'Ana Silva', 'phone_number': '5550001234',
+                'email': 'ana@example.com', 'complaint_details': message(0), 'status': 'created'}
+    start = time.perf_counter()
+    for i in range(count):
+        api.debug("chat message", extra={'session_id': f"s{i}", 'text': message(0)})
+        tools.info("complaint created", extra={'complaint_id': 'A1B2C3D4'})
+        tools.debug("complaint document", extra={'document': document})
+        api.info("chat reply", extra={'session_id': f"s{i}", 'chars': 80, 'has_data': True})
+    return (time.perf_counter() - start) / count * 1e6
+
+def run(app, turns, clients, prefix):
+    def post(i):
+        start = time.perf_counter()
+        app.test_client().post('/chat', json={'message': message(i), 'session_id': f"{prefix}-{i}"})
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        latencies = list(pool.map(post, range(turns)))
+    return latencies, turns / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--clients', type=int, default=1)
+    parser.add_argument('--sink', choices=['file', 'stderr'], default='file')
+    args = parser.parse_args()
+
+    os.environ.update({'LUMI_ROUTE_FAQ': '0', 'LUMI_ROUTE_TICKETS': '0', 'LUMI_RESPONSE_CACHE': '0', 'LUMI_COALESCE_ANSWERS': '0'})
+    app = setup_offline_env(0.0, 0.0)
+    from agent import lumi_agent
+
+    sink = sys.stderr if args.sink == 'stderr' else tempfile.TemporaryFile('w+')
+    modes = ('before', 'queued', 'sampled', 'off')
+    latencies, throughputs = {mode: [] for mode in modes}, {mode: [] for mode in modes}
+    # The verbose agent trace goes to stdout; send it to the same sink
+    calls = {}
+    with contextlib.redirect_stdout(sink):
+        configure('off', sink, lumi_agent)
+        run(app, args.clients * 4, args.clients, "warm")
+        for round_ in range(args.rounds):
+            for mode in modes:
+                pipeline = configure(mode, sink, lumi_agent)
+                samples, throughput = run(app, args.turns, args.clients, f"{mode}-{round_}")
+                pipeline.flush()
+                latencies[mode].extend(samples)
+                throughputs[mode].append(throughput)
+        for mode in modes:
+            pipeline = configure(mode, sink, lumi_agent)
+            calls[mode] = request_logs(2000)
+            pipeline.flush(timeout=30)
+
+    configure('queued', sys.stderr, lumi_agent)
+    floor = statistics.mean(latencies['off'])
+    print(f"{'setup':<8} {'mean ms':>8} {'p50 ms':>8} {'req/s':>7} {'vs off ms':>10} {'log calls us/req':>17}")
+    for mode in modes:
+        mean = statistics.mean(latencies[mode])
+        print(
+            f"{mode:<8} {mean:>8.2f} {statistics.median(latencies[mode]):>8.2f} {statistics.mean(throughputs[mode]):>7.1f} "
+            f"{mean - floor:>10.2f} {calls[mode]:>17.1f}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Cost of stage instrumentation, per timed block and per /chat turn.
+
+    python benchmarks/metrics_overhead.py [--turns 200] [--blocks 200000]
+
+Times `metrics.stage()` with metrics on and off, then runs /chat turns on
+the zero-latency fake LLM (so the agent's own work is all there is to
+measure) alternating between LUMI_METRICS on and off, and prints the
+difference. It ends with a few lines of the /metrics output.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+def time_blocks(metrics, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        with metrics.stage('bench', 'block'):
+            pass
+    return (time.perf_counter() - start) / count * 1e9
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--blocks', type=int, default=200000)
+    args = parser.parse_args()
+
+    os.environ.update({'LUMI_ROUTE_FAQ': '0', 'LUMI_RESPONSE_CACHE': '0', 'LUMI_COALESCE_ANSWERS': '0'})
+    app = setup_offline_env(0.0, 0.0)
+    from agent import lumi_agent
+    from metrics import metrics
+    lumi_agent.executor.verbose = False
+    client = app.test_client()
+
+    for enabled in (False, True):
+        metrics.config.enabled = enabled
+        print(f"stage() with metrics {'on ' if enabled else 'off'}: {time_blocks(metrics, args.blocks):7.1f} ns per block")
+
+    # Warm up the index and caches, then alternate so drift hits both sides
+    client.post('/chat', json={'message': "How do I reset the SMC?", 'session_id': 'warm'})
+    turns = {False: [], True: []}
+    for i in range(args.turns):
+        enabled = i % 2 == 1
+        metrics.config.enabled = enabled
+        start = time.perf_counter()
+        client.post('/chat', json={'message': "How do I reset the SMC?", 'session_id': f"turn-{i}"})
+        turns[enabled].append((time.perf_counter() - start) * 1000)
+
+    off, on = statistics.median(turns[False]), statistics.median(turns[True])
+    print(f"/chat turn p50 with metrics off {off:.2f} ms, on {on:.2f} ms ({(on - off) / off:+.1%})")
+
+    metrics.config.enabled = True
+    lines = client.get('/metrics').get_data(as_text=True).splitlines()
+    print("\n".join(line for line in lines if line.startswith('lumi_stage_seconds_count')))
+
+if __name__ == '__main__':
+    main()
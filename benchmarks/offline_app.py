@@ -0,0 +1,24 @@
+"""The API on a fake LLM and mongomock, as a WSGI app for load tests.
+
+    gunicorn -c gunicorn.conf.py --chdir benchmarks offline_app:app
+
+LUMI_FAKE_FIRST_TOKEN_DELAY and LUMI_FAKE_TOKEN_DELAY set the fake
+model's latency in seconds. Like wsgi.py, each worker warms up in the
+background unless LUMI_WARM_ON_START=0.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+app = setup_offline_env(
+    float(os.getenv('LUMI_FAKE_FIRST_TOKEN_DELAY', '0.2')),
+    float(os.getenv('LUMI_FAKE_TOKEN_DELAY', '0'))
+)
+
+from startup import startup
+
+if startup.config.warm_on_start:
+    startup.start()
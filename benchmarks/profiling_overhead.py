@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""What a profiled /chat turn costs, and that sampled profiles stay capped.
+
+    python benchmarks/profiling_overhead.py [--turns 60] [--max-files 5]
+
+Runs /chat turns on the zero-latency fake LLM (so the agent's Python work
+is all there is to measure) taking turns between: not profiled, sampled at
+LUMI_PROFILE_SAMPLE=1 and profiled through the admin header. Each turn
+uses its own session. Profiles go to a temporary directory capped at
+--max-files sampled profiles, and the run ends with what is on disk and
+the slowest functions of the last admin profile.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+TOKEN = 'bench-token'
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=60)
+    parser.add_argument('--max-files', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='lumi-profiles-')
+    os.environ.update({
+        'LUMI_ROUTE_FAQ': '0', 'LUMI_RESPONSE_CACHE': '0', 'LUMI_COALESCE_ANSWERS': '0', 'LUMI_LOG_LEVEL': 'WARNING',
+        'LUMI_PROFILE_TOKEN': TOKEN, 'LUMI_PROFILE_DIR': directory, 'LUMI_PROFILE_MAX_FILES': str(args.max_files)
+    })
+    app = setup_offline_env(0.0, 0.0)
+    from profiling import profiler
+    client = app.test_client()
+    client.post('/chat', json={'message': "How do I reset the SMC?", 'session_id': 'warm'})
+
+    modes = ('off', 'sampled', 'admin')
+    turns = {mode: [] for mode in modes}
+    last = None
+    for i in range(args.turns):
+        mode = modes[i % len(modes)]
+        profiler.config.sample_rate = 1.0 if mode == 'sampled' else 0.0
+        headers = {'X-Lumi-Profile': TOKEN} if mode == 'admin' else {}
+        start = time.perf_counter()
+        response = client.post('/chat', json={'message': "How do I reset the SMC?", 'session_id': f"turn-{i}"}, headers=headers)
+        turns[mode].append((time.perf_counter() - start) * 1000)
+        if mode == 'admin':
+            last = response.get_json()['profile']
+
+    off = statistics.median(turns['off'])
+    for mode in modes:
+        p50 = statistics.median(turns[mode])
+        print(f"{mode:<8} p50 {p50:7.2f} ms ({(p50 - off) / off:+.0%})")
+
+    stored = profiler.list()
+    kinds = {kind: sum(1 for profile in stored if profile['id'].endswith(kind)) for kind in ('-sampled', '-admin')}
+    print(f"\non disk: {kinds['-sampled']} sampled (cap {args.max_files}), {kinds['-admin']} admin, "
+          f"{sum(profile['bytes'] for profile in stored) / 1024:.0f} KiB; {profiler.stats()['evicted']} evicted")
+    print(f"\nlast admin profile {last['id']} ({last['total_ms']} ms):")
+    for row in last['top']:
+        print(f"  {row['cumulative_ms']:8.2f} ms cum {row['own_ms']:8.2f} ms own {row['calls']:>6}  {row['function']}")
+
+if __name__ == '__main__':
+    main()
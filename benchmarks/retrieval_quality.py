@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Recall and latency of the FAQ retrieval backends.
+
+    python benchmarks/retrieval_quality.py [--paragraphs 2000] [--top-k 2]
+
+Compares the original substring-overlap scorer with the BM25 and
+memory-mapped vector backends on the synthetic FAQ, where every paragraph belongs to a
+known topic and a hit counts when it shares the query's topic.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sample_faq import TOPICS, faq_paragraphs
+from retrieval import BM25Index, HashingEmbedder, VectorIndex
+
+QUERIES = [
+    ("battery", "my battery health is low"),
+    ("battery", "battery not charging fully"),
+    ("smc", "how do I reset the SMC"),
+    ("smc", "fans running at full speed"),
+    ("display", "screen keeps flickering"),
+    ("display", "graphics switching problem on display"),
+    ("keyboard", "keys are sticky and repeating"),
+    ("wifi", "wi-fi keeps disconnecting"),
+    ("wifi", "router interference dropping network"),
+    ("startup", "macbook won't turn on"),
+    ("startup", "start up in recovery mode"),
+    ("storage", "disk is full, free up storage"),
+    ("warranty", "is accidental damage covered by applecare"),
+    ("overheating", "laptop gets very hot"),
+    ("bluetooth", "headphones will not pair"),
+]
+
+class SubstringScorer:
+    """The scorer rag_faq_search used before the BM25 index."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def search(self, query, top_k):
+        query_words = query.lower().split()
+        scored = []
+        for doc_id, paragraph in enumerate(self.documents):
+            score = sum(1 for word in query_words if word in paragraph.lower())
+            if score > 0:
+                scored.append((score, doc_id))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored[:top_k]
+
+def topic_of(doc_id):
+    return TOPICS[doc_id % len(TOPICS)][0]
+
+def evaluate(name, index, top_k, repeats):
+    hits, precision, latencies = 0, [], []
+    for _ in range(repeats):
+        for topic, query in QUERIES:
+            start = time.perf_counter()
+            results = index.search(query, top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            relevant = [doc_id for _, doc_id in results if topic_of(doc_id) == topic]
+            if relevant:
+                hits += 1
+            precision.append(len(relevant) / top_k)
+
+    total = repeats * len(QUERIES)
+    latencies.sort()
+    print(f"{name:<12} recall@{top_k}={hits / total:5.2f}  precision@{top_k}={statistics.mean(precision):5.2f}  "
+          f"p50={statistics.median(latencies):7.3f} ms  p95={latencies[int(len(latencies) * 0.95) - 1]:7.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paragraphs', type=int, default=2000)
+    parser.add_argument('--top-k', type=int, default=2)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    documents = faq_paragraphs(args.paragraphs)
+    print(f"{len(documents)} paragraphs, {len(QUERIES)} queries x {args.repeats}")
+
+    start = time.perf_counter()
+    bm25 = BM25Index(documents)
+    print(f"bm25 build: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    path = os.path.join(tempfile.mkdtemp(prefix='lumi-bench-'), 'faq.npy')
+    VectorIndex.build(documents, HashingEmbedder()).save(path)
+    vector = VectorIndex.load(path, documents, HashingEmbedder())
+    print(f"vector build + save + mmap load: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    evaluate("substring", SubstringScorer(documents), args.top_k, args.repeats)
+    evaluate("bm25", bm25, args.top_k, args.repeats)
+    evaluate("vector", vector, args.top_k, args.repeats)
+
+if __name__ == '__main__':
+    main()
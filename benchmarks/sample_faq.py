@@ -0,0 +1,76 @@
+import os
+import random
+
+TOPICS = [
+    ("battery", "Battery health drops as the cells age. Open System Settings, choose Battery and check the health status. Optimised charging keeps the battery below full charge when the Mac is usually plugged in."),
+    ("smc", "Resetting the SMC fixes fans running at full speed, charging issues and power button problems. On Apple silicon just shut down, wait thirty seconds and restart. Intel models use the Shift Control Option key combination."),
+    ("display", "A flickering display is often caused by a graphics switching issue. Turn off automatic graphics switching, update macOS and test in safe mode before booking a repair."),
+    ("keyboard", "Sticky or repeating keys can be cleaned with compressed air held at a seventy five degree angle. If keys still fail, check the keyboard settings for slow keys and key repeat."),
+    ("wifi", "When Wi-Fi keeps disconnecting, forget the network, renew the DHCP lease and run Wireless Diagnostics. Changing the router channel can also reduce interference."),
+    ("startup", "If the MacBook will not turn on, connect the power adapter for ten minutes and hold the power button for ten seconds. Try starting up in recovery mode to repair the disk."),
+    ("storage", "Free up storage by opening Storage settings and reviewing large files. Empty the trash, remove old iOS backups and offload rarely used apps to iCloud."),
+    ("warranty", "AppleCare extends the limited warranty and covers accidental damage for a service fee. Check coverage online with the serial number found in About This Mac."),
+    ("overheating", "Overheating usually comes from heavy workloads or blocked vents. Use the Mac on a hard surface, check Activity Monitor for runaway processes and keep macOS updated."),
+    ("bluetooth", "Bluetooth accessories that will not pair should be removed and paired again. Resetting the Bluetooth module from the Control Centre often restores the connection."),
+]
+
+def faq_paragraphs(count, seed=7):
+    rng = random.Random(seed)
+    paragraphs = []
+    for i in range(count):
+        topic, answer = TOPICS[i % len(TOPICS)]
+        extra = " ".join(rng.sample(answer.split(), 8))
+        paragraphs.append(f"Question {i + 1}: How do I fix {topic} problems on my MacBook? {answer} Note: {extra}.")
+    return paragraphs
+
+def _wrap(text, width=90):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        lines.append(line)
+    return lines
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def write_faq_pdf(path, paragraphs=200, per_page=8):
+    """Write a plain-text FAQ PDF that PyPDF2 can extract, for benchmarks."""
+    texts = faq_paragraphs(paragraphs)
+    pages = [texts[i:i + per_page] for i in range(0, len(texts), per_page)]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        lines = []
+        for paragraph in page:
+            lines.extend(_wrap(paragraph))
+            lines.append("")
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        ops.extend(f"({_escape(line)}) Tj T*" for line in lines)
+        ops.append("ET")
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {content_id} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out.encode('latin-1')))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out.encode('latin-1'))
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(out.encode('latin-1'))
+    return path
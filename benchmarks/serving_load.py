@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Throughput of the production server as the worker count grows.
+
+    python benchmarks/serving_load.py [--workers 1,2,4] [--threads 1] [--clients 16]
+
+Starts gunicorn with gunicorn.conf.py on benchmarks/offline_app.py (fake
+LLM, mongomock, generated FAQ PDF) for each worker count, then has
+`--clients` concurrent clients each hold one session and send
+`--turns` messages in order. History goes through the disk session
+store, so every worker sees every session. The run fails if a session
+does not end with all of its turns stored.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH)
+
+from sample_faq import TOPICS, write_faq_pdf
+
+def start_server(workers, threads, port, env):
+    env = dict(env, LUMI_WORKERS=str(workers), LUMI_THREADS=str(threads), LUMI_BIND=f"127.0.0.1:{port}")
+    server = subprocess.Popen(
+        ['gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), '--chdir', BENCH, 'offline_app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline and server.poll() is None:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health/ready", timeout=1).ok:
+                return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    server.wait()
+    raise SystemExit("gunicorn did not start")
+
+def run_client(base, session_id, turns):
+    latencies = []
+    for turn in range(turns):
+        topic = TOPICS[(hash(session_id) + turn) % len(TOPICS)][0]
+        start = time.perf_counter()
+        # A new connection per turn, so turns spread over the workers
+        response = requests.post(f"{base}/chat", json={'message': f"Why does my {topic} keep failing?", 'session_id': session_id})
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def measure(base, prefix, clients, turns):
+    # One warm-up turn per client so every worker has built its index
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(lambda i: run_client(base, f"warm-{prefix}-{i}", 1), range(clients)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        results = list(pool.map(lambda i: run_client(base, f"{prefix}-{i}", turns), range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result)
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+def check_history(session_dir, prefix, clients, turns):
+    sys.path.insert(0, ROOT)
+    from sessions import DiskSessionStore
+    store = DiskSessionStore(session_dir)
+    for i in range(clients):
+        records, _ = store.load(f"{prefix}-{i}")
+        if len(records) != 2 * turns or [record[0] for record in records] != ['h', 'a'] * turns:
+            raise SystemExit(f"session {prefix}-{i} stored {len(records)} records out of order")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--turns', type=int, default=4)
+    parser.add_argument('--first-token-delay', type=float, default=0.2)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='lumi-serve-')
+    env = dict(
+        os.environ,
+        FAQ_PDF_PATH=write_faq_pdf(os.path.join(workdir, 'faq.pdf'), 200),
+        LUMI_SESSION_BACKEND='disk',
+        LUMI_SESSION_DIR=os.path.join(workdir, 'sessions'),
+        LUMI_FAKE_FIRST_TOKEN_DELAY=str(args.first_token_delay),
+        LUMI_ACCESS_LOG='',
+        # Every turn goes through the agent, as a fresh question would
+        LUMI_ROUTE_FAQ='0',
+        LUMI_RESPONSE_CACHE='0'
+    )
+
+    print(f"{'workers':>7} {'threads':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8}")
+    baseline = None
+    try:
+        for workers in [int(count) for count in args.workers.split(',')]:
+            server = start_server(workers, args.threads, args.port, env)
+            try:
+                prefix = f"w{workers}"
+                throughput, p50, p95 = measure(f"http://127.0.0.1:{args.port}", prefix, args.clients, args.turns)
+                check_history(env['LUMI_SESSION_DIR'], prefix, args.clients, args.turns)
+            finally:
+                server.terminate()
+                server.wait()
+            baseline = baseline or throughput
+            print(f"{workers:>7} {args.threads:>7} {throughput:>8.1f} {p50:>8.1f} {p95:>8.1f} {throughput / baseline:>7.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""First-message latency and memory per session: per-session executors vs one shared executor.
+
+    python benchmarks/session_overhead.py [--sessions 10000]
+
+"before" rebuilds what LumiAgent.get_session used to create for every new
+session (an AgentExecutor plus a ConversationBufferMemory). "after" is
+the current shared executor with a per-session message list.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+def old_session(agent):
+    from langchain.agents import AgentExecutor
+    from langchain.memory import ConversationBufferMemory
+    from tools import available_tools
+
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True, max_token_limit=1500)
+    executor = AgentExecutor(
+        agent=agent.agent,
+        tools=available_tools,
+        memory=memory,
+        verbose=False,
+        max_iterations=3,
+        early_stopping_method="generate"
+    )
+    return {'executor': executor, 'memory': memory}
+
+def bytes_per_session(make, count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = [make(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return total / len(sessions)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=50)
+    args = parser.parse_args()
+
+    # The question repeats; every turn must reach the agent for a fair comparison
+    os.environ.update({'LUMI_ROUTE_FAQ': '0', 'LUMI_RESPONSE_CACHE': '0', 'LUMI_COALESCE_ANSWERS': '0'})
+    setup_offline_env(0.0, 0.0)
+    from agent import lumi_agent
+    lumi_agent.executor.verbose = False
+
+    old_first, new_first = [], []
+    for i in range(args.messages):
+        start = time.perf_counter()
+        session = old_session(lumi_agent)
+        session['executor'].invoke({"input": "How do I reset the SMC?", "chat_history": session['memory'].chat_memory.messages})
+        old_first.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        lumi_agent.process_message("How do I reset the SMC?", f"bench-{i}")
+        new_first.append((time.perf_counter() - start) * 1000)
+
+    construct = []
+    for _ in range(args.messages):
+        start = time.perf_counter()
+        old_session(lumi_agent)
+        construct.append((time.perf_counter() - start) * 1000)
+
+    print(f"per-session executor construction p50={statistics.median(construct):7.3f} ms (now zero)")
+    print(f"first message  before p50={statistics.median(old_first):7.2f} ms   after p50={statistics.median(new_first):7.2f} ms")
+
+    old_bytes = bytes_per_session(lambda i: old_session(lumi_agent), args.sessions)
+    new_bytes = bytes_per_session(lambda i: lumi_agent._new_session(f"s{i}"), args.sessions)
+    print(f"empty session at {args.sessions} sessions  before={old_bytes:8.0f} B   after={new_bytes:8.0f} B")
+
+if __name__ == '__main__':
+    main()
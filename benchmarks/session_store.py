@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Per-request load and save overhead of the session history backends.
+
+    python benchmarks/session_store.py [--sessions 50] [--turns 40]
+
+Every simulated request does what LumiAgent does: load the turns stored
+since its cursor, then append the new human/AI pair. Requests alternate
+between two store instances to model two API workers. "rewrite" is the
+naive alternative that reads and rewrites the whole history as one JSON
+document per request. The mongo row uses mongomock, which copies whole
+documents, so it only shows the shape of the cost; run against a real
+server for absolute numbers.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain_core.messages import AIMessage, HumanMessage
+from sessions import DiskSessionStore, MemorySessionStore, MongoSessionStore, message_to_record
+
+class RewriteStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def load(self, session_id, cursor=0):
+        try:
+            with open(os.path.join(self.directory, f"{session_id}.json")) as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            records = []
+        return records[cursor:], len(records)
+
+    def append(self, session_id, records, cursor):
+        existing, _ = self.load(session_id)
+        existing.extend(records)
+        with open(os.path.join(self.directory, f"{session_id}.json"), 'w') as f:
+            json.dump(existing, f)
+        return len(existing)
+
+def turn_records(turn):
+    return [
+        message_to_record(HumanMessage(content=f"Turn {turn}: my MacBook battery drains quickly, what can I do?")),
+        message_to_record(AIMessage(content="Open System Settings > Battery, check Battery Health and turn on optimised charging. " * 3))
+    ]
+
+def run(name, workers, sessions, turns):
+    load_times = {1: [], turns: []}
+    save_times = {1: [], turns: []}
+    all_load, all_save = [], []
+    cursors = [{} for _ in workers]
+    histories = [{} for _ in workers]
+
+    for turn in range(1, turns + 1):
+        for s in range(sessions):
+            session_id = f"s{s}"
+            w = (turn + s) % len(workers)
+            store = workers[w]
+
+            new = turn_records(turn)
+            start = time.perf_counter()
+            records, cursors[w][session_id] = store.load(session_id, cursors[w].get(session_id, 0))
+            histories[w].setdefault(session_id, []).extend(records)
+            loaded = time.perf_counter()
+            cursor = store.append(session_id, new, cursors[w][session_id])
+            if cursor is None:
+                histories[w][session_id], cursors[w][session_id] = store.load(session_id, 0)
+            else:
+                histories[w][session_id].extend(new)
+                cursors[w][session_id] = cursor
+            saved = time.perf_counter()
+
+            all_load.append((loaded - start) * 1e6)
+            all_save.append((saved - loaded) * 1e6)
+            if turn in load_times:
+                load_times[turn].append((loaded - start) * 1e6)
+                save_times[turn].append((saved - loaded) * 1e6)
+
+    for w in range(len(workers)):
+        for session_id, history in histories[w].items():
+            if len(history) > turns * 2:
+                raise SystemExit(f"{name}: worker {w} has duplicate turns in {session_id}")
+
+    print(f"{name:<8} load mean={statistics.mean(all_load):8.1f} us (turn 1 {statistics.mean(load_times[1]):7.1f}, turn {turns} {statistics.mean(load_times[turns]):7.1f})  "
+          f"save mean={statistics.mean(all_save):8.1f} us (turn 1 {statistics.mean(save_times[1]):7.1f}, turn {turns} {statistics.mean(save_times[turns]):7.1f})")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=40)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix='lumi-bench-')
+
+    memory = MemorySessionStore()
+    run('memory', [memory], args.sessions, args.turns)
+
+    disk_dir = os.path.join(workdir, 'disk')
+    run('disk', [DiskSessionStore(disk_dir), DiskSessionStore(disk_dir)], args.sessions, args.turns)
+    sizes = [os.path.getsize(os.path.join(disk_dir, f)) for f in os.listdir(disk_dir)]
+    print(f"         disk bytes per turn: {statistics.mean(sizes) / args.turns:.0f}")
+
+    try:
+        import mongomock
+        collection = mongomock.MongoClient().db.sessions
+        run('mongo', [MongoSessionStore(lambda: collection), MongoSessionStore(lambda: collection)], args.sessions, args.turns)
+    except ImportError:
+        print("mongo    skipped (pip install mongomock)")
+
+    rewrite_dir = os.path.join(workdir, 'rewrite')
+    os.makedirs(rewrite_dir)
+    run('rewrite', [RewriteStore(rewrite_dir), RewriteStore(rewrite_dir)], args.sessions, args.turns)
+
+if __name__ == '__main__':
+    main()
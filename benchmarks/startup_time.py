@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Import time of api.py and time for a worker to become ready.
+
+    python benchmarks/startup_time.py [--runs 3] [--port 5071]
+
+Import time: each run is a fresh interpreter timing `import api`, and
+then `import api` followed by `import agent`. The second is what
+importing api.py cost while it built the agent at import.
+
+Time to ready: starts gunicorn with one worker on benchmarks/offline_app.py
+(fake LLM, mongomock, generated FAQ PDF). It records when /health/live
+and /health/ready first answer 200, counted from the spawn, then the
+latency of the first /chat. The same runs are repeated with
+LUMI_WARM_ON_START=0. There the first /chat pays for building the agent
+and the FAQ index; /health/ready is not polled, because a readiness check
+would start the warm-up.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH)
+
+from sample_faq import write_faq_pdf
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import api
+api_seconds = time.perf_counter() - start
+modules = len(sys.modules)
+if {with_agent}:
+    import agent
+print(json.dumps({{'api': api_seconds, 'total': time.perf_counter() - start, 'modules': modules}}))
+"""
+
+def import_times(env, with_agent):
+    result = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE.format(with_agent=with_agent)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def wait_for(url, deadline, server):
+    while time.time() < deadline and server.poll() is None:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    return False
+
+def boot(env, port, warm):
+    env = dict(env, LUMI_WORKERS='1', LUMI_BIND=f"127.0.0.1:{port}", LUMI_WARM_ON_START='1' if warm else '0')
+    base = f"http://127.0.0.1:{port}"
+    start = time.time()
+    server = subprocess.Popen(
+        ['gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), '--chdir', BENCH, 'offline_app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + 120
+        if not wait_for(f"{base}/health/live", deadline, server):
+            raise SystemExit("gunicorn did not start")
+        live = time.time() - start
+        ready = None
+        if warm:
+            if not wait_for(f"{base}/health/ready", deadline, server):
+                raise SystemExit("worker did not become ready")
+            ready = time.time() - start
+        first = time.time()
+        requests.post(f"{base}/chat", json={'message': "How do I reset the SMC?", 'session_id': 'first'}).raise_for_status()
+        first_chat = time.time() - first
+        steps = requests.get(f"{base}/health").json().get('steps', {})
+        return {'live': live, 'ready': ready, 'first_chat': first_chat, 'steps': steps}
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=5071)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='lumi-startup-')
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'offline-benchmark'),
+        MONGO_CLIENT='mongomock',
+        LUMI_LOG_LEVEL='WARNING',
+        LUMI_FAKE_FIRST_TOKEN_DELAY='0',
+        FAQ_PDF_PATH=write_faq_pdf(os.path.join(workdir, 'faq.pdf'), 200)
+    )
+
+    print("import, median of", args.runs)
+    for label, with_agent in (("import api", False), ("import api + agent (old eager import)", True)):
+        runs = [import_times(env, with_agent) for _ in range(args.runs)]
+        print(f"  {label:<40} {statistics.median(run['total'] for run in runs) * 1000:7.0f} ms")
+    print(f"  modules loaded by `import api`: {runs[0]['modules']}")
+
+    print("\ngunicorn, one worker, seconds from spawn (median)")
+    for warm in (True, False):
+        # A fresh corpus cache per run, so every boot parses the PDF
+        runs = []
+        for i in range(args.runs):
+            run_env = dict(env, LUMI_CACHE_DIR=os.path.join(workdir, f"cache-{warm}-{i}"))
+            runs.append(boot(run_env, args.port, warm))
+        median = lambda key: statistics.median(run[key] for run in runs)
+        ready = f"{median('ready'):6.2f}" if warm else "     -"
+        print(f"  warm-up {'on ' if warm else 'off'}: live {median('live'):6.2f}  ready {ready}  first /chat {median('first_chat') * 1000:7.0f} ms")
+        if warm:
+            steps = ', '.join(f"{name} {step['seconds']:.2f}s" for name, step in runs[-1]['steps'].items())
+            print(f"    warm-up steps: {steps}")
+
+if __name__ == '__main__':
+    main()
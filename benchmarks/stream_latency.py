@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Time-to-first-chunk of /chat-stream against a fake streaming LLM.
+
+    python benchmarks/stream_latency.py [--first-token-delay 0.3] [--token-delay 0.02]
+
+The fake model (benchmarks/fakes.py) replaces llm.llm, MongoDB runs on
+mongomock and the FAQ is a generated PDF, so no network is needed. The
+run fails if the stream does not carry tool events and tokens.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def setup_offline_env(first_token_delay, token_delay, wrap=None):
+    """Point the API at a fake LLM, mongomock and a generated FAQ; returns the Flask app.
+
+    `wrap`, if given, is applied to the fake model before the agent is built.
+    """
+    workdir = tempfile.mkdtemp(prefix='lumi-bench-')
+    os.environ.setdefault('OPENAI_API_KEY', 'offline-benchmark')
+    os.environ['MONGO_CLIENT'] = 'mongomock'
+    os.environ['LUMI_CACHE_DIR'] = os.path.join(workdir, 'cache')
+    # Every turn should reach the agent and the model unless a benchmark
+    # turns a fast path on explicitly
+    for name in ('LUMI_RESPONSE_CACHE', 'LUMI_ROUTE_FAQ', 'LUMI_COALESCE_ANSWERS'):
+        os.environ.setdefault(name, '0')
+    if 'FAQ_PDF_PATH' not in os.environ:
+        from sample_faq import write_faq_pdf
+        os.environ['FAQ_PDF_PATH'] = write_faq_pdf(os.path.join(workdir, 'faq.pdf'), 200)
+
+    import llm
+    from fakes import ScriptedChatModel
+    llm.llm = ScriptedChatModel(first_token_delay=first_token_delay, token_delay=token_delay)
+    if wrap is not None:
+        llm.llm = wrap(llm.llm)
+
+    import api
+    return api.app
+
+def stream_once(client, message, session_id):
+    start = time.perf_counter()
+    response = client.post('/chat-stream', json={'message': message, 'session_id': session_id}, buffered=False)
+    first_event = first_chunk = None
+    events = []
+    for line in response.iter_encoded():
+        for frame in line.decode().split('\n\n'):
+            if not frame.startswith('data: '):
+                continue
+            event = json.loads(frame[len('data: '):])
+            now = time.perf_counter() - start
+            if first_event is None:
+                first_event = now
+            if 'chunk' in event and first_chunk is None:
+                first_chunk = now
+            events.append(event)
+    return first_event, first_chunk, time.perf_counter() - start, events
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    app = setup_offline_env(args.first_token_delay, args.token_delay)
+    client = app.test_client()
+
+    first_events, first_chunks, totals = [], [], []
+    for i in range(args.runs):
+        first_event, first_chunk, total, events = stream_once(client, "How do I reset the SMC?", f"stream-{i}")
+        kinds = {key for event in events for key in event}
+        if not {'tool_start', 'tool_end', 'chunk', 'done'} <= kinds:
+            raise SystemExit(f"unexpected stream events: {events[:5]}")
+        first_events.append(first_event * 1000)
+        first_chunks.append(first_chunk * 1000)
+        totals.append(total * 1000)
+
+    chat_totals = []
+    for i in range(args.runs):
+        start = time.perf_counter()
+        client.post('/chat', json={'message': "How do I reset the SMC?", 'session_id': f"chat-{i}"})
+        chat_totals.append((time.perf_counter() - start) * 1000)
+
+    print(f"/chat-stream first event (tool_start) p50={statistics.median(first_events):8.1f} ms")
+    print(f"/chat-stream first token             p50={statistics.median(first_chunks):8.1f} ms")
+    print(f"/chat-stream complete                p50={statistics.median(totals):8.1f} ms")
+    print(f"/chat complete (first byte)          p50={statistics.median(chat_totals):8.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Tail latency of /chat with per-call deadlines, retries and hedging.
+
+    python benchmarks/tail_latency.py [--turns 200] [--stall-rate 0.05] [--error-rate 0.03]
+
+The fake model (benchmarks/fakes.py) stalls for `--stall-delay` seconds
+on a share of its calls and fails outright on another share. The same
+workload runs three times through resilience.ResilientChatModel:
+- off: no call timeout, no retries, no hedging
+- retry: call timeout and jittered retries
+- hedge: retries plus a hedged second attempt after the recent p95
+and the run prints p50/p95/p99, failed turns and the policy counters.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_latency import setup_offline_env
+
+MODES = {
+    'off': {'call_timeout': 60.0, 'retries': 0, 'hedge': False},
+    'retry': {'call_timeout': None, 'retries': 2, 'hedge': False},
+    'hedge': {'call_timeout': None, 'retries': 2, 'hedge': True}
+}
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--first-token-delay', type=float, default=0.1)
+    parser.add_argument('--stall-rate', type=float, default=0.05)
+    parser.add_argument('--stall-delay', type=float, default=3.0)
+    parser.add_argument('--error-rate', type=float, default=0.03)
+    parser.add_argument('--call-timeout', type=float, default=1.0)
+    args = parser.parse_args()
+
+    os.environ.update({'LUMI_ROUTE_FAQ': '0', 'LUMI_RESPONSE_CACHE': '0', 'LUMI_REQUEST_DEADLINE': '0'})
+    from resilience import CallPolicy, ResilienceConfig, ResilientChatModel
+    config = ResilienceConfig()
+    config.backoff_base = 0.05
+    config.hedge_default_delay = 3 * args.first_token_delay
+    holder = {}
+
+    def wrap(model):
+        model.stall_rate, model.stall_delay, model.error_rate = args.stall_rate, args.stall_delay, args.error_rate
+        holder['model'] = ResilientChatModel(model=model, policy=CallPolicy(config))
+        return holder['model']
+
+    app = setup_offline_env(args.first_token_delay, 0.0, wrap=wrap)
+    from agent import DEADLINE_MESSAGE, lumi_agent
+    lumi_agent.executor.verbose = False
+
+    def post(i, mode):
+        start = time.perf_counter()
+        response = app.test_client().post('/chat', json={'message': "How do I reset the SMC?", 'session_id': f"{mode}-{i}"})
+        reply = response.get_json()['response']
+        failed = 'technical issue' in reply or reply == DEADLINE_MESSAGE
+        return (time.perf_counter() - start) * 1000, failed
+
+    print(f"{'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7}  counters")
+    for mode, settings in MODES.items():
+        config.call_timeout = settings['call_timeout'] or args.call_timeout
+        config.retries = settings['retries']
+        config.hedge = settings['hedge']
+        policy = holder['model'].policy = CallPolicy(config)
+
+        with ThreadPoolExecutor(args.clients) as pool:
+            results = list(pool.map(lambda i: post(i, mode), range(args.turns)))
+        latencies = sorted(ms for ms, _ in results)
+        failed = sum(1 for _, bad in results if bad)
+        counters = {name: value for name, value in policy.stats().items() if name in ('calls', 'deadline_hits', 'retries', 'hedges', 'hedge_wins', 'failures')}
+        print(
+            f"{mode:<6} {statistics.median(latencies):>8.1f} {percentile(latencies, 0.95):>8.1f} "
+            f"{percentile(latencies, 0.99):>8.1f} {latencies[-1]:>8.1f} {failed:>7}  {counters}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import PyPDF2
+import hashlib
+import json
+import os
+import re
+import statistics
+import threading
+from array import array
+from logs import get_logger
+from metrics import metrics
+
+logger = get_logger('corpus')
+
+CACHE_FORMAT = 1
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+class ChunkList:
+    """Chunks stored as (start, end) offsets into one corpus string.
+
+    Indexing slices the text on demand, so the corpus is held once rather
+    than as a separate string per chunk.
+    """
+
+    def __init__(self, text, spans):
+        self.text = text
+        self.starts = array('L', (start for start, _ in spans))
+        self.ends = array('L', (end for _, end in spans))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            yield self.text[start:end]
+
+    def stats(self) -> dict:
+        sizes = sorted(end - start for start, end in zip(self.starts, self.ends))
+        if not sizes:
+            return {'chunks': 0}
+        return {
+            'chunks': len(sizes),
+            'min_chars': sizes[0],
+            'mean_chars': round(statistics.mean(sizes), 1),
+            'p50_chars': sizes[len(sizes) // 2],
+            'p95_chars': sizes[min(len(sizes) - 1, int(len(sizes) * 0.95))],
+            'max_chars': sizes[-1],
+            'corpus_chars': len(self.text)
+        }
+
+class FAQCorpus:
+    """Parsed FAQ text, loaded once and kept in memory.
+
+    The extracted text is also written to a JSON cache keyed by the PDF's
+    mtime, size and SHA-256, so a restarted process skips PyPDF2 entirely
+    and only a changed PDF is parsed again. The text is split into
+    sentence-aligned chunks of `chunk_size` characters with `chunk_overlap`.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.text = ""
+        self.chunks = ChunkList("", [])
+        self.digest = None
+        self.version = None
+        self.parse_count = 0
+        self._signature = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_path(self):
+        return os.path.join(self.config.cache_dir, 'faq_corpus.json')
+
+    def load(self):
+        try:
+            stat = os.stat(self.config.pdf_path)
+        except OSError:
+            raise FileNotFoundError(f"FAQ PDF not found at: {self.config.pdf_path}")
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return self
+
+        with self._lock:
+            if signature != self._signature:
+                self._refresh(signature)
+        return self
+
+    def _refresh(self, signature):
+        cached = self._read_cache()
+        if cached and (cached['mtime_ns'], cached['size']) == signature:
+            self._set_text(cached['text'], cached['sha256'])
+            self._signature = signature
+            return
+
+        digest = file_sha256(self.config.pdf_path)
+        if cached and cached['sha256'] == digest:
+            # Touched but unchanged: keep the parsed text, refresh the key
+            text = cached['text']
+        else:
+            with metrics.stage('corpus', 'parse_pdf'):
+                text = extract_pdf_text(self.config.pdf_path)
+            self.parse_count += 1
+
+        self._write_cache(signature, digest, text)
+        self._set_text(text, digest)
+        self._signature = signature
+
+    def _set_text(self, text, digest):
+        spans = [
+            (start, end) for start, end in chunk_spans(text, self.config.chunk_size, self.config.chunk_overlap)
+            if end - start > self.config.min_paragraph_length
+        ]
+        settings = f"{self.config.chunk_size}-{self.config.chunk_overlap}-{self.config.min_paragraph_length}"
+
+        self.text = text
+        self.chunks = ChunkList(text, spans)
+        self.digest = digest
+        # Indexes are keyed by version, so changing chunk settings rebuilds them
+        self.version = f"{digest[:16]}-{settings}"
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if cached.get('format') != CACHE_FORMAT:
+            return None
+        if cached.get('pdf_path') != os.path.abspath(self.config.pdf_path):
+            return None
+        return cached
+
+    def _write_cache(self, signature, digest, text):
+        data = {
+            'format': CACHE_FORMAT,
+            'pdf_path': os.path.abspath(self.config.pdf_path),
+            'mtime_ns': signature[0],
+            'size': signature[1],
+            'sha256': digest,
+            'text': text
+        }
+        try:
+            os.makedirs(self.config.cache_dir, exist_ok=True)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning("Could not write FAQ cache: %s", e)
+
+def extract_pdf_text(pdf_path: str) -> str:
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return "".join(page.extract_text() + "\n" for page in pdf_reader.pages)
+
+def file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def sentence_spans(text: str) -> list:
+    spans = []
+    start = len(text) - len(text.lstrip())
+    for match in SENTENCE_BOUNDARY.finditer(text, start):
+        if match.start() > start:
+            spans.append((start, match.start()))
+        start = match.end()
+    end = len(text.rstrip())
+    if end > start:
+        spans.append((start, end))
+    return spans
+
+def _split_long(text, start, end, size):
+    # A sentence longer than a whole chunk is cut at the last space that fits
+    while end - start > size:
+        cut = text.rfind(' ', start + 1, start + size)
+        if cut == -1:
+            cut = start + size
+        yield (start, cut)
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if end > start:
+        yield (start, end)
+
+def chunk_spans(text: str, size: int, overlap: int) -> list:
+    """Pack whole sentences into windows of at most `size` characters.
+
+    Each window after the first starts with the trailing sentences of the
+    previous one that fit within `overlap` characters.
+    """
+    units = [piece for start, end in sentence_spans(text) for piece in _split_long(text, start, end, size)]
+    chunks = []
+    i = 0
+    while i < len(units):
+        j = i
+        while j + 1 < len(units) and units[j + 1][1] - units[i][0] <= size:
+            j += 1
+        chunks.append((units[i][0], units[j][1]))
+        if j + 1 >= len(units):
+            break
+
+        next_start = j + 1
+        while next_start - 1 > i and units[j][1] - units[next_start - 1][0] <= overlap:
+            next_start -= 1
+        i = next_start
+    return chunks
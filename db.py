@@ -0,0 +1,159 @@
+import atexit
+import os
+import threading
+from pymongo import MongoClient, monitoring
+
+class MongoConfig:
+    def __init__(self):
+        self.uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+        self.database = os.getenv('MONGO_DB', 'complaints_db')
+        self.collection = 'complaints'
+        self.client = os.getenv('MONGO_CLIENT', 'pymongo')
+        self.max_pool_size = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+        self.min_pool_size = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+        self.max_idle_time_ms = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '300000'))
+        self.connect_timeout_ms = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '2000'))
+        self.server_selection_timeout_ms = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '3000'))
+        self.socket_timeout_ms = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '5000'))
+        self.wait_queue_timeout_ms = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    EVENTS = [
+        'connections_created', 'connections_closed', 'checkouts', 'checkins',
+        'checkout_failures', 'pool_clears'
+    ]
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.EVENTS, 0)
+        self._lock = threading.Lock()
+
+    def _count(self, event):
+        with self._lock:
+            self.counts[event] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('pool_clears')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._count('checkouts')
+
+    def connection_checked_in(self, event):
+        self._count('checkins')
+
+class MongoPool:
+    """One MongoClient per process, shared by every tool call.
+
+    MongoClient is thread-safe and pools its own connections, but it is not
+    fork-safe: a client inherited from a pre-fork parent is dropped and a
+    new one is built on first use in the child.
+    """
+
+    def __init__(self, config, client_factory=None):
+        self.config = config
+        self.client_factory = client_factory
+        self.listener = PoolStatsListener()
+        self.created = 0
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.listener = PoolStatsListener()
+
+    def _build_client(self):
+        if self.client_factory is not None:
+            return self.client_factory()
+
+        if self.config.client == 'mongomock':
+            import mongomock
+            return mongomock.MongoClient()
+
+        return MongoClient(
+            self.config.uri,
+            maxPoolSize=self.config.max_pool_size,
+            minPoolSize=self.config.min_pool_size,
+            maxIdleTimeMS=self.config.max_idle_time_ms,
+            connectTimeoutMS=self.config.connect_timeout_ms,
+            serverSelectionTimeoutMS=self.config.server_selection_timeout_ms,
+            socketTimeoutMS=self.config.socket_timeout_ms,
+            waitQueueTimeoutMS=self.config.wait_queue_timeout_ms,
+            event_listeners=[self.listener]
+        )
+
+    def get_client(self):
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = self._build_client()
+                self._pid = os.getpid()
+                self.created += 1
+            return self._client
+
+    def collection(self, name=None):
+        return self.get_client()[self.config.database][name or self.config.collection]
+
+    def ping(self):
+        """Raise if MongoDB cannot be reached within the server selection timeout."""
+        self.get_client().admin.command('ping')
+
+    def set_client_factory(self, client_factory):
+        """Swap the client implementation, e.g. mongomock.MongoClient in tests."""
+        self.close()
+        self.client_factory = client_factory
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+            self._pid = None
+        if client is not None:
+            client.close()
+
+    def stats(self) -> dict:
+        counts = dict(self.listener.counts)
+        return {
+            'client': 'custom' if self.client_factory else self.config.client,
+            'connected': self._client is not None,
+            'clients_created': self.created,
+            'max_pool_size': self.config.max_pool_size,
+            'min_pool_size': self.config.min_pool_size,
+            'open_connections': counts['connections_created'] - counts['connections_closed'],
+            'in_use_connections': counts['checkouts'] - counts['checkins'],
+            **counts
+        }
+
+mongo_config = MongoConfig()
+mongo_pool = MongoPool(mongo_config)
+atexit.register(mongo_pool.close)
@@ -0,0 +1,11 @@
+# Exceptions the HTTP layer maps to responses. They live apart from the
+# modules raising them so the API can import them without LangChain.
+
+class AdmissionRejected(Exception):
+    """The LLM is saturated; `status` is 429 (queue full) or 503 (waited too long)."""
+
+    def __init__(self, status: int, retry_after: int):
+        reason = "queue is full" if status == 429 else "timed out waiting for capacity"
+        super().__init__(f"The assistant is busy ({reason}). Please retry in {retry_after} seconds.")
+        self.status = status
+        self.retry_after = retry_after
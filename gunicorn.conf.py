@@ -0,0 +1,21 @@
+import os
+
+# Workers are separate processes; threads inside a worker share its
+# sessions, caches and MongoDB pool. Most of a turn is spent waiting on
+# the OpenAI API, so several threads per worker keep the CPU busy.
+bind = os.getenv('LUMI_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('LUMI_WORKERS', str(os.cpu_count() or 1)))
+threads = int(os.getenv('LUMI_THREADS', '8'))
+worker_class = 'gthread'
+
+# Agent turns can take several LLM round trips; streams stay open meanwhile
+timeout = int(os.getenv('LUMI_WORKER_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = os.getenv('LUMI_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+# In-process history would give each worker its own view of a session
+if workers > 1:
+    os.environ.setdefault('LUMI_SESSION_BACKEND', 'disk')
@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
+from admission import AdmissionConfig, AdmissionController, AdmittedChatModel
+from resilience import CallPolicy, ResilienceConfig, ResilientChatModel
 
 load_dotenv()
 
@@ -10,11 +12,22 @@ class LLMConfig:
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
-        self.model = ChatOpenAI(
+        self.resilience = ResilienceConfig()
+        # Retries happen in CallPolicy, with jitter and within the turn's deadline
+        self.chat_model = ChatOpenAI(
             model="gpt-3.5-turbo",
             temperature=0.3,
             openai_api_key=self.api_key,
-            streaming=True
+            streaming=True,
+            request_timeout=self.resilience.call_timeout,
+            max_retries=0
+        )
+        # Every attempt waits for a concurrency slot and token budget first
+        self.admission = AdmissionController(AdmissionConfig())
+        self.policy = CallPolicy(self.resilience)
+        self.model = ResilientChatModel(
+            model=AdmittedChatModel(model=self.chat_model, controller=self.admission),
+            policy=self.policy
         )
     
     def get_llm(self):
@@ -0,0 +1,206 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from metrics import current_trace
+
+EMAIL = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+# Same shapes tools.extract_all_info accepts, plus an optional country code
+PHONE = re.compile(r'(?<!\w)(?:\+\d{1,3}[-.\s]?)?(?:\d{10}|\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4})(?!\w)')
+
+# Attributes every LogRecord has; anything else came in through `extra`
+STANDARD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'trace_id'}
+
+class LogConfig:
+    def __init__(self):
+        self.level = os.getenv('LUMI_LOG_LEVEL', 'INFO').upper()
+        # 'json' (one object per line) or 'text'
+        self.format = os.getenv('LUMI_LOG_FORMAT', 'json')
+        # Share of records kept per level, e.g. "DEBUG=0.01,INFO=0.5";
+        # warnings and errors are always kept
+        self.sample = parse_rates(os.getenv('LUMI_LOG_SAMPLE', ''))
+        self.queue_size = int(os.getenv('LUMI_LOG_QUEUE_SIZE', '10000'))
+        self.redact = os.getenv('LUMI_LOG_REDACT', '1') == '1'
+        # LangChain's step-by-step console trace of every agent run
+        self.agent_verbose = os.getenv('LUMI_AGENT_VERBOSE', '0') == '1'
+
+def parse_rates(spec: str) -> dict:
+    rates = {}
+    for part in filter(None, (item.strip() for item in spec.split(','))):
+        level, _, rate = part.partition('=')
+        rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+def redact(text: str) -> str:
+    return PHONE.sub('[phone]', EMAIL.sub('[email]', text))
+
+class SamplingFilter(logging.Filter):
+    """Keeps a configured share of records per level; WARNING and up always pass."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {level: rate for level, rate in rates.items() if isinstance(level, int) and level < logging.WARNING}
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        return rate is None or random.random() < rate
+
+class TraceFilter(logging.Filter):
+    """Stamps the request's trace id while still on the request's thread."""
+
+    def filter(self, record):
+        trace = current_trace()
+        record.trace_id = trace.id if trace is not None else None
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread; drops them when the queue is full.
+
+    Logging must never make a request wait, so a full queue costs a record
+    rather than latency. Drops are counted and shown in `stats()`.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only this handler sees the record, so skip the copy and the full
+        # format the base class does; the writer thread formats it
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class StructuredFormatter(logging.Formatter):
+    """JSON lines (or plain text) with extras and redacted contact details."""
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+
+    def _scrub(self, value):
+        if not self.config.redact:
+            return value
+        if isinstance(value, str):
+            return redact(value)
+        if isinstance(value, dict):
+            return {key: self._scrub(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._scrub(item) for item in value]
+        return value
+
+    def format(self, record):
+        message = self._scrub(record.getMessage())
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        exc = self._scrub(record.exc_text)
+        fields = {key: self._scrub(value) for key, value in vars(record).items() if key not in STANDARD_ATTRS}
+
+        if self.config.format == 'text':
+            line = f"{self.formatTime(record)} {record.levelname} {record.name}: {message}"
+            if fields:
+                line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+            if exc:
+                line += '\n' + exc
+            return line
+
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': message
+        }
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+        entry.update(fields)
+        if exc:
+            entry['exc'] = exc
+        return json.dumps(entry, default=str)
+
+class LogPipeline:
+    """The 'lumi' logger tree behind a bounded queue and one writer thread.
+
+    Callers only filter, stamp and enqueue a record; formatting, redaction
+    and the console write happen on the writer thread.
+    """
+
+    def __init__(self):
+        self.config = None
+        self.stream = None
+        self.handler = None
+        self.listener = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def configure(self, config=None, stream=None):
+        with self._lock:
+            self._stop()
+            self.config = config or LogConfig()
+            self.stream = stream
+            output = logging.StreamHandler(stream or sys.stderr)
+            output.setFormatter(StructuredFormatter(self.config))
+
+            self.handler = DroppingQueueHandler(queue.Queue(self.config.queue_size))
+            self.handler.addFilter(SamplingFilter(self.config.sample))
+            self.handler.addFilter(TraceFilter())
+            self.listener = logging.handlers.QueueListener(self.handler.queue, output, respect_handler_level=False)
+            self.listener.start()
+
+            root = logging.getLogger('lumi')
+            root.handlers = [self.handler]
+            root.setLevel(self.config.level)
+            root.propagate = False
+
+    def _stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until queued records have been written."""
+        deadline = time.monotonic() + timeout
+        while self.handler is not None and not self.handler.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def stop(self):
+        with self._lock:
+            self._stop()
+
+    def _restart_after_fork(self):
+        # The writer thread does not survive a fork
+        self._lock = threading.Lock()
+        if self.listener is not None:
+            self.listener = None
+            self.configure(self.config, self.stream)
+
+    def stats(self) -> dict:
+        handler = self.handler
+        return {
+            'level': self.config.level if self.config else None,
+            'queued': handler.queue.qsize() if handler else 0,
+            'dropped': handler.dropped if handler else 0
+        }
+
+pipeline = LogPipeline()
+pipeline.configure()
+atexit.register(pipeline.stop)
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"lumi.{name}")
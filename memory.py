@@ -0,0 +1,116 @@
+import os
+from langchain_core.messages import HumanMessage, SystemMessage
+from logs import get_logger
+from metrics import metrics
+from packing import count_tokens
+
+logger = get_logger('memory')
+
+# Per-message framing tokens in the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = """Progressively summarize the conversation between a customer and Lumi, an Apple support assistant.
+Extend the current summary with the new lines and return only the new summary, in under {words} words.
+Keep ticket IDs, customer names, contact details and unresolved issues."""
+
+# History record kind that carries the summary state, stored after the turns
+SUMMARY_RECORD = 'm'
+
+class MemoryConfig:
+    def __init__(self):
+        self.mode = os.getenv('LUMI_MEMORY_MODE', 'budget')
+        self.token_budget = int(os.getenv('LUMI_MEMORY_TOKENS', '1500'))
+        self.summary_tokens = int(os.getenv('LUMI_MEMORY_SUMMARY_TOKENS', '300'))
+        self.token_model = 'gpt-3.5-turbo'
+
+class TokenBudgetMemory:
+    """Builds the chat_history for a turn within a token budget.
+
+    In 'budget' mode the most recent messages are kept verbatim while they
+    fit; anything older is folded into a rolling summary that is extended
+    only with the messages that just fell out of the window. 'buffer' mode
+    sends the whole transcript, as before. Token counts are cached on the
+    session alongside its messages. The summary and how many messages it
+    covers are saved to the history store as a record, so a worker that
+    reloads the session resumes from the summary instead of re-folding.
+    """
+
+    def __init__(self, config, llm):
+        self.config = config
+        self.llm = llm
+        self.summaries = 0
+
+    @staticmethod
+    def reset(session):
+        session['token_counts'] = []
+        session['summary'] = ""
+        session['summarized'] = 0
+        session['summary_saved'] = 0
+
+    @staticmethod
+    def summary_record(session):
+        """The summary state as a history record, or None if it is already stored."""
+        if session['summarized'] == session['summary_saved']:
+            return None
+        return [SUMMARY_RECORD, session['summary'], session['summarized']]
+
+    @staticmethod
+    def restore(session, record) -> bool:
+        """Apply a stored summary record; False if `record` is a message."""
+        if record[0] != SUMMARY_RECORD:
+            return False
+        session['summary'] = record[1]
+        session['summarized'] = session['summary_saved'] = record[2]
+        return True
+
+    def token_counts(self, session) -> list:
+        counts = session['token_counts']
+        for message in session['messages'][len(counts):]:
+            counts.append(count_tokens(message.content, self.config.token_model) + MESSAGE_OVERHEAD)
+        return counts
+
+    def history(self, session) -> list:
+        messages = session['messages']
+        if self.config.mode == 'buffer':
+            return list(messages)
+
+        counts = self.token_counts(session)
+        if not session['summary'] and sum(counts) <= self.config.token_budget:
+            return list(messages)
+
+        window = self.config.token_budget - self.config.summary_tokens
+        start, used = len(messages), 0
+        while start > session['summarized'] and used + counts[start - 1] <= window:
+            start -= 1
+            used += counts[start]
+
+        if start > session['summarized']:
+            self._fold(session, messages[session['summarized']:start])
+            session['summarized'] = start
+
+        history = messages[start:]
+        if session['summary']:
+            history = [SystemMessage(content=f"Summary of the earlier conversation: {session['summary']}")] + history
+        return history
+
+    def _fold(self, session, messages):
+        lines = "\n".join(f"{message.type}: {message.content}" for message in messages)
+        words = max(20, int(self.config.summary_tokens * 0.7))
+        try:
+            with metrics.stage('llm', 'summary'):
+                reply = self.llm.invoke([
+                    SystemMessage(content=SUMMARY_PROMPT.format(words=words)),
+                    HumanMessage(content=f"Current summary:\n{session['summary'] or '(none)'}\n\nNew lines:\n{lines}")
+                ])
+            session['summary'] = reply.content.strip()
+            self.summaries += 1
+        except Exception as e:
+            # Better to lose the oldest turns than to fail the customer's request
+            logger.warning("Memory summary error: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            'mode': self.config.mode,
+            'token_budget': self.config.token_budget,
+            'summaries': self.summaries
+        }
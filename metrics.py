@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+class MetricsConfig:
+    def __init__(self):
+        self.enabled = os.getenv('LUMI_METRICS', '1') == '1'
+        # Histogram bucket upper bounds in seconds
+        self.buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Trace:
+    """Stage timings of one request, tagged with its trace id."""
+
+    def __init__(self, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.spans = []
+
+    def add(self, stage, seconds):
+        # list.append is atomic, so tool and hedge threads can add directly
+        self.spans.append((stage, seconds))
+
+    def totals(self) -> dict:
+        totals = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def server_timing(self) -> str:
+        """The stage totals as a Server-Timing header value."""
+        return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.totals().items())
+
+_trace = ContextVar('lumi_trace', default=None)
+
+def start_trace(trace_id: str = None) -> Trace:
+    """Begin a trace for the current request, reusing a caller's id if given."""
+    trace = Trace(trace_id)
+    _trace.set(trace)
+    return trace
+
+def use_trace(trace: Trace):
+    """Continue `trace` in another thread or generator."""
+    _trace.set(trace)
+
+def current_trace():
+    return _trace.get()
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames, buckets):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {count}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(list(zip(self.labelnames, labels)))} {_number(value)}")
+        return lines
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'name', 'start')
+
+    def __init__(self, metrics, stage, name):
+        self.metrics = metrics
+        self.stage = stage
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.name)
+        return False
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_TIMER = _NoTimer()
+
+class Metrics:
+    """Prometheus-style histograms and counters for every request stage.
+
+    `stage(name)` times a block into `lumi_stage_seconds` and into the
+    current request's trace. With `LUMI_METRICS=0` it hands back a shared
+    no-op context manager and nothing is recorded.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.requests = Histogram(
+            'lumi_request_seconds', "HTTP request latency.", ('endpoint', 'status'), config.buckets
+        )
+        self.stages = Histogram(
+            'lumi_stage_seconds', "Time spent per request stage.", ('stage', 'name'), config.buckets
+        )
+        self.iterations = Histogram(
+            'lumi_agent_iterations', "Agent LLM steps per turn.", (), (1, 2, 3, 4, 5, 8)
+        )
+        self.tokens = Counter('lumi_llm_tokens_total', "LLM tokens by kind (estimated when the provider reports none).", ('kind',))
+        self.context_tokens = Counter('lumi_faq_context_tokens_total', "FAQ context tokens packed into tool results, and tokens saved by packing.", ('kind',))
+        self._gauges = []
+
+    @property
+    def enabled(self):
+        return self.config.enabled
+
+    def observe(self, stage: str, seconds: float, name: str = ''):
+        if not self.config.enabled:
+            return
+        self.stages.observe(seconds, (stage, name))
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+    def stage(self, stage: str, name: str = ''):
+        if not self.config.enabled:
+            return _NO_TIMER
+        return _Timer(self, stage, name)
+
+    def observe_request(self, endpoint: str, status: int, seconds: float):
+        if self.config.enabled:
+            self.requests.observe(seconds, (endpoint, str(status)))
+
+    def gauge(self, name: str, help_text: str, read):
+        """Report `read()` as a gauge at scrape time."""
+        self._gauges.append((name, help_text, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.requests, self.stages, self.iterations, self.tokens, self.context_tokens):
+            lines.extend(metric.render())
+        for name, help_text, read in self._gauges:
+            value = read()
+            if value is not None:
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_number(value)}"])
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics(MetricsConfig())
@@ -0,0 +1,102 @@
+import threading
+import tiktoken
+from functools import lru_cache
+from corpus import sentence_spans
+from logs import get_logger
+from retrieval import tokenize
+
+logger = get_logger('packing')
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+def get_encoder(model: str):
+    # Built once under a lock, so concurrent first calls neither load the
+    # encoding twice nor repeat the fallback warning
+    try:
+        return _encoders[model]
+    except KeyError:
+        pass
+    with _encoders_lock:
+        if model not in _encoders:
+            try:
+                _encoders[model] = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                # No encoding files and no network: fall back to an estimate
+                logger.warning("tiktoken unavailable for %s, estimating token counts: %s", model, type(e).__name__)
+                _encoders[model] = None
+        return _encoders[model]
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str, model: str = 'gpt-3.5-turbo') -> int:
+    encoder = get_encoder(model)
+    if encoder is None:
+        return max(1, len(text) // 4)
+    return len(encoder.encode(text))
+
+def shingles(text: str, size: int = 3) -> frozenset:
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return frozenset([' '.join(tokens)])
+    return frozenset(' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1))
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def trim_to_budget(text: str, query_terms: set, budget: int, model: str, min_overlap: int = 1) -> str:
+    """Keep the sentences sharing most terms with the query that fit in `budget`.
+
+    Sentences sharing fewer than `min_overlap` terms with the query are
+    never kept. The kept sentences are returned in their original order.
+    """
+    sentences = [text[start:end] for start, end in sentence_spans(text)]
+    overlap = [len(query_terms & set(tokenize(sentence))) for sentence in sentences]
+    ranked = sorted((i for i in range(len(sentences)) if overlap[i] >= min_overlap), key=lambda i: (-overlap[i], i))
+
+    kept, used = [], 0
+    for i in ranked:
+        cost = count_tokens(sentences[i], model)
+        if used + cost <= budget:
+            kept.append(i)
+            used += cost
+    return ' '.join(sentences[i] for i in sorted(kept))
+
+def pack_context(query: str, hits: list, budget: int, max_chunks: int, dedup_threshold: float, model: str) -> dict:
+    """Fit ranked (score, text) hits into a token budget.
+
+    Near-duplicates of an already packed chunk are dropped, and a chunk that
+    does not fit whole is trimmed to its best sentences.
+    """
+    query_terms = set(tokenize(query))
+    packed, packed_shingles = [], []
+    used = 0
+    # What the tool used to send: the first max_chunks hits in full
+    original_tokens = sum(count_tokens(text, model) for _, text in hits[:max_chunks])
+
+    for score, text in hits:
+        if len(packed) >= max_chunks or used >= budget:
+            break
+        tokens = count_tokens(text, model)
+
+        chunk_shingles = shingles(text)
+        if any(jaccard(chunk_shingles, other) >= dedup_threshold for other in packed_shingles):
+            continue
+
+        if used + tokens > budget:
+            text = trim_to_budget(text, query_terms, budget - used, model)
+            if not text:
+                continue
+            tokens = count_tokens(text, model)
+
+        packed.append(text)
+        packed_shingles.append(chunk_shingles)
+        used += tokens
+
+    return {
+        'chunks': packed,
+        'tokens': used,
+        'original_tokens': original_tokens,
+        'saved_tokens': max(0, original_tokens - used)
+    }
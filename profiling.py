@@ -0,0 +1,222 @@
+import cProfile
+import hmac
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from logs import get_logger
+
+logger = get_logger('profiling')
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROFILE_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9A-Za-z]+-(?:admin|sampled)$')
+
+class ProfilingConfig:
+    def __init__(self):
+        # Requests carrying this value in X-Lumi-Profile are profiled and
+        # may download profiles; empty turns the header trigger off
+        self.token = os.getenv('LUMI_PROFILE_TOKEN', '')
+        # Share of /chat requests profiled without being asked
+        self.sample_rate = float(os.getenv('LUMI_PROFILE_SAMPLE', '0'))
+        self.directory = os.getenv('LUMI_PROFILE_DIR', os.path.join(ROOT, '.cache', 'profiles'))
+        # Profiles kept on disk per kind; the oldest go first
+        self.max_files = int(os.getenv('LUMI_PROFILE_MAX_FILES', '50'))
+        self.max_admin_files = int(os.getenv('LUMI_PROFILE_MAX_ADMIN_FILES', '20'))
+        self.max_bytes = int(float(os.getenv('LUMI_PROFILE_MAX_MB', '50')) * 1024 * 1024)
+        self.top = int(os.getenv('LUMI_PROFILE_TOP', '10'))
+
+class Capture:
+    """cProfile around one request's work on the current thread."""
+
+    def __init__(self, profiler, trace_id, reason):
+        self.profiler = profiler
+        # Trace ids can come from a client's X-Request-ID
+        self.trace_id = re.sub(r'[^0-9A-Za-z]', '', trace_id or '')[:32] or 'none'
+        self.reason = reason
+        self.id = None
+        self.summary = None
+        self._profile = cProfile.Profile()
+        self._entered = False
+        self._held = True
+
+    def __enter__(self):
+        self._entered = True
+        self._start = time.perf_counter()
+        try:
+            self._profile.enable()
+        except ValueError:
+            # Another profiler is active in this process
+            self._profile = None
+            self.release()
+        return self
+
+    def __exit__(self, *exc):
+        if self._profile is None:
+            return False
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._start
+        try:
+            self.summary = self.profiler.save(self, elapsed)
+        except Exception:
+            logger.exception("profile not saved", extra={'profile_trace': self.trace_id})
+        finally:
+            self.release()
+        return False
+
+    def close(self):
+        """Give the slot back if the capture never ran, e.g. on a routed reply."""
+        if not self._entered:
+            self.release()
+
+    def release(self):
+        with self.profiler._lock:
+            if self._held:
+                self._held = False
+                self.profiler._busy.release()
+
+class _NoCapture:
+    __slots__ = ()
+    summary = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+NO_CAPTURE = _NoCapture()
+
+_capture = ContextVar('lumi_profile', default=NO_CAPTURE)
+
+def use_capture(capture):
+    """Profile the agent run of the current request (or another thread's) with `capture`."""
+    _capture.set(capture)
+
+def current_capture():
+    return _capture.get()
+
+def _where(filename, line, name):
+    if filename == '~':
+        # Built-ins have no file
+        return name
+    if filename.startswith(ROOT + os.sep):
+        filename = os.path.relpath(filename, ROOT)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f"{filename}:{line}({name})"
+
+class Profiler:
+    """Opt-in cProfile captures of /chat turns, saved for download.
+
+    A request is profiled when it sends the admin token in X-Lumi-Profile
+    or falls in the `sample_rate` share. Only one capture runs at a time, so
+    a burst of samples never profiles concurrent turns. Sampled profiles are
+    capped by `max_files` and admin ones by `max_admin_files`; each kind is
+    also held under `max_bytes`. Only admin captures get a summary back, so
+    a sampled customer request never sees profiler output.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self.counters = {'admin': 0, 'sampled': 0, 'skipped_busy': 0, 'evicted': 0}
+
+    def authorized(self, header) -> bool:
+        return bool(self.config.token and header) and hmac.compare_digest(header, self.config.token)
+
+    def begin(self, header, trace_id):
+        """A Capture for this request, or NO_CAPTURE."""
+        if self.authorized(header):
+            reason = 'admin'
+        elif self.config.sample_rate > 0 and random.random() < self.config.sample_rate:
+            reason = 'sampled'
+        else:
+            return NO_CAPTURE
+
+        if not self._busy.acquire(blocking=False):
+            with self._lock:
+                self.counters['skipped_busy'] += 1
+            return NO_CAPTURE
+        with self._lock:
+            self.counters[reason] += 1
+        return Capture(self, trace_id, reason)
+
+    def save(self, capture, elapsed):
+        """Write the profile; returns its summary for admin captures, else None."""
+        os.makedirs(self.config.directory, exist_ok=True)
+        capture.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{capture.trace_id}-{capture.reason}"
+        capture._profile.dump_stats(self.path(capture.id))
+        max_files = self.config.max_admin_files if capture.reason == 'admin' else self.config.max_files
+        self._prune(capture.reason, max_files)
+        logger.info("profile saved", extra={'profile_id': capture.id, 'reason': capture.reason})
+        if capture.reason != 'admin':
+            return None
+        stats = pstats.Stats(capture._profile)
+        return {
+            'id': capture.id,
+            'reason': capture.reason,
+            'total_ms': round(elapsed * 1000, 1),
+            'top': self.top_functions(stats)
+        }
+
+    def top_functions(self, stats) -> list:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                'function': _where(*func),
+                'calls': calls,
+                'cumulative_ms': round(cumulative * 1000, 2),
+                'own_ms': round(own * 1000, 2)
+            }
+            for func, (_, calls, own, cumulative, _) in rows[:self.config.top]
+        ]
+
+    def path(self, profile_id):
+        return os.path.join(self.config.directory, f"{profile_id}.prof")
+
+    def list(self) -> list:
+        try:
+            names = os.listdir(self.config.directory)
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for name in names:
+            profile_id = name[:-len('.prof')]
+            if not name.endswith('.prof') or not PROFILE_ID.match(profile_id):
+                continue
+            try:
+                info = os.stat(os.path.join(self.config.directory, name))
+            except FileNotFoundError:
+                continue
+            profiles.append({'id': profile_id, 'bytes': info.st_size, 'created': info.st_mtime})
+        return sorted(profiles, key=lambda profile: profile['created'])
+
+    def _prune(self, reason, max_files):
+        with self._lock:
+            kept = [profile for profile in self.list() if profile['id'].endswith(f"-{reason}")]
+            total = sum(profile['bytes'] for profile in kept)
+            while kept and (len(kept) > max_files or total > self.config.max_bytes):
+                oldest = kept.pop(0)
+                total -= oldest['bytes']
+                try:
+                    os.remove(self.path(oldest['id']))
+                    self.counters['evicted'] += 1
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                'sample_rate': self.config.sample_rate,
+                'stored': len(self.list())
+            }
+
+profiler = Profiler(ProfilingConfig())
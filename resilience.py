@@ -0,0 +1,448 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar, copy_context
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+class ResilienceConfig:
+    def __init__(self):
+        # Seconds for a whole call, or for the first and each following
+        # chunk of a streamed call
+        self.call_timeout = float(os.getenv('LUMI_LLM_CALL_TIMEOUT', '20'))
+        # Seconds for a whole turn; under the Streamlit client's 30s timeout
+        self.request_deadline = float(os.getenv('LUMI_REQUEST_DEADLINE', '25'))
+        self.retries = int(os.getenv('LUMI_LLM_RETRIES', '2'))
+        self.backoff_base = float(os.getenv('LUMI_LLM_BACKOFF', '0.5'))
+        self.backoff_max = 8.0
+        self.hedge = os.getenv('LUMI_LLM_HEDGE', '0') == '1'
+        self.hedge_quantile = 0.95
+        # Until enough calls have been seen to estimate the p95
+        self.hedge_default_delay = float(os.getenv('LUMI_LLM_HEDGE_DELAY', '2'))
+        self.hedge_min_samples = 20
+        self.latency_window = 200
+
+class CallTimeout(Exception):
+    """An LLM call missed its per-call deadline."""
+
+class DeadlineExceeded(Exception):
+    """The turn ran out of its total time budget."""
+
+TRANSIENT_ERRORS = (CallTimeout, APITimeoutError, APIConnectionError, RateLimitError, InternalServerError)
+
+_deadline = ContextVar('lumi_request_deadline', default=None)
+
+def start_deadline(seconds: float):
+    """Give the current turn `seconds` in total for its LLM calls (0 disables)."""
+    _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+
+def time_left():
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+class LatencyWindow:
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+class CallPolicy:
+    """Deadlines, retries and hedging for LLM calls.
+
+    Every call is treated as a stream; a plain call is a stream of one
+    item. An attempt that yields nothing within the call timeout counts as
+    a deadline hit. Transient errors are retried with exponential backoff
+    and full jitter, but only before the first item has been passed on.
+    With hedging on, a second attempt starts if the first has yielded
+    nothing after the recent p95 latency, and the first to yield wins.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.latency = {'generate': LatencyWindow(config.latency_window), 'stream': LatencyWindow(config.latency_window)}
+        self.counters = {
+            'calls': 0,
+            'deadline_hits': 0,
+            'request_deadline_hits': 0,
+            'retries': 0,
+            'hedges': 0,
+            'hedge_wins': 0,
+            'failures': 0
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _timeout(self):
+        left = time_left()
+        if left is None:
+            return self.config.call_timeout
+        if left <= 0:
+            self._count('request_deadline_hits')
+            raise DeadlineExceeded("The request ran out of time")
+        return min(self.config.call_timeout, left)
+
+    def attempt_timeout(self):
+        """Request timeout for an attempt starting now: the call timeout, cut to the turn's deadline."""
+        left = time_left()
+        if left is None:
+            return self.config.call_timeout
+        return max(0.1, min(self.config.call_timeout, left))
+
+    def hedge_delay(self, kind):
+        if not self.config.hedge:
+            return None
+        window = self.latency[kind]
+        if len(window) < self.config.hedge_min_samples:
+            return self.config.hedge_default_delay
+        return window.quantile(self.config.hedge_quantile)
+
+    def _backoff(self, attempt):
+        delay = random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * 2 ** attempt))
+        left = time_left()
+        if left is not None and delay >= left:
+            self._count('request_deadline_hits')
+            raise DeadlineExceeded("The request ran out of time")
+        self._count('retries')
+        return delay
+
+    def _failed(self, error, attempt):
+        """Backoff before the next attempt, or None if `error` must propagate."""
+        if not isinstance(error, TRANSIENT_ERRORS) or attempt >= self.config.retries:
+            self._count('failures')
+            return None
+        return self._backoff(attempt)
+
+    def stream(self, make_iter, kind='stream') -> Iterator:
+        self._count('calls')
+        attempt = 0
+        while True:
+            race = _Race(make_iter, self)
+            try:
+                first = race.first(self._timeout(), self.hedge_delay(kind), kind)
+                break
+            except Exception as e:
+                race.cancel()
+                delay = self._failed(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+        yield from race.rest(first)
+
+    def call(self, fn, kind='generate'):
+        stream = self.stream(lambda: iter([fn()]), kind)
+        try:
+            return next(stream)
+        finally:
+            stream.close()
+
+    async def astream(self, make_aiter, kind='stream') -> AsyncIterator:
+        self._count('calls')
+        attempt = 0
+        while True:
+            race = _AsyncRace(make_aiter, self)
+            try:
+                first = await race.first(self._timeout(), self.hedge_delay(kind), kind)
+                break
+            except Exception as e:
+                race.cancel()
+                delay = self._failed(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+        async for item in race.rest(first):
+            yield item
+
+    async def acall(self, factory, kind='generate'):
+        async def single():
+            yield await factory()
+
+        stream = self.astream(single, kind)
+        try:
+            return await stream.__anext__()
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        p95 = {kind: window.quantile(self.config.hedge_quantile) for kind, window in self.latency.items()}
+        return {
+            'call_timeout': self.config.call_timeout,
+            'request_deadline': self.config.request_deadline,
+            'hedge': self.config.hedge,
+            **counters,
+            'p95_first_item_ms': {kind: round(value * 1000, 1) if value is not None else None for kind, value in p95.items()}
+        }
+
+class _Race:
+    """Attempts of one call in threads, feeding a shared queue."""
+
+    def __init__(self, make_iter, policy):
+        self.make_iter = make_iter
+        self.policy = policy
+        self.events = queue.Queue()
+        self.cancels = []
+        self.winner = None
+
+    def _start(self):
+        index = len(self.cancels)
+        cancel = threading.Event()
+        self.cancels.append(cancel)
+        context = copy_context()
+        threading.Thread(target=context.run, args=(self._produce, index, cancel), daemon=True).start()
+
+    def _produce(self, index, cancel):
+        iterator = None
+        try:
+            iterator = self.make_iter()
+            for item in iterator:
+                if cancel.is_set():
+                    return
+                self.events.put((index, 'item', item))
+            self.events.put((index, 'end', None))
+        except BaseException as e:
+            self.events.put((index, 'error', e))
+        finally:
+            # Closing a generator releases whatever it holds (e.g. an admission slot)
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    def cancel(self, keep=None):
+        for index, cancel in enumerate(self.cancels):
+            if index != keep:
+                cancel.set()
+
+    def first(self, timeout, hedge_delay, kind):
+        start = time.monotonic()
+        deadline = start + timeout
+        self._start()
+        live, hedged = 1, hedge_delay is None
+        error = None
+        while True:
+            wake = deadline if hedged else min(deadline, start + hedge_delay)
+            try:
+                index, event, value = self.events.get(timeout=max(0.0, wake - time.monotonic()))
+            except queue.Empty:
+                if not hedged and time.monotonic() < deadline:
+                    hedged = True
+                    live += 1
+                    self.policy._count('hedges')
+                    self._start()
+                    continue
+                self.policy._count('deadline_hits')
+                raise CallTimeout(f"No response within {timeout:.1f}s")
+
+            if event == 'error':
+                live -= 1
+                error = value
+                if live == 0:
+                    raise error
+                continue
+
+            self.winner = index
+            self.cancel(keep=index)
+            if index > 0:
+                self.policy._count('hedge_wins')
+            self.policy.latency[kind].add(time.monotonic() - start)
+            return event, value
+
+    def rest(self, first):
+        try:
+            event, value = first
+            if event == 'end':
+                return
+            yield value
+            while True:
+                timeout = self.policy._timeout()
+                try:
+                    index, event, value = self.events.get(timeout=timeout)
+                except queue.Empty:
+                    self.policy._count('deadline_hits')
+                    raise CallTimeout(f"Stream stalled for {timeout:.1f}s")
+                if index != self.winner:
+                    continue
+                if event == 'end':
+                    return
+                if event == 'error':
+                    raise value
+                yield value
+        finally:
+            self.cancel()
+
+class _AsyncRace:
+    """Attempts of one call as tasks on the running loop."""
+
+    def __init__(self, make_aiter, policy):
+        self.make_aiter = make_aiter
+        self.policy = policy
+        self.events = asyncio.Queue()
+        self.tasks = []
+        self.winner = None
+
+    def _start(self):
+        index = len(self.tasks)
+        self.tasks.append(asyncio.ensure_future(self._produce(index)))
+
+    async def _produce(self, index):
+        try:
+            async for item in self.make_aiter():
+                self.events.put_nowait((index, 'item', item))
+            self.events.put_nowait((index, 'end', None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.events.put_nowait((index, 'error', e))
+
+    def cancel(self, keep=None):
+        for index, task in enumerate(self.tasks):
+            if index != keep:
+                task.cancel()
+
+    async def first(self, timeout, hedge_delay, kind):
+        start = time.monotonic()
+        deadline = start + timeout
+        self._start()
+        live, hedged = 1, hedge_delay is None
+        error = None
+        while True:
+            wake = deadline if hedged else min(deadline, start + hedge_delay)
+            try:
+                index, event, value = await asyncio.wait_for(self.events.get(), max(0.0, wake - time.monotonic()))
+            except asyncio.TimeoutError:
+                if not hedged and time.monotonic() < deadline:
+                    hedged = True
+                    live += 1
+                    self.policy._count('hedges')
+                    self._start()
+                    continue
+                self.policy._count('deadline_hits')
+                raise CallTimeout(f"No response within {timeout:.1f}s")
+
+            if event == 'error':
+                live -= 1
+                error = value
+                if live == 0:
+                    raise error
+                continue
+
+            self.winner = index
+            self.cancel(keep=index)
+            if index > 0:
+                self.policy._count('hedge_wins')
+            self.policy.latency[kind].add(time.monotonic() - start)
+            return event, value
+
+    async def rest(self, first):
+        try:
+            event, value = first
+            if event == 'end':
+                return
+            yield value
+            while True:
+                timeout = self.policy._timeout()
+                try:
+                    index, event, value = await asyncio.wait_for(self.events.get(), timeout)
+                except asyncio.TimeoutError:
+                    self.policy._count('deadline_hits')
+                    raise CallTimeout(f"Stream stalled for {timeout:.1f}s")
+                if index != self.winner:
+                    continue
+                if event == 'end':
+                    return
+                if event == 'error':
+                    raise value
+                yield value
+        finally:
+            self.cancel()
+
+class ResilientChatModel(BaseChatModel):
+    """Chat model wrapper applying a CallPolicy to every call.
+
+    Hedged attempts run without the callback manager, so only the winning
+    stream's tokens reach callbacks (through the caller's stream loop).
+    Each attempt passes the time left in the turn as its request `timeout`,
+    so an attempt the race has given up on does not hold its connection
+    (and admission slot) past the deadline.
+    """
+
+    model: BaseChatModel
+    policy: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"resilient-{self.model._llm_type}"
+
+    def _callbacks(self, run_manager):
+        return None if self.policy.config.hedge else run_manager
+
+    def _attempt(self, kwargs):
+        # Called as each attempt starts, so retries and hedges get what is left
+        return {**kwargs, 'timeout': self.policy.attempt_timeout()}
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        run_manager = self._callbacks(run_manager)
+        return self.policy.call(lambda: self.model._generate(messages, stop=stop, run_manager=run_manager, **self._attempt(kwargs)))
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        run_manager = self._callbacks(run_manager)
+        yield from self.policy.stream(lambda: self.model._stream(messages, stop=stop, run_manager=run_manager, **self._attempt(kwargs)))
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        run_manager = self._callbacks(run_manager)
+        return await self.policy.acall(lambda: self.model._agenerate(messages, stop=stop, run_manager=run_manager, **self._attempt(kwargs)))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        run_manager = self._callbacks(run_manager)
+        async for chunk in self.policy.astream(lambda: self.model._astream(messages, stop=stop, run_manager=run_manager, **self._attempt(kwargs))):
+            yield chunk
@@ -0,0 +1,231 @@
+import numpy as np
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from retrieval import HashingEmbedder, TOKEN_PATTERN
+
+# Messages with contact details or ticket IDs are personal, never shared
+PERSONAL_PATTERN = re.compile(r'@|\d{7,}|\b[A-Fa-f0-9]{8}\b')
+
+class ResponseCacheConfig:
+    def __init__(self):
+        self.enabled = os.getenv('LUMI_RESPONSE_CACHE', '1') == '1'
+        self.backend = os.getenv('LUMI_RESPONSE_CACHE_BACKEND', 'memory')
+        self.path = os.getenv('LUMI_RESPONSE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'responses.sqlite3'))
+        self.max_entries = int(os.getenv('LUMI_RESPONSE_CACHE_SIZE', '1000'))
+        self.ttl = float(os.getenv('LUMI_RESPONSE_CACHE_TTL', '3600'))
+        # Cosine similarity for the semantic tier; 0 turns the tier off
+        self.similarity = float(os.getenv('LUMI_RESPONSE_CACHE_SIMILARITY', '0'))
+
+class MemoryResponseStore:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry) -> int:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def vectors(self):
+        return [(key, entry['vector']) for key, entry in self._entries.items() if entry['vector'] is not None]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SqliteResponseStore:
+    """On-disk store shared by the workers on one host."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT, version TEXT, created REAL, last_used REAL, vector BLOB)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        with self._connect() as db:
+            row = db.execute("SELECT response, version, created, vector FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return {
+            'response': row[0],
+            'version': row[1],
+            'created': row[2],
+            'vector': np.frombuffer(row[3], dtype='float32') if row[3] else None
+        }
+
+    def put(self, key, entry) -> int:
+        vector = entry['vector'].tobytes() if entry['vector'] is not None else None
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry['response'], entry['version'], entry['created'], time.time(), vector)
+            )
+            cursor = db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            return cursor.rowcount
+
+    def delete(self, key):
+        with self._connect() as db:
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def vectors(self):
+        with self._connect() as db:
+            rows = db.execute("SELECT key, vector FROM responses WHERE vector IS NOT NULL").fetchall()
+        return [(key, np.frombuffer(blob, dtype='float32')) for key, blob in rows]
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+class ResponseCache:
+    """Answers for first-turn, stateless questions, reused across sessions.
+
+    The exact tier matches on normalised text. The optional similarity tier
+    compares hashed embeddings of the question against cached ones. Entries
+    expire by LRU size, by TTL and when the FAQ corpus version changes, so
+    re-ingesting the PDF drops answers built on the old text.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.embedder = HashingEmbedder()
+        self.version = None
+        self.counters = {
+            'hits_exact': 0,
+            'hits_similar': 0,
+            'misses': 0,
+            'stores': 0,
+            'skipped': 0,
+            'expired': 0,
+            'evicted': 0,
+            'invalidations': 0
+        }
+        self._lock = threading.Lock()
+        if config.backend == 'disk':
+            self.store = SqliteResponseStore(config.path, config.max_entries)
+        elif config.backend == 'memory':
+            self.store = MemoryResponseStore(config.max_entries)
+        else:
+            raise ValueError(f"Unknown response cache backend: {config.backend}")
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        return ' '.join(TOKEN_PATTERN.findall(message.lower()))
+
+    def cacheable(self, message: str, session) -> bool:
+        return self.config.enabled and not session['messages'] and not PERSONAL_PATTERN.search(message)
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.version is not None:
+                self.store.clear()
+                self.counters['invalidations'] += 1
+            self.version = version
+
+    def _fresh(self, key, entry, version):
+        if entry['version'] != version or time.time() - entry['created'] > self.config.ttl:
+            self.store.delete(key)
+            self.counters['expired'] += 1
+            return False
+        return True
+
+    def get(self, message: str, version):
+        key = self.normalize(message)
+        with self._lock:
+            self._check_version(version)
+            entry = self.store.get(key)
+            if entry is not None and self._fresh(key, entry, version):
+                self.counters['hits_exact'] += 1
+                return entry['response']
+
+            if self.config.similarity > 0:
+                match = self._similar(key, version)
+                if match is not None:
+                    self.counters['hits_similar'] += 1
+                    return match
+
+            self.counters['misses'] += 1
+            return None
+
+    def _similar(self, key, version):
+        candidates = self.store.vectors()
+        if not candidates:
+            return None
+        query = self.embedder.embed([key])[0]
+        scores = np.stack([vector for _, vector in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.config.similarity:
+            return None
+
+        best_key = candidates[best][0]
+        entry = self.store.get(best_key)
+        if entry is None or not self._fresh(best_key, entry, version):
+            return None
+        return entry['response']
+
+    def put(self, message: str, response: str, version):
+        key = self.normalize(message)
+        if not key:
+            return
+        vector = self.embedder.embed([key])[0] if self.config.similarity > 0 else None
+        with self._lock:
+            self._check_version(version)
+            self.counters['evicted'] += self.store.put(key, {
+                'response': response,
+                'version': version,
+                'created': time.time(),
+                'vector': vector
+            })
+            self.counters['stores'] += 1
+
+    def skip(self):
+        with self._lock:
+            self.counters['skipped'] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self.store)
+        hits = counters['hits_exact'] + counters['hits_similar']
+        lookups = hits + counters['misses']
+        return {
+            'enabled': self.config.enabled,
+            'backend': self.config.backend,
+            'size': size,
+            **counters,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,213 @@
+import faiss
+import heapq
+import math
+import numpy as np
+import os
+import re
+import threading
+import zlib
+from metrics import metrics
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from',
+    'how', 'i', 'if', 'in', 'is', 'it', 'its', 'my', 'of', 'on', 'or', 'so', 'that', 'the',
+    'this', 'to', 'was', 'what', 'when', 'where', 'which', 'why', 'will', 'with', 'you', 'your'
+])
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """Inverted index with BM25 weights computed at build time.
+
+    Each posting stores the document's full BM25 contribution for that term,
+    so a query only sums the postings of its own terms and never touches
+    documents that share no term with it.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.documents = documents
+        self.postings = {}
+
+        doc_terms = []
+        for document in documents:
+            counts = {}
+            for token in tokenize(document):
+                counts[token] = counts.get(token, 0) + 1
+            doc_terms.append(counts)
+
+        lengths = [sum(counts.values()) for counts in doc_terms]
+        doc_count = len(documents)
+        avg_length = (sum(lengths) / doc_count) if doc_count else 0.0
+
+        document_frequency = {}
+        for counts in doc_terms:
+            for token in counts:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+
+        idf = {
+            token: math.log(1 + (doc_count - freq + 0.5) / (freq + 0.5))
+            for token, freq in document_frequency.items()
+        }
+
+        for doc_id, counts in enumerate(doc_terms):
+            norm = k1 * (1 - b + b * lengths[doc_id] / avg_length) if avg_length else k1
+            for token, tf in counts.items():
+                weight = idf[token] * tf * (k1 + 1) / (tf + norm)
+                self.postings.setdefault(token, []).append((doc_id, weight))
+
+    def search(self, query: str, top_k: int) -> list:
+        scores = {}
+        for token in set(tokenize(query)):
+            for doc_id, weight in self.postings.get(token, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, doc_id) for doc_id, score in best]
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedding using the hashing trick.
+
+    Needs no model download or network access, so it is the default. Word
+    unigrams and bigrams are hashed with CRC32 (stable across processes,
+    unlike hash()) into a signed, L2-normalised vector. Any object with a
+    `name` and an `embed(texts)` method returning float32 rows can replace it.
+    """
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+        self.name = f"hashing{dim}"
+
+    def embed(self, texts) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype='float32')
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode('utf-8'))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        # Sublinear term frequency so one repeated word cannot dominate
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        faiss.normalize_L2(vectors)
+        return vectors
+
+class OpenAIEmbedder:
+    def __init__(self, model='text-embedding-3-small'):
+        from langchain_openai import OpenAIEmbeddings
+        self.client = OpenAIEmbeddings(model=model)
+        self.name = f"openai-{model}"
+
+    def embed(self, texts) -> np.ndarray:
+        vectors = np.array(self.client.embed_documents(list(texts)), dtype='float32')
+        faiss.normalize_L2(vectors)
+        return vectors
+
+EMBEDDERS = {
+    'hashing': HashingEmbedder,
+    'openai': OpenAIEmbedder
+}
+
+class VectorIndex:
+    """Exact inner-product search over normalised document embeddings.
+
+    The vectors are saved as a .npy matrix and loaded with
+    np.load(mmap_mode='r'): pages stay file-backed in the page cache, so API
+    workers on one host share one copy. (faiss.read_index with IO_FLAG_MMAP
+    only maps IVF inverted lists; a flat index is read into private memory.)
+    """
+
+    def __init__(self, vectors, documents, embedder):
+        self.vectors = vectors
+        self.documents = documents
+        self.embedder = embedder
+
+    @classmethod
+    def build(cls, documents, embedder):
+        if len(documents):
+            vectors = embedder.embed(documents)
+        else:
+            vectors = np.zeros((0, getattr(embedder, 'dim', 1)), dtype='float32')
+        return cls(vectors, documents, embedder)
+
+    @classmethod
+    def load(cls, path, documents, embedder):
+        vectors = np.load(path, mmap_mode='r')
+        if vectors.shape[0] != len(documents):
+            raise ValueError(f"Vector index {path} has {vectors.shape[0]} vectors for {len(documents)} documents")
+        return cls(vectors, documents, embedder)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        # A file object, so np.save does not append another .npy
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype='float32'))
+        os.replace(tmp_path, path)
+
+    def search(self, query: str, top_k: int) -> list:
+        count = self.vectors.shape[0]
+        if not count:
+            return []
+        scores = self.vectors @ self.embedder.embed([query])[0]
+        k = min(top_k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(float(scores[doc_id]), int(doc_id)) for doc_id in top if scores[doc_id] > 0]
+
+class FAQRetriever:
+    """Keeps the configured search index in step with the FAQ corpus.
+
+    `RAGConfig.retrieval_backend` selects 'bm25' (keyword) or 'vector'
+    (exact search over `RAGConfig.embedding_backend` embeddings).
+    """
+
+    def __init__(self, corpus, config):
+        self.corpus = corpus
+        self.config = config
+        self.index = None
+        self.version = None
+        self._embedder = None
+        self._lock = threading.Lock()
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = EMBEDDERS[self.config.embedding_backend]()
+        return self._embedder
+
+    def ensure_index(self):
+        self.corpus.load()
+        if self.version != self.corpus.version:
+            with self._lock:
+                if self.version != self.corpus.version:
+                    with metrics.stage('retrieval', 'build_index'):
+                        self.index = self._build_index()
+                    self.version = self.corpus.version
+        return self.index
+
+    def _build_index(self):
+        documents = self.corpus.chunks
+        backend = self.config.retrieval_backend
+
+        if backend == 'bm25':
+            return BM25Index(documents, k1=self.config.bm25_k1, b=self.config.bm25_b)
+
+        if backend == 'vector':
+            embedder = self.embedder
+            path = os.path.join(
+                self.config.cache_dir,
+                f"faq_vectors-{self.corpus.version}-{embedder.name}.npy"
+            )
+            if not os.path.exists(path):
+                VectorIndex.build(documents, embedder).save(path)
+            return VectorIndex.load(path, documents, embedder)
+
+        raise ValueError(f"Unknown retrieval backend: {backend}")
+
+    def search(self, query: str, top_k: int = None) -> list:
+        index = self.ensure_index()
+        with metrics.stage('retrieval', 'search'):
+            hits = index.search(query, top_k or self.config.top_k)
+        return [(score, index.documents[doc_id]) for score, doc_id in hits]
@@ -0,0 +1,191 @@
+import os
+import re
+import threading
+import time
+from logs import get_logger
+from metrics import metrics
+from packing import jaccard, shingles, trim_to_budget
+from retrieval import tokenize
+from tools import COMPLAINT_ID_PATTERN, extract_payload, faq_retriever, rag_config, retrieve_complaint
+
+logger = get_logger('router')
+
+LOOKUP_WORDS = re.compile(r'\b(status|ticket|complaint|track|tracking|check|lookup|look up|id|update|progress)\b', re.IGNORECASE)
+# Ticket IDs are hex; an all-digit token (a date, an order number) only
+# counts as one next to lookup wording
+HEX_LETTER = re.compile(r'[A-F]')
+CREATE_WORDS = re.compile(r'\b(create|file|new|raise|open|register|submit)\b', re.IGNORECASE)
+
+TICKET_TEMPLATE = """Here are the details for ticket {complaint_id}:
+- Status: {status}
+- Name: {name}
+- Issue: {complaint_details}
+- Created: {created_at}
+
+Let me know if there's anything else I can help with."""
+
+FAQ_TEMPLATE = """Here's what our FAQ says:
+
+{answer}
+
+If this doesn't solve it, I can open a support ticket for you."""
+
+class RouterConfig:
+    def __init__(self):
+        self.tickets = os.getenv('LUMI_ROUTE_TICKETS', '1') == '1'
+        self.faq = os.getenv('LUMI_ROUTE_FAQ', '1') == '1'
+        self.ticket_max_words = 8
+        # An FAQ hit must contain every query term (coverage 1.0) and the
+        # query must have at least this many terms to be answered directly
+        self.faq_min_coverage = float(os.getenv('LUMI_ROUTE_FAQ_COVERAGE', '1.0'))
+        self.faq_min_terms = 3
+        self.faq_answer_tokens = 200
+        # Extractive mode: answer with the top hit when its score leads the
+        # best distinct runner-up by this share of the top score
+        self.extractive = os.getenv('LUMI_ROUTE_EXTRACTIVE', '0') == '1'
+        self.extractive_margin = float(os.getenv('LUMI_ROUTE_EXTRACTIVE_MARGIN', '0.3'))
+        self.extractive_min_terms = 2
+        # A lone rare word can dominate the scores, so the top hit must
+        # also contain this share of the query terms
+        self.extractive_min_coverage = 0.5
+
+class IntentRouter:
+    """Deterministic fast path in front of the agent.
+
+    Answers messages that clearly match a known pattern without calling
+    the model: ticket lookups by ID, FAQ questions whose top hit contains
+    every query term and, in extractive mode, FAQ questions whose top hit
+    clearly outscores the rest. The FAQ routes only answer a session's
+    first message; later ones may be part of a complaint flow the model is
+    running. Everything else returns None and goes to the agent.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.counters = {
+            'ticket_lookup': 0,
+            'faq_exact': 0,
+            'faq_extractive': 0,
+            'passed': 0,
+            'route_ms': 0.0,
+            'saved_ms': 0.0
+        }
+        self._lock = threading.Lock()
+
+    def route(self, message: str, first_turn: bool = True):
+        start = time.perf_counter()
+        reply = None
+        if self.config.tickets:
+            reply = self._ticket_lookup(message)
+        if reply is None and self.config.faq and first_turn:
+            reply = self._faq_exact(message)
+        if reply is None and self.config.extractive and first_turn:
+            reply = self._faq_extractive(message)
+        elapsed = (time.perf_counter() - start) * 1000
+        metrics.observe('router', elapsed / 1000, reply['intent'] if reply is not None else 'passed')
+
+        with self._lock:
+            self.counters['route_ms'] += elapsed
+            if reply is None:
+                self.counters['passed'] += 1
+            else:
+                self.counters[reply['intent']] += 1
+        if reply is not None:
+            reply['elapsed_ms'] = elapsed
+        return reply
+
+    def record_saving(self, saved_ms: float):
+        with self._lock:
+            self.counters['saved_ms'] += max(0.0, saved_ms)
+
+    def _ticket_id(self, message):
+        candidates = COMPLAINT_ID_PATTERN.findall(message.upper())
+        hex_ids = [candidate for candidate in candidates if HEX_LETTER.search(candidate)]
+        if hex_ids:
+            return hex_ids[0]
+        if candidates and LOOKUP_WORDS.search(message):
+            return candidates[0]
+        return None
+
+    def _ticket_lookup(self, message):
+        complaint_id = self._ticket_id(message)
+        if not complaint_id or CREATE_WORDS.search(message):
+            return None
+        if not LOOKUP_WORDS.search(message) and len(message.split()) > self.config.ticket_max_words:
+            return None
+
+        output = retrieve_complaint.invoke({'complaint_id': complaint_id})
+        payload = extract_payload(output)
+        if payload:
+            response = TICKET_TEMPLATE.format(**payload)
+        elif output.startswith("No complaint found"):
+            response = f"I couldn't find a ticket with ID {complaint_id}. Please check the ID and try again."
+        else:
+            # Lookup failed (e.g. database down): let the agent handle it
+            return None
+
+        return {'intent': 'ticket_lookup', 'tool': 'retrieve_complaint', 'response': response, 'data': payload}
+
+    def _faq_hits(self, message, top_k):
+        try:
+            return faq_retriever.search(message, top_k=top_k)
+        except Exception as e:
+            # FAQ PDF missing or index failed to load: let the agent handle it
+            logger.warning("FAQ route skipped: %s", e)
+            return []
+
+    def _faq_exact(self, message):
+        terms = set(tokenize(message))
+        if len(terms) < self.config.faq_min_terms:
+            return None
+
+        hits = self._faq_hits(message, 1)
+        if not hits:
+            return None
+
+        score, text = hits[0]
+        coverage = len(terms & set(tokenize(text))) / len(terms)
+        if coverage < self.config.faq_min_coverage:
+            return None
+
+        answer = trim_to_budget(text, terms, self.config.faq_answer_tokens, rag_config.token_model, min_overlap=2)
+        if not answer:
+            return None
+        return {'intent': 'faq_exact', 'tool': 'rag_faq_search', 'response': FAQ_TEMPLATE.format(answer=answer), 'data': None}
+
+    def _faq_extractive(self, message):
+        terms = set(tokenize(message))
+        if len(terms) < self.config.extractive_min_terms:
+            return None
+
+        hits = self._faq_hits(message, rag_config.candidate_pool)
+        if not hits or hits[0][0] <= 0:
+            return None
+
+        # Overlapping chunks of the same answer are not competitors; the
+        # runner-up is the best hit that is not a near-duplicate of the top
+        score, text = hits[0]
+        top_shingles = shingles(text)
+        runner_up = next(
+            (other for other, other_text in hits[1:] if jaccard(top_shingles, shingles(other_text)) < rag_config.dedup_threshold),
+            0.0
+        )
+        if (score - max(runner_up, 0.0)) / score < self.config.extractive_margin:
+            return None
+        if len(terms & set(tokenize(text))) / len(terms) < self.config.extractive_min_coverage:
+            return None
+
+        answer = trim_to_budget(text, terms, self.config.faq_answer_tokens, rag_config.token_model)
+        if not answer:
+            return None
+        return {'intent': 'faq_extractive', 'tool': 'rag_faq_search', 'response': FAQ_TEMPLATE.format(answer=answer), 'data': None}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        routed = counters['ticket_lookup'] + counters['faq_exact'] + counters['faq_extractive']
+        total = routed + counters['passed']
+        return {
+            **counters,
+            'hit_rate': round(routed / total, 4) if total else 0.0
+        }
@@ -29,7 +29,7 @@ def check_environment():
         print("Please ensure MongoDB is running on localhost:27017")
         return False
     
-    pdf_path = '/Users/omkarsatapaphy/Downloads/Apple Laptop FAQ.pdf'
+    pdf_path = os.getenv('FAQ_PDF_PATH', '/Users/omkarsatapaphy/Downloads/Apple Laptop FAQ.pdf')
     if not os.path.exists(pdf_path):
         print(f"FAQ PDF not found at: {pdf_path}")
         print("Please update the path in tools.py")
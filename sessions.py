@@ -0,0 +1,484 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from logs import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; only the disk backend needs it
+    fcntl = None
+
+logger = get_logger('sessions')
+
+class SessionConfig:
+    def __init__(self):
+        self.max_sessions = int(os.getenv('LUMI_MAX_SESSIONS', '1000'))
+        self.idle_ttl = float(os.getenv('LUMI_SESSION_TTL', '1800'))
+        self.sweep_interval = float(os.getenv('LUMI_SESSION_SWEEP_INTERVAL', '60'))
+        # Stored history (disk and mongo) idle this long is deleted; 0 keeps it
+        self.history_ttl = float(os.getenv('LUMI_SESSION_HISTORY_TTL', str(7 * 24 * 3600)))
+        self.backend = os.getenv('LUMI_SESSION_BACKEND', 'memory')
+        self.session_dir = os.getenv('LUMI_SESSION_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'sessions'))
+
+class SessionManager:
+    """Thread-safe, bounded map of session id -> session state.
+
+    Sessions are kept in least-recently-used order. Creating one past
+    `max_sessions` evicts the oldest, and a background sweeper drops
+    sessions idle for longer than `idle_ttl` seconds. The sweeper also
+    calls `on_sweep`, which the history stores use to expire old history.
+    """
+
+    def __init__(self, factory, config, on_evict=None, on_sweep=None):
+        self.factory = factory
+        self.config = config
+        self.on_evict = on_evict
+        self.on_sweep = on_sweep
+        self.counters = {
+            'created': 0,
+            'hits': 0,
+            'evicted_lru': 0,
+            'evicted_idle': 0,
+            'cleared': 0
+        }
+        self._sessions = OrderedDict()
+        self._last_access = {}
+        self._lock = threading.RLock()
+        self._sweeper_pid = None
+
+    def get(self, session_id: str):
+        self._ensure_sweeper()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                self._last_access[session_id] = time.monotonic()
+                self.counters['hits'] += 1
+                return session
+
+            session = self.factory(session_id)
+            self._sessions[session_id] = session
+            self._last_access[session_id] = time.monotonic()
+            self.counters['created'] += 1
+
+            while len(self._sessions) > self.config.max_sessions:
+                oldest, _ = self._sessions.popitem(last=False)
+                del self._last_access[oldest]
+                self.counters['evicted_lru'] += 1
+                self._evicted(oldest)
+            return session
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                return False
+            del self._last_access[session_id]
+            self.counters['cleared'] += 1
+            return True
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def sweep(self) -> int:
+        cutoff = time.monotonic() - self.config.idle_ttl
+        removed = 0
+        with self._lock:
+            # LRU order means idle sessions are at the front
+            for session_id in list(self._sessions):
+                if self._last_access[session_id] > cutoff:
+                    break
+                del self._sessions[session_id]
+                del self._last_access[session_id]
+                self._evicted(session_id)
+                removed += 1
+            self.counters['evicted_idle'] += removed
+        return removed
+
+    def _evicted(self, session_id):
+        if self.on_evict is not None:
+            self.on_evict(session_id)
+
+    def _ensure_sweeper(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if self._sweeper_pid == os.getpid() or self.config.idle_ttl <= 0:
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            threading.Thread(target=self._sweep_loop, name='session-sweeper', daemon=True).start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.config.sweep_interval)
+            try:
+                self.sweep()
+                if self.on_sweep is not None:
+                    self.on_sweep()
+            except Exception as e:
+                logger.warning("Session sweep error: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._sessions),
+                'max_sessions': self.config.max_sessions,
+                'idle_ttl': self.config.idle_ttl,
+                **self.counters
+            }
+
+class SessionLocks:
+    """One lock per active session id, so turns for a session run in order.
+
+    Locks exist only while a turn holds or waits on them; different
+    sessions never share a lock and run fully in parallel. The in-process
+    lock orders turns within a worker; when the history `store` can lock a
+    session across processes (the disk backend), the turn also holds that
+    lock, so turns sent to different workers are ordered too.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.counters = {
+            'acquired': 0,
+            'contended': 0,
+            'wait_ms': 0.0
+        }
+        self._locks = {}
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, session_id: str, factory):
+        with self._lock:
+            entry = self._locks.setdefault(session_id, [factory(), 0])
+            entry[1] += 1
+        return entry[0]
+
+    def _acquired(self, waited: float):
+        with self._lock:
+            self.counters['acquired'] += 1
+            if waited:
+                self.counters['contended'] += 1
+                self.counters['wait_ms'] += waited
+
+    def _lock_store(self, session_id: str) -> float:
+        """Take the store's cross-process lock; returns milliseconds waited."""
+        if self.store is None:
+            return 0.0
+        start = time.perf_counter()
+        handle = self.store.lock(session_id)
+        # Only the holder of the in-process lock gets here, so one handle per session
+        self._held[session_id] = handle
+        return (time.perf_counter() - start) * 1000
+
+    def acquire(self, session_id: str):
+        lock = self._entry(session_id, threading.Lock)
+        if lock.acquire(blocking=False):
+            waited = 0.0
+        else:
+            start = time.perf_counter()
+            lock.acquire()
+            waited = (time.perf_counter() - start) * 1000
+        try:
+            waited += self._lock_store(session_id)
+        except BaseException:
+            self.release(session_id)
+            raise
+        self._acquired(waited)
+
+    def release(self, session_id: str):
+        handle = self._held.pop(session_id, None)
+        if handle is not None:
+            self.store.unlock(handle)
+        with self._lock:
+            entry = self._locks[session_id]
+            entry[0].release()
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[session_id]
+
+    @contextmanager
+    def hold(self, session_id: str):
+        self.acquire(session_id)
+        try:
+            yield
+        finally:
+            self.release(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'active': len(self._locks),
+                **self.counters
+            }
+
+class AsyncSessionLocks(SessionLocks):
+    """SessionLocks for coroutines on one event loop; waiting holds no thread."""
+
+    async def acquire(self, session_id: str):
+        lock = self._entry(session_id, asyncio.Lock)
+        if lock.locked():
+            start = time.perf_counter()
+            await lock.acquire()
+            waited = (time.perf_counter() - start) * 1000
+        else:
+            await lock.acquire()
+            waited = 0.0
+        try:
+            # Waiting on another process's lock blocks, so it waits on a thread
+            waited += await asyncio.get_running_loop().run_in_executor(None, self._lock_store, session_id)
+        except BaseException:
+            self.release(session_id)
+            raise
+        self._acquired(waited)
+
+    @asynccontextmanager
+    async def hold(self, session_id: str):
+        await self.acquire(session_id)
+        try:
+            yield
+        finally:
+            self.release(session_id)
+
+MESSAGE_KINDS = {'human': 'h', 'ai': 'a', 'system': 's'}
+MESSAGE_TYPES = {'h': HumanMessage, 'a': AIMessage, 's': SystemMessage}
+
+def message_to_record(message) -> list:
+    record = [MESSAGE_KINDS[message.type], message.content]
+    if message.additional_kwargs:
+        record.append(message.additional_kwargs)
+    return record
+
+def record_to_message(record):
+    kwargs = record[2] if len(record) > 2 else {}
+    return MESSAGE_TYPES[record[0]](content=record[1], additional_kwargs=kwargs)
+
+def dump_records(records) -> str:
+    return "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in records)
+
+class MemorySessionStore:
+    """Process-local history; lives exactly as long as the live session.
+
+    Every store implements `load(session_id, cursor)`, returning the records
+    stored past `cursor` and the new cursor, and `append(session_id, records,
+    cursor)`, returning the cursor just past the appended records, or None
+    if someone else wrote since `cursor` and the caller must reload.
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str, cursor=0):
+        with self._lock:
+            records = self._records.get(session_id, [])[cursor:]
+        return records, cursor + len(records)
+
+    def append(self, session_id: str, records, cursor):
+        with self._lock:
+            stored = self._records.setdefault(session_id, [])
+            expected = len(stored) == cursor
+            stored.extend(records)
+            return len(stored) if expected else None
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._records.pop(session_id, None)
+
+    def evict(self, session_id: str):
+        self.clear(session_id)
+
+    def lock(self, session_id: str):
+        # One process holds the history, so the in-process lock is enough
+        return None
+
+    def unlock(self, handle):
+        pass
+
+    def expire(self) -> int:
+        # History goes with the live session, so nothing outlives it
+        return 0
+
+class DiskSessionStore:
+    """One append-only JSON-lines file per session.
+
+    The cursor is a byte offset, so a request reads only the turns written
+    since it last looked, and a save appends only the new turns. Writers
+    hold an exclusive `flock` on the file, so the size check and the write
+    are one step across processes. `lock()` holds a `flock` on a separate
+    lock file for a whole turn, so workers on the host take turns on a
+    session. Files untouched for `ttl` seconds are deleted by `expire()`.
+    """
+
+    def __init__(self, directory, ttl=0):
+        if fcntl is None:
+            raise RuntimeError("The disk session backend needs fcntl file locks, which this platform lacks; use LUMI_SESSION_BACKEND=memory or mongo")
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, session_id: str, suffix='.jsonl') -> str:
+        name = hashlib.sha1(session_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{name}{suffix}")
+
+    def load(self, session_id: str, cursor=0):
+        try:
+            with open(self.path(session_id), 'rb') as f:
+                f.seek(cursor)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+
+        # Leave a partially written last line for the next load
+        end = data.rfind(b'\n') + 1
+        records = [json.loads(line) for line in data[:end].splitlines() if line]
+        return records, cursor + end
+
+    def _open_locked(self, path):
+        while True:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # expire() may have unlinked the file while we waited for the lock
+            if os.fstat(fd).st_nlink:
+                return fd
+            os.close(fd)
+
+    def append(self, session_id: str, records, cursor):
+        data = dump_records(records).encode('utf-8')
+        fd = self._open_locked(self.path(session_id))
+        try:
+            expected = os.fstat(fd).st_size == cursor
+            os.write(fd, data)
+        finally:
+            # Closing releases the lock
+            os.close(fd)
+        return cursor + len(data) if expected else None
+
+    def lock(self, session_id: str):
+        fd = self._open_locked(self.path(session_id, '.lock'))
+        # Marks the lock file as in use for expire()
+        os.utime(fd)
+        return fd
+
+    def unlock(self, handle):
+        os.close(handle)
+
+    def clear(self, session_id: str):
+        try:
+            os.remove(self.path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def evict(self, session_id: str):
+        pass
+
+    def expire(self) -> int:
+        if self.ttl <= 0:
+            return 0
+        cutoff = time.time() - self.ttl
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(('.jsonl', '.lock')) or entry.stat().st_mtime > cutoff:
+                    continue
+                try:
+                    fd = os.open(entry.path, os.O_WRONLY)
+                except FileNotFoundError:
+                    continue
+                try:
+                    # A held turn lock is in use however old it is; skip it
+                    flags = fcntl.LOCK_EX | (fcntl.LOCK_NB if entry.name.endswith('.lock') else 0)
+                    fcntl.flock(fd, flags)
+                    # Re-check under the lock; a writer may have just appended
+                    if os.fstat(fd).st_mtime <= cutoff:
+                        os.remove(entry.path)
+                        removed += entry.name.endswith('.jsonl')
+                except (FileNotFoundError, BlockingIOError):
+                    pass
+                finally:
+                    os.close(fd)
+        if removed:
+            logger.info("expired session files", extra={'removed': removed})
+        return removed
+
+class MongoSessionStore:
+    """One document per session; saves push only the new turns.
+
+    With a `ttl`, a TTL index on `updated_at` lets MongoDB delete sessions
+    idle for that many seconds. The index is created on the first save.
+    """
+
+    def __init__(self, collection, ttl=0):
+        self.collection = collection
+        self.ttl = ttl
+        self._indexed = False
+
+    def _ensure_index(self):
+        if self._indexed or self.ttl <= 0:
+            return
+        self.collection().create_index('updated_at', expireAfterSeconds=int(self.ttl))
+        self._indexed = True
+
+    def load(self, session_id: str, cursor=0):
+        document = self.collection().find_one(
+            {'_id': session_id},
+            {'messages': {'$slice': [cursor, 1 << 30]}}
+        )
+        records = document.get('messages', []) if document else []
+        return records, cursor + len(records)
+
+    def append(self, session_id: str, records, cursor):
+        self._ensure_index()
+        document = self.collection().find_one_and_update(
+            {'_id': session_id},
+            {
+                '$push': {'messages': {'$each': list(records)}},
+                '$inc': {'count': len(records)},
+                '$set': {'updated_at': datetime.now(timezone.utc)}
+            },
+            projection={'count': True},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return document['count'] if document['count'] == cursor + len(records) else None
+
+    def clear(self, session_id: str):
+        self.collection().delete_one({'_id': session_id})
+
+    def evict(self, session_id: str):
+        pass
+
+    def lock(self, session_id: str):
+        # No lock across hosts: turns are ordered per worker, and concurrent
+        # turns on different workers are only reconciled at save time
+        return None
+
+    def unlock(self, handle):
+        pass
+
+    def expire(self) -> int:
+        # MongoDB's TTL monitor deletes expired sessions
+        return 0
+
+def build_session_store(config):
+    if config.backend == 'memory':
+        return MemorySessionStore()
+    if config.backend == 'disk':
+        return DiskSessionStore(config.session_dir, config.history_ttl)
+    if config.backend == 'mongo':
+        from db import mongo_pool
+        return MongoSessionStore(lambda: mongo_pool.collection('sessions'), config.history_ttl)
+    raise ValueError(f"Unknown session backend: {config.backend}")
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs one computation per key at a time and shares its result.
+
+    Callers that arrive while a key is in flight wait for that call instead
+    of starting their own; callers shortly after reuse the result for `ttl`
+    seconds. Errors are shared with the waiters but never cached. `do` is
+    for threads, `ado` for coroutines on one event loop.
+    """
+
+    def __init__(self, ttl: float = 0.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counters = {
+            'calls': 0,
+            'executed': 0,
+            'coalesced': 0,
+            'cached': 0,
+            'errors': 0
+        }
+        self._calls = {}
+        self._futures = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        # Caller holds the lock
+        entry = self._results.get(key)
+        if entry is None:
+            return False, None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._results[key]
+            return False, None
+        return True, entry[1]
+
+    def _store(self, key, result):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._results[key] = (time.monotonic(), result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def do(self, key, fn):
+        with self._lock:
+            self.counters['calls'] += 1
+            hit, result = self._cached(key)
+            if hit:
+                self.counters['cached'] += 1
+                return result
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters['executed'] += 1
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            self._store(key, call.result)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.counters['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, factory):
+        with self._lock:
+            self.counters['calls'] += 1
+            hit, result = self._cached(key)
+            if hit:
+                self.counters['cached'] += 1
+                return result
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = asyncio.get_running_loop().create_future()
+                self.counters['executed'] += 1
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            # Shield, so one waiter being cancelled does not cancel the call
+            return await asyncio.shield(future)
+
+        try:
+            result = await factory()
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved even if nobody was waiting; the leader re-raises
+            future.exception()
+            with self._lock:
+                self.counters['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._futures[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._results)
+        shared = counters['coalesced'] + counters['cached']
+        return {
+            'ttl': self.ttl,
+            'cached_results': size,
+            **counters,
+            'coalescing_ratio': round(shared / counters['calls'], 4) if counters['calls'] else 0.0
+        }
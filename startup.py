@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from db import mongo_pool
+from logs import get_logger
+
+logger = get_logger('startup')
+
+class StartupConfig:
+    def __init__(self):
+        # Warm up in a background thread as soon as the server starts. With
+        # 0 the first readiness check starts the warm-up; a request that
+        # comes first only builds the agent, and pays for the FAQ index and
+        # MongoDB connection as it uses them
+        self.warm_on_start = os.getenv('LUMI_WARM_ON_START', '1') == '1'
+        # Seconds a MongoDB ping (and a failed warm-up) is trusted before
+        # a readiness check tries again
+        self.recheck_interval = float(os.getenv('LUMI_READY_RECHECK', '5'))
+
+class Startup:
+    """Lazy construction of the agent, and the warm-up that makes a worker ready.
+
+    Importing the API loads Flask and pymongo only. LangChain, the OpenAI
+    client and the agent are built by `agent()` on first use. `warm()` does
+    that ahead of traffic along with the rest of the first request's work:
+    the MongoDB pool and index, the FAQ index and the tokenizer. A worker is
+    ready once every step has succeeded and MongoDB answers a ping.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.started = time.monotonic()
+        # cold -> warming -> ready, or failed (retried by readiness checks)
+        self.state = 'cold'
+        self.steps = {}
+        self.ready_after = None
+        self._agent = None
+        self._agent_lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._warm_finished = 0.0
+        self._ping = (float('-inf'), None)
+
+    def agent(self):
+        """The shared LumiAgent, imported and built on first use."""
+        agent = self._agent
+        if agent is None:
+            with self._agent_lock:
+                if self._agent is None:
+                    from agent import lumi_agent
+                    self._agent = lumi_agent
+                agent = self._agent
+        return agent
+
+    def _step(self, name, action) -> bool:
+        start = time.perf_counter()
+        error = None
+        try:
+            if action() is False:
+                error = "failed (see log)"
+        except Exception as e:
+            logger.exception("warm-up step failed", extra={'step': name})
+            error = f"{type(e).__name__}: {e}"
+        self.steps[name] = {'ok': error is None, 'seconds': round(time.perf_counter() - start, 3)}
+        if error:
+            self.steps[name]['error'] = error
+        return error is None
+
+    def _warm_tokenizer(self):
+        from packing import count_tokens
+        from tools import rag_config
+        count_tokens("warm up", rag_config.token_model)
+
+    def warm(self) -> bool:
+        """Build everything the first request would; returns whether all steps succeeded."""
+        with self._warm_lock:
+            if self.state == 'ready':
+                return True
+            self.state = 'warming'
+            start = time.perf_counter()
+            # Importing tools compiles its patterns and pulls in LangChain
+            from tools import init_db, load_corpus
+            results = [
+                self._step('mongo', init_db),
+                self._step('corpus', load_corpus),
+                self._step('agent', self.agent),
+                self._step('tokenizer', self._warm_tokenizer)
+            ]
+            ok = all(results)
+            self.state = 'ready' if ok else 'failed'
+            self._warm_finished = time.monotonic()
+            if ok and self.ready_after is None:
+                self.ready_after = round(self._warm_finished - self.started, 3)
+            log = logger.info if ok else logger.warning
+            log("warm-up finished", extra={'state': self.state, 'seconds': round(time.perf_counter() - start, 3), 'steps': self.steps})
+            return ok
+
+    def start(self):
+        """Warm up in the background so liveness answers at once."""
+        with self._start_lock:
+            if self.state == 'warming':
+                return
+            self.state = 'warming'
+        threading.Thread(target=self.warm, name='lumi-warmup', daemon=True).start()
+
+    def _mongo_error(self):
+        checked, error = self._ping
+        if time.monotonic() - checked >= self.config.recheck_interval:
+            try:
+                mongo_pool.ping()
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            self._ping = (time.monotonic(), error)
+        return error
+
+    def liveness(self) -> dict:
+        return {
+            'alive': True,
+            'state': self.state,
+            'uptime': round(time.monotonic() - self.started, 3)
+        }
+
+    def readiness(self):
+        """Return (ready, details)."""
+        if self.state == 'cold' or (self.state == 'failed' and time.monotonic() - self._warm_finished >= self.config.recheck_interval):
+            # Not warmed at start, or a dependency that was down may be back
+            self.start()
+        mongo_error = self._mongo_error() if self.state == 'ready' else None
+        details = {
+            'ready': self.state == 'ready' and mongo_error is None,
+            'state': self.state,
+            'steps': dict(self.steps),
+            'ready_after': self.ready_after
+        }
+        if mongo_error:
+            details['mongo_error'] = mongo_error
+        return details['ready'], details
+
+startup = Startup(StartupConfig())
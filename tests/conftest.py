@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# Offline settings, applied before any repo module reads its config
+_workdir = tempfile.mkdtemp(prefix='lumi-tests-')
+os.environ.setdefault('OPENAI_API_KEY', 'offline-tests')
+os.environ['MONGO_CLIENT'] = 'mongomock'
+os.environ['LUMI_CACHE_DIR'] = os.path.join(_workdir, 'cache')
+os.environ['LUMI_LOG_LEVEL'] = 'CRITICAL'
+os.environ['LUMI_METRICS'] = '0'
+
+from sample_faq import write_faq_pdf
+
+os.environ['FAQ_PDF_PATH'] = write_faq_pdf(os.path.join(_workdir, 'faq.pdf'), 50)
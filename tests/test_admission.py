@@ -0,0 +1,74 @@
+import threading
+import time
+import pytest
+from langchain_core.messages import HumanMessage
+from admission import CONTINUING, NEW_SESSION, AdmissionConfig, AdmissionController, AdmittedChatModel
+from errors import AdmissionRejected
+from fakes import ScriptedChatModel
+
+def controller(monkeypatch, **settings):
+    for name, value in settings.items():
+        monkeypatch.setenv(f"LUMI_LLM_{name.upper()}", str(value))
+    return AdmissionController(AdmissionConfig())
+
+def wait_for_queue(admission, depth):
+    while admission.stats()['queue_depth'] < depth:
+        time.sleep(0.005)
+
+def test_full_queue_returns_429_with_retry_after(monkeypatch):
+    monkeypatch.setenv('LUMI_ROUTE_FAQ', '0')
+    monkeypatch.setenv('LUMI_RESPONSE_CACHE', '0')
+    admission = controller(monkeypatch, max_concurrency=1, queue_size=0)
+    model = AdmittedChatModel(model=ScriptedChatModel(), controller=admission)
+    from agent import LumiAgent
+    from api import app
+    from startup import startup
+    monkeypatch.setattr(startup, '_agent', LumiAgent(model=model))
+    admission.acquire(1)
+
+    response = app.test_client().post('/chat', json={'message': "My MacBook will not turn on", 'session_id': 'full'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    response = app.test_client().post('/chat-stream', json={'message': "My MacBook will not turn on", 'session_id': 'full'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+def test_wait_past_queue_timeout_returns_503(monkeypatch):
+    admission = controller(monkeypatch, max_concurrency=1, queue_timeout=0.1)
+    admission.acquire(1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.acquire(1)
+    assert rejected.value.status == 503
+    assert rejected.value.retry_after >= 1
+    assert admission.stats()['queue_depth'] == 0
+
+def test_continuing_turns_are_served_before_new_sessions(monkeypatch):
+    admission = controller(monkeypatch, max_concurrency=1)
+    admission.acquire(1)
+    order = []
+
+    def call(name, priority):
+        admission.acquire(1, priority)
+        order.append(name)
+        admission.release()
+
+    waiters = [threading.Thread(target=call, args=('new', NEW_SESSION))]
+    waiters[0].start()
+    wait_for_queue(admission, 1)
+    waiters.append(threading.Thread(target=call, args=('continuing', CONTINUING)))
+    waiters[1].start()
+    wait_for_queue(admission, 2)
+
+    admission.release()
+    for waiter in waiters:
+        waiter.join()
+    assert order == ['continuing', 'new']
+
+def test_closing_a_stream_early_releases_its_slot(monkeypatch):
+    admission = controller(monkeypatch, max_concurrency=1)
+    model = AdmittedChatModel(model=ScriptedChatModel(), controller=admission)
+    stream = model.stream([HumanMessage(content="How do I reset the SMC?")])
+    next(stream)
+    assert admission.stats()['active'] == 1
+    stream.close()
+    assert admission.stats()['active'] == 0
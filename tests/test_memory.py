@@ -0,0 +1,21 @@
+from fakes import ScriptedChatModel
+
+def test_summary_survives_reload_from_disk_history(monkeypatch, tmp_path):
+    monkeypatch.setenv('LUMI_SESSION_BACKEND', 'disk')
+    monkeypatch.setenv('LUMI_SESSION_DIR', str(tmp_path))
+    monkeypatch.setenv('LUMI_MEMORY_TOKENS', '400')
+    monkeypatch.setenv('LUMI_MEMORY_SUMMARY_TOKENS', '100')
+    monkeypatch.setenv('LUMI_RESPONSE_CACHE', '0')
+    monkeypatch.setenv('LUMI_ROUTE_FAQ', '0')
+    from agent import LumiAgent
+    agent = LumiAgent(model=ScriptedChatModel())
+    for turn in range(6):
+        agent.process_message(f"Turn {turn}: my MacBook battery drains quickly overnight, what should I check?", "long")
+    before = agent.get_session("long")
+    assert before['summary'] and before['summarized']
+
+    # Another worker, or this one after a restart, starts from the stored history
+    other = LumiAgent(model=ScriptedChatModel())
+    after = other.get_session("long")
+    assert (after['summary'], after['summarized']) == (before['summary'], before['summarized'])
+    assert len(after['messages']) == len(before['messages'])
@@ -0,0 +1,24 @@
+from profiling import Profiler, ProfilingConfig
+
+def profiler_in(directory, monkeypatch):
+    monkeypatch.setenv('LUMI_PROFILE_DIR', str(directory))
+    monkeypatch.setenv('LUMI_PROFILE_TOKEN', 'secret')
+    monkeypatch.setenv('LUMI_PROFILE_SAMPLE', '1')
+    monkeypatch.setenv('LUMI_PROFILE_MAX_ADMIN_FILES', '2')
+    return Profiler(ProfilingConfig())
+
+def run(profiler, header, trace_id):
+    with profiler.begin(header, trace_id) as capture:
+        sum(range(1000))
+    return capture
+
+def test_only_admin_captures_return_a_summary(tmp_path, monkeypatch):
+    profiler = profiler_in(tmp_path, monkeypatch)
+    assert run(profiler, None, 'sampled1').summary is None
+    assert run(profiler, 'secret', 'admin1').summary['reason'] == 'admin'
+
+def test_admin_profiles_are_capped(tmp_path, monkeypatch):
+    profiler = profiler_in(tmp_path, monkeypatch)
+    for i in range(4):
+        run(profiler, 'secret', f"admin{i}")
+    assert len([profile for profile in profiler.list() if profile['id'].endswith('-admin')]) == 2
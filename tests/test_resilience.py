@@ -0,0 +1,22 @@
+from langchain_core.messages import HumanMessage
+from fakes import ScriptedChatModel
+from resilience import CallPolicy, ResilienceConfig, ResilientChatModel, start_deadline
+
+def test_attempt_timeout_is_cut_to_the_deadline(monkeypatch):
+    monkeypatch.setenv('LUMI_LLM_CALL_TIMEOUT', '20')
+    monkeypatch.setenv('LUMI_LLM_HEDGE', '0')
+    timeouts = []
+    generate = ScriptedChatModel._generate
+
+    def recording(self, messages, stop=None, run_manager=None, **kwargs):
+        timeouts.append(kwargs.get('timeout'))
+        return generate(self, messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    monkeypatch.setattr(ScriptedChatModel, '_generate', recording)
+    model = ResilientChatModel(model=ScriptedChatModel(), policy=CallPolicy(ResilienceConfig()))
+    start_deadline(5)
+    model.invoke([HumanMessage(content="How do I reset the SMC?")])
+    start_deadline(0)
+    model.invoke([HumanMessage(content="How do I reset the SMC?")])
+    assert 4 < timeouts[0] <= 5
+    assert timeouts[1] == 20
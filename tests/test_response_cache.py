@@ -0,0 +1,44 @@
+import pytest
+from fakes import ScriptedChatModel
+
+QUESTION = "How do I reset the SMC?"
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv('LUMI_RESPONSE_CACHE', '1')
+    monkeypatch.setenv('LUMI_ROUTE_FAQ', '0')
+    monkeypatch.setenv('LUMI_COALESCE_ANSWERS', '0')
+    from agent import LumiAgent
+    return LumiAgent(model=ScriptedChatModel())
+
+def test_clean_first_turn_is_cached(agent):
+    agent.process_message(QUESTION, "clean-1")
+    assert agent.responses.stats()['stores'] == 1
+    assert agent.responses.get(QUESTION, agent._cache_version(QUESTION, agent.get_session("fresh"))) is not None
+
+def test_turn_with_tool_error_is_not_cached(agent, monkeypatch):
+    import tools
+
+    def broken_search(*args, **kwargs):
+        raise ConnectionError("index unavailable")
+
+    monkeypatch.setattr(tools.faq_retriever, 'search', broken_search)
+    monkeypatch.setattr(tools.faq_search_flight, 'ttl', 0)
+    reply = agent.process_message(QUESTION, "tool-error-1")
+    assert "Error accessing FAQ" in reply['response']
+    assert agent.responses.stats()['stores'] == 0
+
+    monkeypatch.undo()
+    reply = agent.process_message(QUESTION, "tool-error-2")
+    assert "Error" not in reply['response']
+
+def test_failed_run_is_not_cached(monkeypatch):
+    monkeypatch.setenv('LUMI_RESPONSE_CACHE', '1')
+    monkeypatch.setenv('LUMI_ROUTE_FAQ', '0')
+    monkeypatch.setenv('LUMI_COALESCE_ANSWERS', '0')
+    from agent import LumiAgent
+    # Every model call fails with a connection error
+    agent = LumiAgent(model=ScriptedChatModel(error_rate=1.0))
+    reply = agent.process_message(QUESTION, "failed-1")
+    assert reply['response'].startswith("I apologize, but I encountered a technical issue")
+    assert agent.responses.stats()['stores'] == 0
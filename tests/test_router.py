@@ -0,0 +1,36 @@
+from router import IntentRouter, RouterConfig
+
+def test_digit_only_token_needs_lookup_wording():
+    router = IntentRouter(RouterConfig())
+    assert router._ticket_id("my order 12345678 arrived broken") is None
+    assert router._ticket_id("status of 12345678") == '12345678'
+    assert router._ticket_id("A1B2C3D4 please") == 'A1B2C3D4'
+
+def test_faq_routes_only_answer_first_turn(monkeypatch):
+    router = IntentRouter(RouterConfig())
+    monkeypatch.setattr(router.config, 'faq', True)
+    monkeypatch.setattr(router, '_faq_exact', lambda message: {'intent': 'faq_exact'})
+    assert router.route("How do I reset the SMC?")['intent'] == 'faq_exact'
+    assert router.route("How do I reset the SMC?", first_turn=False) is None
+
+def test_faq_route_falls_through_when_retrieval_fails(monkeypatch):
+    import tools
+
+    def missing_pdf(*args, **kwargs):
+        raise FileNotFoundError("FAQ PDF not found")
+
+    router = IntentRouter(RouterConfig())
+    monkeypatch.setattr(router.config, 'faq', True)
+    monkeypatch.setattr(tools.faq_retriever, 'search', missing_pdf)
+    assert router.route("I want to file a complaint about my broken MacBook screen") is None
+
+def test_extractive_route_falls_through_when_retrieval_fails(monkeypatch):
+    import tools
+
+    def broken_index(*args, **kwargs):
+        raise RuntimeError("index unavailable")
+
+    router = IntentRouter(RouterConfig())
+    monkeypatch.setattr(router.config, 'extractive', True)
+    monkeypatch.setattr(tools.faq_retriever, 'search', broken_index)
+    assert router._faq_extractive("How do I reset the SMC on my MacBook?") is None
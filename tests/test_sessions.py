@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+import time
+from sessions import DiskSessionStore, SessionLocks
+
+def test_disk_append_detects_concurrent_write(tmp_path):
+    store = DiskSessionStore(str(tmp_path))
+    cursor = store.append('s', [['h', "hi"]], 0)
+    assert store.append('s', [['a', "hello"]], cursor) is not None
+    # A writer still at the old cursor has missed a turn and must reload
+    assert store.append('s', [['a', "stale"]], cursor) is None
+
+def test_disk_expire_removes_idle_history(tmp_path):
+    store = DiskSessionStore(str(tmp_path), ttl=60)
+    store.append('old', [['h', "hi"]], 0)
+    store.append('new', [['h', "hi"]], 0)
+    idle = time.time() - 120
+    os.utime(store.path('old'), (idle, idle))
+    assert store.expire() == 1
+    assert store.load('old') == ([], 0)
+    assert store.load('new')[0] == [['h', "hi"]]
+
+def hold_turn(directory, events):
+    locks = SessionLocks(DiskSessionStore(directory))
+    with locks.hold('s'):
+        events.put('start')
+        time.sleep(0.2)
+        events.put('end')
+
+def test_disk_lock_orders_turns_across_processes(tmp_path):
+    events = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=hold_turn, args=(str(tmp_path), events)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [events.get() for _ in range(4)] == ['start', 'end', 'start', 'end']
+
+def test_disk_expire_skips_held_turn_lock(tmp_path):
+    store = DiskSessionStore(str(tmp_path), ttl=60)
+    handle = store.lock('busy')
+    idle = time.time() - 120
+    os.utime(store.path('busy', '.lock'), (idle, idle))
+    store.expire()
+    assert os.path.exists(store.path('busy', '.lock'))
+    store.unlock(handle)
+    store.expire()
+    assert not os.path.exists(store.path('busy', '.lock'))
@@ -1,19 +1,54 @@
-import PyPDF2
+import os
 import re
 import uuid
 import json
 from datetime import datetime
 from langchain.tools import tool
 from pydantic import BaseModel, Field
-from pymongo import MongoClient
+from corpus import FAQCorpus
+from db import mongo_pool
+from logs import get_logger
+from metrics import metrics
+from retrieval import FAQRetriever, TOKEN_PATTERN
+from packing import pack_context
+from singleflight import SingleFlight
 
 class RAGConfig:
     def __init__(self):
         self.chunk_size = 500
         self.chunk_overlap = 100
         self.top_k = 2
-        self.pdf_path = '/Users/omkarsatapaphy/Downloads/Apple Laptop FAQ.pdf'
+        self.pdf_path = os.getenv('FAQ_PDF_PATH', '/Users/omkarsatapaphy/Downloads/Apple Laptop FAQ.pdf')
         self.min_paragraph_length = 50
+        self.bm25_k1 = 1.5
+        self.bm25_b = 0.75
+        self.retrieval_backend = os.getenv('RAG_BACKEND', 'bm25')
+        self.embedding_backend = os.getenv('RAG_EMBEDDINGS', 'hashing')
+        self.context_token_budget = 400
+        self.candidate_pool = 6
+        self.dedup_threshold = 0.8
+        self.token_model = 'gpt-3.5-turbo'
+        # Identical searches within this many seconds share one result
+        self.search_cache_ttl = float(os.getenv('RAG_SEARCH_CACHE_TTL', '5'))
+        self.cache_dir = os.getenv('LUMI_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+# Tools prefix this to an observation that should go straight back to the
+# customer instead of through another LLM pass (see agent.DirectReturnAgentExecutor)
+FINAL_MARKER = "FINAL_RESULT:"
+
+# Compiled once at import (and so during warm-up) rather than on a first request
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+VALID_EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_PATTERN = re.compile(r'\b\d{10}\b|\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b')
+NON_DIGIT_PATTERN = re.compile(r'[^\d]')
+NAME_PATTERNS = [
+    re.compile(r'[Nn]ame:\s*([A-Za-z\s]+?)(?:[,\n]|$)'),
+    re.compile(r'[Ii]\'?m\s+([A-Za-z\s]+?)(?:[,\n]|$)'),
+    re.compile(r'[Mm]y name is\s+([A-Za-z\s]+?)(?:[,\n]|$)'),
+    re.compile(r'[Tt]his is\s+([A-Za-z\s]+?)(?:[,\n]|$)')
+]
+PAYLOAD_PATTERN = re.compile(r'JSON_START(.*?)JSON_END', re.DOTALL)
+COMPLAINT_ID_PATTERN = re.compile(r'\b[A-F0-9]{8}\b')
 
 class RAGSearchInput(BaseModel):
     query: str = Field(description="Search query for FAQ")
@@ -25,47 +60,64 @@ class ComplaintRetrievalInput(BaseModel):
     complaint_id: str = Field(description="Complaint ID to retrieve")
 
 rag_config = RAGConfig()
+faq_corpus = FAQCorpus(rag_config)
+faq_retriever = FAQRetriever(faq_corpus, rag_config)
+faq_search_flight = SingleFlight(ttl=rag_config.search_cache_ttl)
+
+logger = get_logger('tools')
 
 def get_mongo_client():
-    client = MongoClient('mongodb://localhost:27017/')
-    return client.complaints_db.complaints
+    return mongo_pool.collection()
 
-def init_db():
+def init_db() -> bool:
     try:
         collection = get_mongo_client()
         collection.create_index("complaint_id", unique=True)
-        print("MongoDB connection established")
+        logger.info("MongoDB connection established")
+        return True
     except Exception as e:
-        print(f"MongoDB connection error: {e}")
+        logger.error("MongoDB connection error: %s", e)
+        return False
+
+def load_corpus() -> bool:
+    try:
+        faq_retriever.ensure_index()
+        logger.info("FAQ corpus loaded", extra=faq_corpus.chunks.stats())
+        return True
+    except Exception as e:
+        logger.error("FAQ corpus error: %s", e)
+        return False
+
+def _faq_context(query: str) -> str:
+    relevant_content = faq_retriever.search(query, top_k=max(rag_config.top_k, rag_config.candidate_pool))
+    with metrics.stage('retrieval', 'pack'):
+        context = pack_context(
+            query,
+            relevant_content,
+            budget=rag_config.context_token_budget,
+            max_chunks=rag_config.top_k,
+            dedup_threshold=rag_config.dedup_threshold,
+            model=rag_config.token_model
+        )
+    
+    if context['chunks']:
+        # Reported out of band; in the tool text the model would read them
+        if metrics.enabled:
+            metrics.context_tokens.inc(context['tokens'], ('packed',))
+            metrics.context_tokens.inc(context['saved_tokens'], ('saved',))
+        logger.debug("FAQ context packed", extra={'tokens': context['tokens'], 'saved_tokens': context['saved_tokens']})
+        return "\n\n".join(context['chunks'])
+    else:
+        return "No relevant information found in FAQ"
 
 @tool
 def rag_faq_search(query: str) -> str:
     """Search Apple Laptop FAQ for relevant information"""
     try:
-        with open(rag_config.pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            content = ""
-            
-            for page in pdf_reader.pages:
-                content += page.extract_text() + "\n"
-        
-        query_words = query.lower().split()
-        paragraphs = content.split('\n\n')
-        relevant_content = []
-        
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if len(paragraph) > rag_config.min_paragraph_length: 
-                score = sum(1 for word in query_words if word in paragraph.lower())
-                if score > 0:
-                    relevant_content.append((score, paragraph))
-        
-        relevant_content.sort(key=lambda x: x[0], reverse=True)
-        
-        if relevant_content:
-            return "\n\n".join([content[1] for content in relevant_content[:rag_config.top_k]])
-        else:
-            return "No relevant information found in FAQ"
+        # Concurrent identical searches wait on one scan and share its result
+        faq_retriever.ensure_index()
+        key = (faq_corpus.version, ' '.join(TOKEN_PATTERN.findall(query.lower())))
+        return faq_search_flight.do(key, lambda: _faq_context(query))
             
     except Exception as e:
         return f"Error accessing FAQ: {str(e)}"
@@ -82,11 +134,10 @@ def create_complaint(complaint_data: str) -> str:
         if missing:
             return f"Missing required information: {', '.join(missing)}. Please provide all details."
         
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, info['email']):
+        if not VALID_EMAIL_PATTERN.match(info['email']):
             return "Invalid email format provided."
         
-        phone_clean = re.sub(r'[^\d]', '', info['phone_number'])
+        phone_clean = NON_DIGIT_PATTERN.sub('', info['phone_number'])
         if len(phone_clean) != 10:
             return "Invalid phone number. Must be 10 digits."
         
@@ -102,16 +153,12 @@ def create_complaint(complaint_data: str) -> str:
             "created_at": datetime.now()
         }
         
-        print("\n" + "="*60)
-        print("MONGODB INSERT DOCUMENT:")
-        print("="*60)
-        print(json.dumps(document, indent=2, default=str))
-        print("="*60 + "\n")
-        
         collection = get_mongo_client()
-        result = collection.insert_one(document)
+        with metrics.stage('mongo', 'insert_one'):
+            result = collection.insert_one(document)
         
-        print(f"✅ SUCCESS: Complaint {complaint_id} created in MongoDB\n")
+        logger.info("complaint created", extra={'complaint_id': complaint_id})
+        logger.debug("complaint document", extra={'document': document})
         
         response_json = {
             "complaint_id": complaint_id,
@@ -122,10 +169,13 @@ def create_complaint(complaint_data: str) -> str:
             "complaint_details": info['complaint_details']
         }
         
-        return f"Complaint successfully created! Your complaint ID is: {complaint_id}.\n\nJSON_START{json.dumps(response_json)}JSON_END"
+        return final_result(
+            f"Complaint successfully created! Your complaint ID is: {complaint_id}.",
+            response_json
+        )
         
     except Exception as e:
-        print(f"ERROR: Failed to create complaint - {str(e)}\n")
+        logger.exception("failed to create complaint")
         return f"Error creating complaint: {str(e)}"
 
 @tool
@@ -133,7 +183,8 @@ def retrieve_complaint(complaint_id: str) -> str:
     """Retrieve complaint details by ID"""
     try:
         collection = get_mongo_client()
-        result = collection.find_one({"complaint_id": complaint_id})
+        with metrics.stage('mongo', 'find_one'):
+            result = collection.find_one({"complaint_id": complaint_id})
         
         if not result:
             return f"No complaint found with ID: {complaint_id}"
@@ -148,16 +199,17 @@ def retrieve_complaint(complaint_id: str) -> str:
             "created_at": str(result['created_at'])
         }
         
-        return f"""Complaint Details Found:
-                ID: {result['complaint_id']}
-                Name: {result['name']}
-                Phone: {result['phone_number']}
-                Email: {result['email']}
-                Issue: {result['complaint_details']}
-                Status: {result['status']}
-                Created: {result['created_at']}
-
-                JSON_START{json.dumps(response_json)}JSON_END"""
+        return final_result(
+            f"""Complaint Details Found:
+ID: {result['complaint_id']}
+Name: {result['name']}
+Phone: {result['phone_number']}
+Email: {result['email']}
+Issue: {result['complaint_details']}
+Status: {result['status']}
+Created: {result['created_at']}""",
+            response_json
+        )
         
     except Exception as e:
         return f"Error retrieving complaint: {str(e)}"
@@ -165,23 +217,16 @@ def retrieve_complaint(complaint_id: str) -> str:
 def extract_all_info(text: str) -> dict:
     info = {}
     
-    email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
+    email_match = EMAIL_PATTERN.search(text)
     if email_match:
         info['email'] = email_match.group()
     
-    phone_match = re.search(r'\b\d{10}\b|\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b', text)
+    phone_match = PHONE_PATTERN.search(text)
     if phone_match:
-        info['phone_number'] = re.sub(r'[^\d]', '', phone_match.group())
+        info['phone_number'] = NON_DIGIT_PATTERN.sub('', phone_match.group())
     
-    name_patterns = [
-        r'[Nn]ame:\s*([A-Za-z\s]+?)(?:[,\n]|$)',
-        r'[Ii]\'?m\s+([A-Za-z\s]+?)(?:[,\n]|$)',
-        r'[Mm]y name is\s+([A-Za-z\s]+?)(?:[,\n]|$)',
-        r'[Tt]his is\s+([A-Za-z\s]+?)(?:[,\n]|$)'
-    ]
-    
-    for pattern in name_patterns:
-        name_match = re.search(pattern, text)
+    for pattern in NAME_PATTERNS:
+        name_match = pattern.search(text)
         if name_match:
             name = name_match.group(1).strip()
             if len(name) > 1:
@@ -203,8 +248,31 @@ def extract_all_info(text: str) -> dict:
     
     return info
 
+def final_result(message: str, payload: dict) -> str:
+    return f"{FINAL_MARKER}{message}\n\nJSON_START{json.dumps(payload)}JSON_END"
+
+def is_tool_error(observation) -> bool:
+    """Whether a tool observation reports a failure (the tools return errors as text)."""
+    return isinstance(observation, str) and observation.startswith("Error ")
+
+def split_final_result(observation: str):
+    """Return (message, payload) for a final tool result, or None."""
+    if not observation.startswith(FINAL_MARKER):
+        return None
+    message = observation[len(FINAL_MARKER):].split("JSON_START", 1)[0].strip()
+    return message, extract_payload(observation)
+
+def extract_payload(text: str):
+    match = PAYLOAD_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
 def extract_complaint_id(text: str) -> str:
-    match = re.search(r'\b[A-F0-9]{8}\b', text.upper())
+    match = COMPLAINT_ID_PATTERN.search(text.upper())
     return match.group() if match else None
 
 available_tools = [rag_faq_search, create_complaint, retrieve_complaint]
\ No newline at end of file
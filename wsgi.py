@@ -0,0 +1,15 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker process imports this module once, which only loads Flask.
+A background thread then builds the agent, connects to MongoDB and loads
+the FAQ index (from the on-disk cache after the first worker). The worker
+answers GET /health/live at once and GET /health/ready with 200 once the
+warm-up is done.
+"""
+from api import app
+from startup import startup
+
+if startup.config.warm_on_start:
+    startup.start()